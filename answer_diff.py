@@ -0,0 +1,200 @@
+# answer_diff.py
+"""Word-level diff between the Model Answer and the Gold Answer, as HTML.
+
+Words only in the model answer are marked ``diff-del`` and words only in
+the gold answer ``diff-ins``.  ``difflib`` compares every word of one
+answer with every word of the other, so above ``MAX_DIFF_COST`` word
+pairs the answers are first aligned sentence by sentence (long sentences
+cut into ``DIFF_CHUNK_WORDS`` pieces) and only the changed stretches are
+diffed word by word; stretches still too long are marked as changed
+whole.  Diffs are cached per answer pair content hash in a small LRU
+bounded by entries and by characters (a diff too large for it is cached
+as ``PLAIN_DIFF``), and the next rows are diffed ahead of time on a
+background thread.
+"""
+import difflib
+import html
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from answer_scoring import pair_hash
+
+# Word comparisons (answer words x gold words) allowed in one difflib run
+MAX_DIFF_COST = 1_000_000
+# Sentence comparisons allowed when aligning answers too long for a word diff
+MAX_ALIGN_COST = 16_000_000
+# Longest sentence aligned as one unit when the answers are too long for a word diff
+DIFF_CHUNK_WORDS = 60
+# Diffs kept per process, and the total characters of HTML they may hold
+DIFF_CACHE_SIZE = 512
+DIFF_CACHE_CHARS = 32 * 1024 * 1024
+# How long a rerun waits for a diff before showing the plain answers instead
+DIFF_WAIT_SECONDS = 0.3
+# Rows the reviewer is likely to open next, diffed in the background
+DIFF_PREFETCH_ROWS = 3
+# Cached in place of a diff larger than the whole cache: the answers are shown unhighlighted
+PLAIN_DIFF = ("", "", "plain")
+
+# A word or punctuation mark with the whitespace before it
+_TOKEN = re.compile(r"\s*(?:\w+|[^\w\s])")
+_SENTENCE_END = re.compile(r"[.!?;:]$")
+
+
+def tokenize(text):
+    return _TOKEN.findall("" if text is None else str(text))
+
+
+def _sentences(tokens):
+    """Split tokens into sentences of at most ``DIFF_CHUNK_WORDS`` tokens."""
+    units, start = [], 0
+    for i, token in enumerate(tokens):
+        if i + 1 - start >= DIFF_CHUNK_WORDS or _SENTENCE_END.search(token) \
+                or (i + 1 < len(tokens) and "\n" in tokens[i + 1]):
+            units.append(tokens[start:i + 1])
+            start = i + 1
+    if start < len(tokens):
+        units.append(tokens[start:])
+    return units
+
+
+def _key(tokens):
+    return [token.strip().lower() for token in tokens]
+
+
+def _word_diff(a, b, out_a, out_b):
+    matcher = difflib.SequenceMatcher(None, _key(a), _key(b), autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        out_a.append((tag != 'equal', a[i1:i2]))
+        out_b.append((tag != 'equal', b[j1:j2]))
+
+
+def diff_tokens(answer, gold):
+    """Diff two texts into ``(answer_segments, gold_segments, level)``.
+
+    Segments are ``(changed, tokens)`` pairs; ``level`` is ``"words"`` when
+    the whole texts were diffed word by word and ``"sentences"`` when they
+    were aligned sentence by sentence first.
+    """
+    a, b = tokenize(answer), tokenize(gold)
+    out_a, out_b = [], []
+    if len(a) * len(b) <= MAX_DIFF_COST:
+        _word_diff(a, b, out_a, out_b)
+        return out_a, out_b, "words"
+
+    units_a, units_b = _sentences(a), _sentences(b)
+    if len(units_a) * len(units_b) > MAX_ALIGN_COST:
+        # Too long even to align: only an identical pair shows as unchanged
+        same = _key(a) == _key(b)
+        return [(not same, a)], [(not same, b)], "sentences"
+    matcher = difflib.SequenceMatcher(
+        None, [" ".join(_key(unit)) for unit in units_a], [" ".join(_key(unit)) for unit in units_b], autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        part_a = [token for unit in units_a[i1:i2] for token in unit]
+        part_b = [token for unit in units_b[j1:j2] for token in unit]
+        if tag == 'replace' and len(part_a) * len(part_b) <= MAX_DIFF_COST:
+            _word_diff(part_a, part_b, out_a, out_b)
+        else:
+            out_a.append((tag != 'equal', part_a))
+            out_b.append((tag != 'equal', part_b))
+    return out_a, out_b, "sentences"
+
+
+def segments_html(segments, changed_class):
+    """HTML of diff segments, wrapping changed ones in ``<span class="changed_class">``."""
+    parts = []
+    for changed, tokens in segments:
+        if not tokens:
+            continue
+        text = html.escape("".join(tokens)).replace("\n", "<br>")
+        parts.append(f'<span class="{changed_class}">{text}</span>' if changed else text)
+    return "".join(parts)
+
+
+def diff_html(answer, gold):
+    """``(answer_html, gold_html, level)`` with removed and added words highlighted."""
+    out_a, out_b, level = diff_tokens(answer, gold)
+    return segments_html(out_a, "diff-del"), segments_html(out_b, "diff-ins"), level
+
+
+class AnswerDiffCache:
+    """Per-process LRU of answer diffs, keyed by the answer pair's content hash.
+
+    ``get()`` waits at most ``DIFF_WAIT_SECONDS`` for a diff (None if it is
+    still being computed; it is cached once done), and ``prefetch()``
+    queues diffs for rows the reviewer is likely to open next.  A diff
+    larger than ``max_chars`` is cached and returned as ``PLAIN_DIFF``, so
+    callers polling for it stop once it has been computed.
+    """
+
+    def __init__(self, max_items=DIFF_CACHE_SIZE, max_chars=DIFF_CACHE_CHARS):
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self._cache = OrderedDict()
+        self._chars = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._workers = ThreadPoolExecutor(max_workers=2, thread_name_prefix="answer-diff")
+        self.hits = 0
+        self.misses = 0
+
+    def _compute(self, key, answer, gold):
+        try:
+            result = diff_html(answer, gold)
+            size = len(result[0]) + len(result[1])
+            if size > self.max_chars:
+                result, size = PLAIN_DIFF, 0
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = result
+                    self._chars += size
+                    while len(self._cache) > self.max_items or self._chars > self.max_chars:
+                        _, (old_a, old_b, _) = self._cache.popitem(last=False)
+                        self._chars -= len(old_a) + len(old_b)
+            return result
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _submit(self, key, answer, gold):
+        """Cached result or the future computing it (lock held)."""
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached, None
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = self._workers.submit(self._compute, key, answer, gold)
+        return None, future
+
+    def get(self, answer, gold, timeout=DIFF_WAIT_SECONDS):
+        """``(answer_html, gold_html, level)`` of the pair, or None if not ready within ``timeout``."""
+        key = pair_hash(answer, gold)
+        with self._lock:
+            cached, future = self._submit(key, answer, gold)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            return None
+
+    def prefetch(self, pairs):
+        """Diff ``(answer, gold)`` pairs in the background unless cached or already queued."""
+        with self._lock:
+            for answer, gold in pairs:
+                self._submit(pair_hash(answer, gold), answer, gold)
+
+    def clear(self):
+        """Drop the cached diffs (queued ones still finish)."""
+        with self._lock:
+            self._cache.clear()
+            self._chars = 0
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._cache), 'chars': self._chars, 'hits': self.hits, 'misses': self.misses}
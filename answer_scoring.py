@@ -0,0 +1,223 @@
+# answer_scoring.py
+"""Offline lexical scoring of model answers against gold answers.
+
+Usage: python answer_scoring.py [INPUT_FILE] [--workers N]
+
+Scores every row of the input with exact match, token F1, ROUGE-L (LCS)
+and character 3-gram similarity, in parallel across processes.  Results
+are cached per (Answer, Gold Answer) content hash next to the input, so
+re-runs only score rows whose text changed.
+"""
+import argparse
+import hashlib
+import os
+import re
+import string
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from dataset_loader import HAVE_PYARROW, load_dataset_cached
+
+SCORE_COLUMNS = ['exact_match', 'token_f1', 'rouge_l', 'char_ngram']
+# Rows handed to a worker process per task
+SCORING_CHUNK_SIZE = 2000
+CHAR_NGRAM = 3
+
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+
+
+# -------------------------
+# Metrics
+# -------------------------
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = _PUNCTUATION.sub(" ", str(text).lower())
+    return " ".join(text.split())
+
+
+def token_f1(pred_tokens, gold_tokens):
+    if not pred_tokens or not gold_tokens:
+        return float(pred_tokens == gold_tokens)
+    common = sum((Counter(pred_tokens) & Counter(gold_tokens)).values())
+    if common == 0:
+        return 0.0
+    precision = common / len(pred_tokens)
+    recall = common / len(gold_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def lcs_length(a, b):
+    """Length of the longest common subsequence of two token lists.
+
+    Bit-parallel (Hyyrö) over Python integers: O(len(b)) big-int
+    operations instead of the O(len(a) * len(b)) dynamic programme.
+    """
+    if not a or not b:
+        return 0
+    masks = {}
+    for i, token in enumerate(a):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    v = full
+    for token in b:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - bin(v).count("1")
+
+
+def rouge_l(pred_tokens, gold_tokens):
+    lcs = lcs_length(pred_tokens, gold_tokens)
+    if lcs == 0:
+        return 0.0
+    precision = lcs / len(pred_tokens)
+    recall = lcs / len(gold_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def char_ngram_similarity(pred, gold, n=CHAR_NGRAM):
+    """Dice coefficient over the character n-gram sets of two normalized strings."""
+    pred_grams = {pred[i:i + n] for i in range(max(len(pred) - n + 1, 1))}
+    gold_grams = {gold[i:i + n] for i in range(max(len(gold) - n + 1, 1))}
+    if not pred_grams or not gold_grams:
+        return 0.0
+    return 2 * len(pred_grams & gold_grams) / (len(pred_grams) + len(gold_grams))
+
+
+def score_pair(answer, gold):
+    """Return the four similarity scores for one (answer, gold) pair."""
+    pred = normalize_text(answer)
+    ref = normalize_text(gold)
+    pred_tokens = pred.split()
+    gold_tokens = ref.split()
+    return (
+        float(pred == ref),
+        token_f1(pred_tokens, gold_tokens),
+        rouge_l(pred_tokens, gold_tokens),
+        char_ngram_similarity(pred, ref),
+    )
+
+
+def _score_chunk(pairs):
+    return [score_pair(answer, gold) for answer, gold in pairs]
+
+
+# -------------------------
+# Cached batch scoring
+# -------------------------
+def _text(value):
+    return "" if value is None or pd.isna(value) else str(value)
+
+
+def pair_hash(answer, gold):
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(_text(answer).encode('utf-8'))
+    digest.update(b"\x1f")
+    digest.update(_text(gold).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def scores_path(input_path):
+    return f"{input_path}.scores.{'parquet' if HAVE_PYARROW else 'pkl'}"
+
+
+def load_score_cache(path):
+    """Return cached scores as a frame indexed by pair hash (empty if missing)."""
+    if os.path.exists(path):
+        try:
+            if path.endswith('.parquet'):
+                return pd.read_parquet(path).set_index('hash')
+            return pd.read_pickle(path)
+        except Exception:
+            pass
+    return pd.DataFrame(columns=SCORE_COLUMNS, dtype=float).rename_axis('hash')
+
+
+def _save_score_cache(cache, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if path.endswith('.parquet'):
+        cache.reset_index().to_parquet(tmp_path, index=False)
+    else:
+        cache.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def row_hashes(df):
+    answers = df['Answer'].fillna("").astype(str).tolist()
+    golds = df['Gold Answer'].fillna("").astype(str).tolist()
+    return [pair_hash(a, g) for a, g in zip(answers, golds)], answers, golds
+
+
+def align_scores(df, cache):
+    """Return cached scores reindexed to the rows of ``df`` (NaN where unscored)."""
+    hashes, _, _ = row_hashes(df)
+    scores = cache.reindex(hashes)
+    scores.index = pd.RangeIndex(len(hashes))
+    return scores
+
+
+def score_dataset(df, cache_path, workers=None, progress=None):
+    """Score every row of ``df`` and return a frame of scores aligned with its rows.
+
+    Only pairs missing from the cache are scored; identical pairs are
+    scored once.  ``progress(done, total)`` is called as chunks finish.
+    """
+    hashes, answers, golds = row_hashes(df)
+
+    cache = load_score_cache(cache_path)
+    missing = {}
+    known = set(cache.index)
+    for h, a, g in zip(hashes, answers, golds):
+        if h not in known and h not in missing:
+            missing[h] = (a, g)
+
+    if missing:
+        keys = list(missing)
+        pairs = [missing[k] for k in keys]
+        chunks = [pairs[i:i + SCORING_CHUNK_SIZE] for i in range(0, len(pairs), SCORING_CHUNK_SIZE)]
+        results = []
+        if len(chunks) == 1 or workers == 1:
+            for chunk in chunks:
+                results.extend(_score_chunk(chunk))
+                if progress:
+                    progress(len(results), len(pairs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for scored in pool.map(_score_chunk, chunks):
+                    results.extend(scored)
+                    if progress:
+                        progress(len(results), len(pairs))
+        fresh = pd.DataFrame(results, columns=SCORE_COLUMNS, index=pd.Index(keys, name='hash'))
+        cache = fresh if cache.empty else pd.concat([cache, fresh])
+        # Keep only pairs that are still in the dataset
+        cache = cache[cache.index.isin(set(hashes))]
+        _save_score_cache(cache, cache_path)
+
+    scores = cache.reindex(hashes)
+    scores.index = pd.RangeIndex(len(hashes))
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score model answers against gold answers.")
+    parser.add_argument("input", nargs="?", default="qa_dataset - Sheet1.csv", help="input .csv or .xlsx file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df = load_dataset_cached(args.input)
+
+    def report(done, total):
+        print(f"\rScored {done}/{total} new pairs", end="", file=sys.stderr, flush=True)
+
+    scores = score_dataset(df, scores_path(args.input), workers=args.workers, progress=report)
+    print(file=sys.stderr)
+    print(f"Scored {len(scores)} rows in {time.perf_counter() - start:.1f}s -> {scores_path(args.input)}")
+    print(scores.mean().round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
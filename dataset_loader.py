@@ -0,0 +1,401 @@
+# dataset_loader.py
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Question', 'Answer', 'Gold Answer']
+
+# Bytes scanned per step while building the row index
+INDEX_CHUNK_SIZE = 16 * 1024 * 1024
+# Parsed rows kept in memory per dataset
+ROW_CACHE_SIZE = 256
+# Bytes read per step while hashing an input file
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+# pyarrow enables the Parquet cache and Arrow-backed string columns
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def check_columns(columns):
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+
+def file_signature(path):
+    """Cheap change detector for an input file: (size, mtime_ns)."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# -------------------------
+# Columnar (Parquet) cache of the input
+# -------------------------
+def _cache_meta_path(path):
+    return f"{path}.cache.json"
+
+
+_CACHE_META_KEYS = ('size', 'mtime_ns', 'hash', 'parquet')
+
+
+def _read_cache_meta(path):
+    try:
+        with open(_cache_meta_path(path), encoding='utf-8') as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or any(key not in meta for key in _CACHE_META_KEYS):
+        return None
+    return meta
+
+
+def _read_parquet_cache(meta):
+    """Return the cached frame, or None if the cache file is missing or unreadable."""
+    if not meta or not os.path.exists(meta['parquet']):
+        return None
+    try:
+        return pd.read_parquet(meta['parquet'], dtype_backend='pyarrow')
+    except Exception:
+        # Truncated or corrupt cache file: it is rebuilt from the source
+        return None
+
+
+def _write_cache_meta(path, meta):
+    meta_path = _cache_meta_path(path)
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_path, meta_path)
+
+
+def _load_cached(path, parse, variant=""):
+    """Load ``path`` through a Parquet cache keyed on size + mtime + content hash.
+
+    ``parse(path)`` produces the frame on a cache miss; ``variant``
+    distinguishes different parses of the same file (e.g. sheet choices).
+    A size/mtime match reuses the cache without reading the source.  If
+    only the mtime changed (file touched or copied), the content hash
+    decides.  An unreadable cache file is rebuilt.
+    """
+    if not HAVE_PYARROW:
+        return parse(path)
+
+    cache_key = f"{path}{variant}"
+    size, mtime_ns = file_signature(path)
+    meta = _read_cache_meta(cache_key)
+    if meta and meta['size'] == size and meta['mtime_ns'] == mtime_ns:
+        cached = _read_parquet_cache(meta)
+        if cached is not None:
+            return cached
+    digest = content_hash(path)
+    if meta and meta['size'] == size and meta['hash'] == digest:
+        cached = _read_parquet_cache(meta)
+        if cached is not None:
+            meta['mtime_ns'] = mtime_ns
+            _write_cache_meta(cache_key, meta)
+            return cached
+
+    df_local = parse(path)
+    parquet_path = f"{cache_key}.{digest}.parquet"
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        df_local.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+        _write_cache_meta(cache_key, {'size': size, 'mtime_ns': mtime_ns, 'hash': digest, 'parquet': parquet_path})
+        if meta and meta.get('parquet') not in (None, parquet_path) and os.path.exists(meta['parquet']):
+            os.remove(meta['parquet'])
+    except OSError:
+        # Read-only data directory: serve the parsed frame without caching
+        pass
+    return df_local
+
+
+def _parse_csv(path):
+    if HAVE_PYARROW:
+        df_local = pd.read_csv(path, engine='pyarrow', dtype_backend='pyarrow')
+    else:
+        df_local = pd.read_csv(path)
+    check_columns(df_local.columns)
+    return df_local
+
+
+def load_csv_cached(path):
+    """Load a CSV through the Parquet cache (plain ``read_csv`` without pyarrow)."""
+    return _load_cached(path, _parse_csv)
+
+
+# -------------------------
+# Excel workbooks
+# -------------------------
+ALL_SHEETS = "*"
+
+
+def parse_sheets(value):
+    """Parse a sheet choice as given in ``QA_INPUT_SHEETS`` or ``--sheets``.
+
+    Returns None (first sheet) for an empty value, ``ALL_SHEETS`` for "*",
+    or a tuple of the comma-separated sheet names.
+    """
+    value = (value or "").strip()
+    if value == ALL_SHEETS:
+        return ALL_SHEETS
+    return tuple(name.strip() for name in value.split(",") if name.strip()) or None
+
+
+def _open_workbook(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Reading .xlsx files requires openpyxl (pip install openpyxl)")
+    # read_only streams rows from the zip instead of building the whole DOM
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def list_sheets(path):
+    workbook = _open_workbook(path)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _read_sheet(worksheet):
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return None
+    header = ["" if h is None else str(h).strip() for h in header]
+    width = len(header)
+    records = [
+        ["" if v is None else str(v) for v in values[:width]]
+        for values in rows
+        if any(v is not None for v in values)
+    ]
+    frame = pd.DataFrame.from_records(records, columns=header)
+    return frame[[c for c in frame.columns if c]]
+
+
+def read_xlsx(path, sheets=None):
+    """Read one or more sheets of a workbook as a single frame.
+
+    ``sheets`` is None (first sheet), ``ALL_SHEETS`` or a list of sheet
+    names.  With more than one sheet the rows are concatenated in sheet
+    order and a ``Sheet`` column records where each row came from.
+    """
+    workbook = _open_workbook(path)
+    try:
+        if sheets == ALL_SHEETS:
+            names = list(workbook.sheetnames)
+        elif sheets:
+            names = list(sheets)
+        else:
+            names = list(workbook.sheetnames[:1])
+        frames = []
+        for name in names:
+            if name not in workbook.sheetnames:
+                raise ValueError(f"Sheet not found: {name}")
+            frame = _read_sheet(workbook[name])
+            if frame is None:
+                continue
+            if len(names) > 1:
+                frame['Sheet'] = name
+            frames.append(frame)
+    finally:
+        workbook.close()
+    if not frames:
+        raise ValueError(f"No data found in workbook: {path}")
+    df_local = pd.concat(frames, ignore_index=True)
+    check_columns(df_local.columns)
+    if HAVE_PYARROW:
+        df_local = df_local.astype("string[pyarrow]")
+    return df_local
+
+
+def sheets_variant(sheets):
+    """Cache-file suffix identifying a choice of workbook sheets ('' for the default)."""
+    if sheets in (None, ALL_SHEETS):
+        return "" if sheets is None else ".all"
+    return "." + hashlib.blake2b("\x00".join(sheets).encode('utf-8'), digest_size=4).hexdigest()
+
+
+def load_xlsx_cached(path, sheets=None):
+    """Load a workbook through the Parquet cache, parsing it only once per content."""
+    return _load_cached(path, lambda p: read_xlsx(p, sheets), sheets_variant(sheets))
+
+
+def load_dataset_cached(path, sheets=None):
+    """Load a .csv or .xlsx input through the Parquet cache."""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        return load_xlsx_cached(path, sheets)
+    return load_csv_cached(path)
+
+
+# -------------------------
+# Byte-offset row index
+# -------------------------
+def build_row_offsets(buf):
+    """Return the byte offset of every record start in a CSV buffer, plus len(buf).
+
+    A newline ends a record only when it is outside a quoted field, i.e. when
+    an even number of quote characters precede it.  Escaped quotes (``""``)
+    count twice, so the parity rule still holds.  Works in fixed-size
+    chunks with NumPy so memory stays flat for multi-GB files.
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    starts = [np.zeros(1, dtype=np.int64)]
+    parity = 0
+    for begin in range(0, len(data), INDEX_CHUNK_SIZE):
+        chunk = data[begin:begin + INDEX_CHUNK_SIZE]
+        quotes = np.flatnonzero(chunk == ord('"'))
+        newlines = np.flatnonzero(chunk == ord('\n'))
+        quotes_before = np.searchsorted(quotes, newlines) + parity
+        ends = newlines[quotes_before % 2 == 0]
+        starts.append(ends.astype(np.int64) + begin + 1)
+        parity = (parity + len(quotes)) % 2
+    offsets = np.concatenate(starts)
+    offsets = offsets[offsets < len(data)]
+    offsets = np.append(offsets, len(data))
+    # Drop blank lines ("\n" or "\r\n"); a real record has at least two commas
+    keep = np.append(np.diff(offsets) > 2, True)
+    return offsets[keep]
+
+
+def _index_path(path):
+    return f"{path}.rowindex.npz"
+
+
+def load_row_offsets(path):
+    """Load the persisted row index for ``path``, rebuilding it if the file changed."""
+    stat = os.stat(path)
+    index_path = _index_path(path)
+    if os.path.exists(index_path):
+        try:
+            with np.load(index_path) as saved:
+                if int(saved['size']) == stat.st_size and int(saved['mtime_ns']) == stat.st_mtime_ns:
+                    return saved['offsets']
+        except Exception:
+            pass
+
+    with open(path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = build_row_offsets(mm)
+    tmp_path = f"{index_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as fh:
+            np.savez(fh, offsets=offsets, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        # Read-only data directory: keep the index in memory only
+        pass
+    return offsets
+
+
+# -------------------------
+# Lazy, row-addressable CSV dataset
+# -------------------------
+class _RowIndexer:
+    def __init__(self, dataset):
+        self._dataset = dataset
+
+    def __getitem__(self, position):
+        return self._dataset.row(position)
+
+
+class LazyCSVDataset:
+    """Read-only CSV dataset that parses rows on demand.
+
+    Only the byte-offset index (8 bytes per row) is held in memory; rows are
+    sliced out of a memory-mapped file and parsed when accessed.  Supports
+    the small part of the DataFrame API the app uses: ``len()``,
+    ``.columns``, ``.iloc[i]`` and ``take()``; exports and compaction stream
+    the file in chunks (see ``iter_row_chunks``).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.getsize(path) == 0:
+            raise ValueError(f"Input file is empty: {path}")
+        self._offsets = load_row_offsets(path)
+        self._fh = open(path, 'rb')
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self._mm[self._offsets[0]:self._offsets[1]].decode('utf-8-sig')
+        self.columns = next(csv.reader(io.StringIO(header)))
+        check_columns(self.columns)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.iloc = _RowIndexer(self)
+
+    def __len__(self):
+        return len(self._offsets) - 2
+
+    def _parse(self, position):
+        start, end = self._offsets[position + 1], self._offsets[position + 2]
+        text = self._mm[start:end].decode('utf-8')
+        values = next(csv.reader(io.StringIO(text)), [])
+        values += [""] * (len(self.columns) - len(values))
+        return pd.Series(values[:len(self.columns)], index=self.columns, name=position)
+
+    def row(self, position):
+        """Return row ``position`` as a Series, using the row cache."""
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(f"Row {position} out of range")
+        with self._lock:
+            cached = self._cache.get(position)
+            if cached is not None:
+                self._cache.move_to_end(position)
+                return cached
+        parsed = self._parse(position)
+        with self._lock:
+            self._cache[position] = parsed
+            while len(self._cache) > ROW_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return parsed
+
+    def prefetch(self, position, radius=2):
+        """Parse the neighbours of ``position`` in the background."""
+        for neighbour in range(position - radius, position + radius + 1):
+            if 0 <= neighbour < len(self) and neighbour not in self._cache:
+                self._prefetcher.submit(self.row, neighbour)
+
+    def take(self, positions):
+        """Return the rows at ``positions`` as a DataFrame, bypassing the row cache."""
+        rows = [self._parse(int(position)) for position in positions]
+        return pd.DataFrame(rows, columns=self.columns).reset_index(drop=True)
+
+
+def iter_row_chunks(df, columns, chunk_size):
+    """Yield ``columns`` of a DataFrame or lazy dataset in frames of ``chunk_size`` rows.
+
+    Lazy datasets are streamed from their file (as strings), never loaded whole.
+    """
+    if isinstance(df, LazyCSVDataset):
+        yield from pd.read_csv(df.path, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        return
+    for start in range(0, len(df), chunk_size):
+        yield df[columns].iloc[start:start + chunk_size]
+
+
+def iter_column_chunks(df, columns, chunk_size):
+    """Yield ``columns`` of a DataFrame or lazy dataset as string frames of ``chunk_size`` rows."""
+    for chunk in iter_row_chunks(df, columns, chunk_size):
+        yield chunk.fillna("").astype(str)
@@ -0,0 +1,129 @@
+# memory_budget.py
+"""Per-process memory budget and footprint report.
+
+``footprint()`` estimates the bytes held by the app's shared structures
+(the input data, the review frame and records, the ratings matrix, ...)
+and ``session_bytes()`` what one session keeps in its session state, so
+the admin panel can tell how many more sessions fit in the budget.
+Over the budget, ``shed()`` empties the caches the app can rebuild.
+Containers are measured on a sample of their items, so a report over a
+million reviews stays cheap.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Items measured per container; the rest is extrapolated
+SAMPLE_ITEMS = 1000
+# Nesting followed into containers and object attributes
+MAX_DEPTH = 4
+# Rough allowance for Streamlit's own per-session objects (script runner,
+# widget states, message cache) on top of what session_state holds
+SESSION_OVERHEAD_BYTES = 1024 * 1024
+
+
+def estimate_bytes(obj, depth=0, _seen=None):
+    """Approximate deep size of ``obj`` in bytes."""
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object and obj.size:
+            return obj.nbytes + _sampled(obj.ravel().tolist(), depth, _seen)
+        return obj.nbytes
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return sys.getsizeof(obj)
+    if depth >= MAX_DEPTH:
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        items = list(obj.items()) if len(obj) <= SAMPLE_ITEMS else _sample(obj.items(), len(obj))
+        per_item = sum(estimate_bytes(k, depth + 1, _seen) + estimate_bytes(v, depth + 1, _seen) for k, v in items)
+        return sys.getsizeof(obj) + int(per_item * len(obj) / max(len(items), 1))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + _sampled(list(obj), depth, _seen)
+    attrs = getattr(obj, '__dict__', None)
+    if attrs is not None:
+        return sys.getsizeof(obj) + sum(
+            estimate_bytes(value, depth + 1, _seen) for name, value in attrs.items()
+            if not callable(value)
+        )
+    return sys.getsizeof(obj)
+
+
+def _sample(items, n):
+    step = max(1, n // SAMPLE_ITEMS)
+    return [item for i, item in enumerate(items) if i % step == 0][:SAMPLE_ITEMS]
+
+
+def _sampled(values, depth, seen):
+    if not values:
+        return 0
+    sample = values if len(values) <= SAMPLE_ITEMS else values[::len(values) // SAMPLE_ITEMS][:SAMPLE_ITEMS]
+    return int(sum(estimate_bytes(value, depth + 1, seen) for value in sample) * len(values) / len(sample))
+
+
+def process_rss():
+    """Resident set size of this process in bytes (None where it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak, not current, RSS; reported in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class MemoryBudget:
+    """Memory budget of one app process (``limit_mb`` 0: no limit)."""
+
+    def __init__(self, limit_mb=0):
+        self.limit = int(limit_mb * 1024 * 1024)
+
+    def status(self):
+        """``(rss_bytes, limit_bytes, over)``; ``over`` is False without a limit or RSS reading."""
+        rss = process_rss()
+        return rss, self.limit, bool(self.limit and rss is not None and rss > self.limit)
+
+    def shed(self, *caches):
+        """Empty ``caches`` (objects with ``clear()``) when over the limit; returns whether it was over.
+
+        Freed memory is reused by the process but not always returned to
+        the OS, so the RSS may stay over the limit; the caches stop growing.
+        """
+        over = self.status()[2]
+        if over:
+            for cache in caches:
+                cache.clear()
+        return over
+
+    def footprint(self, components):
+        """Estimated bytes per shared component, largest first, as a frame in MB."""
+        rows = [(name, estimate_bytes(obj) / 1024 / 1024) for name, obj in components.items()]
+        frame = pd.DataFrame(rows, columns=['Component', 'MB'])
+        return frame.sort_values('MB', ascending=False).reset_index(drop=True)
+
+    def sessions_that_fit(self, per_session_bytes):
+        """How many more sessions holding ``per_session_bytes`` of state fit under the limit (None without a limit)."""
+        rss, limit, _ = self.status()
+        if not limit or rss is None:
+            return None
+        return max(0, (limit - rss) // (per_session_bytes + SESSION_OVERHEAD_BYTES))
+
+
+def session_bytes(session_state):
+    """Estimated bytes held by one session's state (functions and widgets' callbacks excluded)."""
+    return sum(
+        estimate_bytes(session_state[key]) for key in list(session_state.keys())
+        if not callable(session_state[key])
+    )
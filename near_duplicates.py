@@ -0,0 +1,288 @@
+# near_duplicates.py
+"""Near-duplicate clusters over the Question / Answer columns (MinHash + LSH).
+
+Every row's Question + Answer is cut into word bigrams and summarised by a
+MinHash signature of ``NUM_PERM`` 16-bit values, so two rows agree on a
+signature value with a probability equal to the Jaccard similarity of
+their bigram sets.  Locality-sensitive hashing splits the signature into
+``BANDS`` bands: rows sharing any whole band become candidates, each
+candidate is checked against its bucket's first row by estimated
+similarity, and the confirmed pairs are merged into clusters.  No step
+compares all pairs, so a million rows cluster in a couple of minutes.
+Clusters chain rows through intermediate ones, so the near-duplicates of
+a row are the members of its cluster whose own estimated similarity to
+it reaches ``SIMILARITY_THRESHOLD``.
+
+Signatures are stored next to the input as ``<input>.neardup.npz`` with
+the content keys of their rows (see row_identity).  When the input
+changes, the signatures of rows whose content is unchanged are reused and
+only new or edited rows are hashed again before re-clustering.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from answer_scoring import normalize_text
+from dataset_loader import iter_column_chunks
+from row_identity import RowKeys
+
+DUPLICATE_COLUMNS = ['Question', 'Answer']
+# MinHash values per row, split into BANDS bands of NUM_PERM // BANDS values.
+# With 8 bands of 4, rows at 0.5 similarity become candidates about 40% of
+# the time and rows at 0.8 about 98% of the time
+NUM_PERM = 32
+BANDS = 8
+# Candidates whose signatures agree on at least this fraction of values
+# (the estimated Jaccard similarity of their word bigrams) are clustered
+SIMILARITY_THRESHOLD = 0.7
+# Rows hashed per step while building (their words are held as Python strings)
+DUPLICATE_BATCH_SIZE = 10_000
+# Candidate pairs verified per step
+PAIR_BATCH_SIZE = 1_000_000
+# Seed of the MinHash permutations (changing it invalidates stored signatures)
+MINHASH_SEED = 20240611
+
+_ROWS_PER_BAND = NUM_PERM // BANDS
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_rng = np.random.default_rng(MINHASH_SEED)
+_PERM_MUL = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_XOR = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+
+def _signatures_path(path):
+    return f"{path}.neardup.npz"
+
+
+def _shingles(texts):
+    """Hash every row's word bigrams (its only word, for one-word rows).
+
+    Returns the uint64 shingle hashes, grouped by row in row order, and the
+    number of shingles of each row.
+    """
+    tokens = [normalize_text(text).split() for text in texts]
+    counts = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    flat = pd.Series([token for row in tokens for token in row], dtype=object)
+    words = pd.util.hash_array(flat.to_numpy(), categorize=True) if len(flat) else np.empty(0, dtype=np.uint64)
+    ends = np.cumsum(counts) - 1
+    is_last = np.zeros(len(words), dtype=bool)
+    is_last[ends[counts > 0]] = True
+    row_of = np.repeat(np.arange(len(texts)), counts)
+    # Pair each word with the next one in its row; a one-word row keeps its word
+    following = np.zeros_like(words)
+    following[:-1] = words[1:]
+    shingles = np.where(is_last, words, words * _MIX + following)
+    keep = ~is_last | (counts == 1)[row_of]
+    return shingles[keep], np.bincount(row_of[keep], minlength=len(texts))
+
+
+def minhash(texts):
+    """MinHash signatures of ``texts`` as a ``(len(texts), NUM_PERM)`` uint16 array.
+
+    Rows without any word get an all-zero signature; the returned boolean
+    mask tells them apart.
+    """
+    shingles, per_row = _shingles(texts)
+    signatures = np.zeros((len(texts), NUM_PERM), dtype=np.uint16)
+    has_text = per_row > 0
+    if not has_text.any():
+        return signatures, has_text
+    starts = (np.cumsum(per_row) - per_row)[has_text]
+    for perm in range(NUM_PERM):
+        hashed = (shingles ^ _PERM_XOR[perm]) * _PERM_MUL[perm]
+        hashed ^= hashed >> np.uint64(32)
+        lowest = np.minimum.reduceat(hashed, starts)
+        # Keep 16 well-mixed bits of each minimum (b-bit MinHash)
+        signatures[has_text, perm] = ((lowest * _MIX) >> np.uint64(48)).astype(np.uint16)
+    return signatures, has_text
+
+
+def _candidate_pairs(signatures, has_text):
+    """Rows sharing an LSH band with another row, paired with their bucket's first row."""
+    rows = np.flatnonzero(has_text)
+    firsts, seconds = [], []
+    for band in range(BANDS):
+        values = signatures[rows, band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND].astype(np.uint64)
+        key = np.zeros(len(rows), dtype=np.uint64)
+        for column in range(_ROWS_PER_BAND):
+            key |= values[:, column] << np.uint64(16 * column)
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        new_bucket = np.ones(len(key), dtype=bool)
+        new_bucket[1:] = key[1:] != key[:-1]
+        head = order[np.maximum.accumulate(np.where(new_bucket, np.arange(len(key)), 0))]
+        member = ~new_bucket
+        firsts.append(rows[head[member]])
+        seconds.append(rows[order[member]])
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.unique(np.concatenate(firsts).astype(np.int64) * len(signatures) + np.concatenate(seconds))
+    return pairs // len(signatures), pairs % len(signatures)
+
+
+def _components(n, firsts, seconds):
+    """Connected components of the pairs; each row's label is the smallest row id of its component."""
+    labels = np.arange(n, dtype=np.int64)
+    while len(firsts):
+        roots_a, roots_b = labels[firsts], labels[seconds]
+        apart = roots_a != roots_b
+        firsts, seconds, roots_a, roots_b = firsts[apart], seconds[apart], roots_a[apart], roots_b[apart]
+        if not len(firsts):
+            break
+        # Hook the larger root under the smaller one, then flatten the trees
+        low = np.minimum(roots_a, roots_b)
+        np.minimum.at(labels, roots_a, low)
+        np.minimum.at(labels, roots_b, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+def cluster_signatures(signatures, has_text):
+    """Cluster label of every row: rows with a label in common are near-duplicates."""
+    firsts, seconds = _candidate_pairs(signatures, has_text)
+    similar = np.zeros(len(firsts), dtype=bool)
+    for start in range(0, len(firsts), PAIR_BATCH_SIZE):
+        stop = start + PAIR_BATCH_SIZE
+        agree = (signatures[firsts[start:stop]] == signatures[seconds[start:stop]]).mean(axis=1)
+        similar[start:stop] = agree >= SIMILARITY_THRESHOLD
+    return _components(len(signatures), firsts[similar], seconds[similar])
+
+
+class NearDuplicateIndex:
+    """Near-duplicate clusters of one version of the input dataset.
+
+    ``build_in_background()`` loads or (re)builds the signatures on a
+    daemon thread; ``ready`` turns True once the clusters are available.
+    """
+
+    def __init__(self, input_path, variant=""):
+        self.input_path = input_path
+        self.signatures_path = _signatures_path(f"{input_path}{variant}")
+        self._build_lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+        self.ready = False
+        self.reused = 0
+
+    def _load_saved(self):
+        try:
+            with np.load(self.signatures_path) as saved:
+                if int(saved['seed']) != MINHASH_SEED or saved['signatures'].shape[1:] != (NUM_PERM,):
+                    return None
+                return {name: saved[name] for name in saved.files}
+        except Exception:
+            return None
+
+    def _hash_rows(self, df, todo, signatures, has_text):
+        """Fill in the signatures of the rows flagged in ``todo``, reading ``df`` chunk by chunk."""
+        start = 0
+        for chunk in iter_column_chunks(df, DUPLICATE_COLUMNS, DUPLICATE_BATCH_SIZE):
+            stop = start + len(chunk)
+            rows = np.flatnonzero(todo[start:stop])
+            if len(rows):
+                texts = (chunk['Question'] + " " + chunk['Answer']).to_numpy()[rows].tolist()
+                signatures[start + rows], has_text[start + rows] = minhash(texts)
+            start = stop
+
+    def build(self, df, row_keys):
+        """Cluster every row of ``df``, reusing the stored signatures of rows whose content is unchanged."""
+        with self._build_lock:
+            n = len(row_keys)
+            saved = self._load_saved()
+            if saved is not None and len(saved['question']) == n \
+                    and np.array_equal(saved['question'], row_keys.question_hashes) \
+                    and np.array_equal(saved['answer'], row_keys.answer_hashes):
+                self._set(saved['signatures'], saved['has_text'], saved['labels'])
+                self.reused = n
+                return
+
+            signatures = np.zeros((n, NUM_PERM), dtype=np.uint16)
+            has_text = np.zeros(n, dtype=bool)
+            todo = np.ones(n, dtype=bool)
+            if saved is not None:
+                # New input version: carry over the signatures of rows already hashed
+                previous = RowKeys(saved['question'], saved['answer'])
+                found = previous.hash_positions(row_keys.question_hashes, row_keys.answer_hashes)
+                known = found >= 0
+                signatures[known] = saved['signatures'][found[known]]
+                has_text[known] = saved['has_text'][found[known]]
+                todo = ~known
+            self.reused = int(n - todo.sum())
+            if todo.any():
+                self._hash_rows(df, todo, signatures, has_text)
+            labels = cluster_signatures(signatures, has_text)
+
+            tmp_path = f"{self.signatures_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as fh:
+                    np.savez(
+                        fh, question=row_keys.question_hashes, answer=row_keys.answer_hashes,
+                        signatures=signatures, has_text=has_text, labels=labels, seed=MINHASH_SEED,
+                    )
+                os.replace(tmp_path, self.signatures_path)
+            except OSError:
+                # Read-only data directory: keep the clusters in memory only
+                pass
+            self._set(signatures, has_text, labels)
+
+    def _set(self, signatures, has_text, labels):
+        self.signatures = signatures
+        self.has_text = has_text
+        self.labels = labels
+        self._order = np.argsort(labels, kind='stable')
+        self._sorted_labels = labels[self._order]
+        self._sizes = np.bincount(labels, minlength=len(labels))
+        self.ready = True
+
+    def build_in_background(self, df, row_keys):
+        """Start ``build(df, row_keys)`` on a daemon thread unless the clusters are loaded or already building."""
+        if self.ready or (self._thread is not None and self._thread.is_alive()):
+            return self._thread
+
+        def run():
+            try:
+                self.build(df, row_keys)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+        self._thread = threading.Thread(target=run, name="near-duplicates", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def cluster_size(self, row_id):
+        """Number of rows in ``row_id``'s cluster (1 for a row without near-duplicates)."""
+        return int(self._sizes[self.labels[row_id]]) if self.ready else 1
+
+    def similarity(self, row_id, row_ids):
+        """Estimated Jaccard similarity of ``row_id``'s word bigrams to those of each of ``row_ids``."""
+        return (self.signatures[row_ids] == self.signatures[row_id]).mean(axis=1)
+
+    def similar(self, row_id):
+        """Row ids of ``row_id``'s near-duplicates (itself excluded), most similar first.
+
+        Only cluster members at least ``SIMILARITY_THRESHOLD`` similar to
+        ``row_id`` itself count, not those linked to it through other rows.
+        """
+        if not self.ready:
+            return np.empty(0, dtype=np.int64)
+        label = self.labels[row_id]
+        lo = int(np.searchsorted(self._sorted_labels, label, side='left'))
+        hi = int(np.searchsorted(self._sorted_labels, label, side='right'))
+        members = self._order[lo:hi]
+        members = members[members != row_id]
+        scores = self.similarity(row_id, members)
+        keep = scores >= SIMILARITY_THRESHOLD
+        return members[keep][np.argsort(-scores[keep], kind='stable')]
+
+    def stats(self):
+        """Number of clusters with more than one row, and of the rows they hold."""
+        if not self.ready:
+            return {'clusters': 0, 'rows': 0}
+        multi = self._sizes > 1
+        return {'clusters': int(multi.sum()), 'rows': int(self._sizes[multi].sum())}
@@ -0,0 +1,226 @@
+# perf_trace.py
+"""Lightweight timing spans for the app's hot paths.
+
+A ``PerfTracer`` times named stages (``with tracer.span("load_data"):``
+or ``@tracer.traced("save_review")``) and keeps the most recent samples
+per stage, process-wide and per session, for the p50/p95/max admin panel.
+Each rerun (``with tracer.rerun():``) is also written as one
+JSON line to a rotating log.  A single rerun can be profiled on request
+with pyinstrument when it is installed, cProfile otherwise.
+
+When tracing is off, ``span()`` hands back one shared no-op context
+manager and ``traced()`` returns the function unchanged, so the
+instrumented code pays for a method call at most.
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from logging.handlers import RotatingFileHandler
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyinstrument
+    HAVE_PYINSTRUMENT = True
+except ImportError:
+    HAVE_PYINSTRUMENT = False
+
+# Samples kept per stage (process-wide and per session)
+SAMPLE_WINDOW = 500
+# Sessions whose samples are kept (least recently active dropped first)
+MAX_SESSIONS = 256
+# Rotating log: bytes per file and rotated files kept
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+# Functions listed in a cProfile report
+PROFILE_TOP = 40
+
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ('tracer', 'stage', 'start')
+
+    def __init__(self, tracer, stage):
+        self.tracer = tracer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.stage, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class PerfTracer:
+    """Collects stage timings; ``session_id()`` names the current session (None outside one)."""
+
+    def __init__(self, enabled=False, log_path=None, session_id=None, window=SAMPLE_WINDOW):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.window = window
+        self._session_id = session_id or (lambda: None)
+        self._lock = threading.Lock()
+        self._process = {}
+        self._sessions = OrderedDict()
+        self._local = threading.local()
+        self._profile_requests = set()
+        self.profiles = {}
+        self._log = None
+        if enabled and log_path:
+            self._log = logging.getLogger(f"qa_review.perf.{os.path.abspath(log_path)}")
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            if not self._log.handlers:
+                handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                              encoding='utf-8')
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._log.addHandler(handler)
+
+    # -------------------------
+    # Spans
+    # -------------------------
+    def span(self, stage):
+        """Context manager timing ``stage`` (a shared no-op when tracing is off)."""
+        return _Span(self, stage) if self.enabled else _NO_SPAN
+
+    def traced(self, stage, rerun=False):
+        """Decorator timing every call as ``stage``.
+
+        With ``rerun=True`` (fragments) a call made outside a script run
+        is treated as a run of its own, so fragment reruns are logged too.
+        """
+        def decorate(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not rerun or getattr(self._local, 'rerun', None) is not None:
+                    with _Span(self, stage):
+                        return func(*args, **kwargs)
+                with self.rerun(f"{stage} (fragment)"), _Span(self, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, stage, elapsed_ms):
+        session = self._session_id()
+        with self._lock:
+            self._samples(self._process, stage).append(elapsed_ms)
+            if session is not None:
+                stages = self._sessions.pop(session, None) or {}
+                self._sessions[session] = stages
+                while len(self._sessions) > MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+                self._samples(stages, stage).append(elapsed_ms)
+        rerun = getattr(self._local, 'rerun', None)
+        if rerun is not None:
+            rerun['spans'].append((stage, round(elapsed_ms, 3)))
+
+    def _samples(self, stages, stage):
+        samples = stages.get(stage)
+        if samples is None:
+            samples = stages[stage] = deque(maxlen=self.window)
+        return samples
+
+    # -------------------------
+    # Reruns
+    # -------------------------
+    def begin_rerun(self, name="rerun"):
+        """Start timing a script run on this thread (and profiling it if requested)."""
+        session = self._session_id()
+        profiler = None
+        if session in self._profile_requests:
+            self._profile_requests.discard(session)
+            profiler = pyinstrument.Profiler() if HAVE_PYINSTRUMENT else cProfile.Profile()
+            try:
+                profiler.start() if HAVE_PYINSTRUMENT else profiler.enable()
+            except (RuntimeError, ValueError):
+                # Another session is being profiled right now; try again next run
+                self._profile_requests.add(session)
+                profiler = None
+        if self.enabled or profiler is not None:
+            self._local.rerun = {'name': name, 'session': session, 'start': time.perf_counter(),
+                                 'spans': [], 'profiler': profiler}
+
+    @contextmanager
+    def rerun(self, name="rerun"):
+        """``begin_rerun()`` ... ``end_rerun()`` around a block, ended even when it raises.
+
+        ``st.stop()`` and ``st.rerun()`` leave a script by raising, so a
+        bare ``end_rerun()`` at the end of the script would be skipped.
+        """
+        self.begin_rerun(name)
+        try:
+            yield
+        finally:
+            self.end_rerun()
+
+    def end_rerun(self):
+        """Finish the run started by ``begin_rerun()``: record it, log it, store its profile."""
+        rerun = getattr(self._local, 'rerun', None)
+        self._local.rerun = None
+        if rerun is None:
+            return
+        elapsed_ms = (time.perf_counter() - rerun['start']) * 1000
+        if rerun['profiler'] is not None:
+            self.profiles[rerun['session']] = (time.time(), elapsed_ms, _profile_report(rerun['profiler']))
+        if not self.enabled:
+            return
+        self.record(rerun['name'], elapsed_ms)
+        if self._log is not None:
+            self._log.info(json.dumps({
+                'ts': round(time.time(), 3),
+                'run': rerun['name'],
+                'session': rerun['session'],
+                'rerun_ms': round(elapsed_ms, 3),
+                'spans': rerun['spans'],
+            }))
+
+    def request_profile(self):
+        """Profile the next script run of the current session."""
+        self._profile_requests.add(self._session_id())
+
+    def profile(self):
+        """Return ``(timestamp, rerun_ms, report)`` of the current session's last profile, or None."""
+        return self.profiles.get(self._session_id())
+
+    # -------------------------
+    # Reporting
+    # -------------------------
+    def summary(self, session_only=False):
+        """Per-stage sample count and p50/p95/max in ms, slowest p95 first."""
+        with self._lock:
+            if session_only:
+                stages = self._sessions.get(self._session_id(), {})
+            else:
+                stages = self._process
+            samples = {stage: np.fromiter(values, dtype=np.float64) for stage, values in stages.items()}
+        rows = [
+            (stage, len(values), *np.percentile(values, [50, 95]), values.max())
+            for stage, values in samples.items() if len(values)
+        ]
+        frame = pd.DataFrame(rows, columns=['Stage', 'Samples', 'p50 ms', 'p95 ms', 'max ms'])
+        return frame.sort_values('p95 ms', ascending=False).reset_index(drop=True)
+
+
+def _profile_report(profiler):
+    if HAVE_PYINSTRUMENT and isinstance(profiler, pyinstrument.Profiler):
+        profiler.stop()
+        return profiler.output_text(unicode=True, color=False)
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+    return out.getvalue()
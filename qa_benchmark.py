@@ -0,0 +1,337 @@
+# qa_benchmark.py
+"""Benchmarks for the review app on synthetic datasets.
+
+Usage: python qa_benchmark.py [--sizes 1000,10000,100000] [--answer-words 40]
+                              [--backend journal|sqlite] [--lazy]
+                              [--baseline benchmark_baseline.json] [--save-baseline]
+
+For every size a synthetic QA dataset is generated (and kept in
+``--data-dir`` for later runs), then ``qa_review_app.py`` is driven
+headlessly with Streamlit's ``AppTest`` in a fresh process: cold start
+(no caches), warm start (a new process reusing the on-disk caches),
+the background index builds the cold start kicks off, then (once they
+are done) plain reruns, Next-button navigation, saving through "Save All Progress"
+(``save_review(flush=True)``), exports in every format and peak RSS.
+Results are written as JSON and compared against the stored baseline;
+the exit status is 1 if any metric regressed past ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "qa_review_app.py")
+
+DEFAULT_SIZES = "1000,10000,100000"
+# Interactions timed per run (reruns, navigations, saves)
+DEFAULT_REPEATS = 10
+# Exports timed per format (the median is reported)
+EXPORT_REPEATS = 3
+# Relative slowdown tolerated before a metric counts as a regression ...
+DEFAULT_TOLERANCE = 0.25
+# ... as long as it is also slower by more than this (timings in ms, memory in MB)
+NOISE_FLOOR = {'ms': 10.0, 'mb': 20.0}
+# Tail latencies from a few samples are too noisy to gate on; they are reported only
+UNGATED_SUFFIXES = ('/p95_ms', '/max_ms')
+# Words per synthetic question; answers and gold answers use --answer-words
+QUESTION_WORDS = 12
+VOCABULARY_SIZE = 5000
+# Rows generated and written per step
+GENERATE_BATCH_SIZE = 100_000
+# Seconds AppTest waits for a single script run
+APP_TIMEOUT = 900
+# Threads the app builds its indexes on; interactions are timed after they finish
+BACKGROUND_THREADS = ("search-index", "near-duplicates")
+
+
+# -------------------------
+# Synthetic datasets
+# -------------------------
+def _vocabulary(rng, size=VOCABULARY_SIZE):
+    syllables = np.array([c + v for c in "bdfgklmnprstvz" for v in "aeiou"])
+    counts = rng.integers(1, 4, size=size)
+    picks = rng.integers(0, len(syllables), size=int(counts.sum()))
+    ends = np.cumsum(counts)
+    words = ["".join(syllables[picks[end - count:end]]) for count, end in zip(counts, ends)]
+    return np.array(sorted(set(words)), dtype=object)
+
+
+def _texts(rng, vocabulary, n_rows, words):
+    """``n_rows`` texts of about ``words`` words (±50%), with Zipf-like word frequencies."""
+    lengths = rng.integers(max(1, words // 2), words + words // 2 + 1, size=n_rows)
+    ranks = np.minimum(rng.zipf(1.3, size=int(lengths.sum())), len(vocabulary)) - 1
+    tokens = vocabulary[ranks].tolist()
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [" ".join(tokens[start:end]) for start, end in zip(starts, ends)]
+
+
+def generate_dataset(path, n_rows, answer_words=40, seed=0):
+    """Write a synthetic Question / Answer / Gold Answer CSV with ``n_rows`` rows."""
+    rng = np.random.default_rng(seed)
+    vocabulary = _vocabulary(rng)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as fh:
+        for start in range(0, n_rows, GENERATE_BATCH_SIZE):
+            count = min(GENERATE_BATCH_SIZE, n_rows - start)
+            questions = _texts(rng, vocabulary, count, QUESTION_WORDS)
+            chunk = pd.DataFrame({
+                'Question': [f"Q{start + i + 1}: {text}?" for i, text in enumerate(questions)],
+                'Answer': _texts(rng, vocabulary, count, answer_words),
+                'Gold Answer': _texts(rng, vocabulary, count, answer_words),
+            })
+            chunk.to_csv(fh, index=False, header=start == 0)
+    os.replace(tmp_path, path)
+    return path
+
+
+def dataset_path(data_dir, n_rows, answer_words):
+    return os.path.join(data_dir, f"synthetic_{n_rows}_{answer_words}w.csv")
+
+
+# -------------------------
+# One benchmark run (in its own process)
+# -------------------------
+def _summary(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'max_ms': float(samples.max()),
+    }
+
+
+def _timed(step):
+    start = time.perf_counter()
+    step()
+    return (time.perf_counter() - start) * 1000
+
+
+def _checked(at):
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].value}")
+    return at
+
+
+def _click(at, label=None, key=None):
+    """Click a button (looked up afresh: elements go stale after every run) and rerun."""
+    button = at.button(key=key) if key else next(b for b in at.button if label in b.label)
+    button.click()
+    return _checked(at)
+
+
+def _wait_for_background():
+    for thread in threading.enumerate():
+        if thread.name in BACKGROUND_THREADS:
+            thread.join()
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_app(dataset, repeats, start_only=False):
+    """Drive the app headlessly in the current directory; return the measurements."""
+    from streamlit.testing.v1 import AppTest, local_script_runner
+
+    # AppTest compiles the script afresh on every run, where a server reuses
+    # the bytecode; share one script cache so reruns time the app itself
+    script_cache = local_script_runner.ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+    sys.path.insert(0, APP_DIR)
+    at = AppTest.from_file(APP_PATH, default_timeout=APP_TIMEOUT)
+    result = {'start_ms': _timed(lambda: _checked(at))}
+    if start_only:
+        result['peak_rss_mb'] = _peak_rss_mb()
+        return result
+
+    result['index_build_ms'] = _timed(_wait_for_background)
+    at.text_input(key="reviewer_name_input").set_value("Benchmark")
+    at.selectbox(key="reviewer_type_input").set_value("Tax Officer")
+    _checked(at)
+    result['rerun'] = _summary([_timed(lambda: _checked(at)) for _ in range(repeats)])
+    # Next saves the current (default) rating, then moves on
+    result['navigate'] = _summary([_timed(lambda: _click(at, key="next_btn")) for _ in range(repeats)])
+
+    save_times = []
+    for i in range(repeats):
+        rating = next(r for r in at.radio if str(r.key).startswith("rating_"))
+        rating.set_value(rating.options[i % len(rating.options)])
+        at.text_area[0].set_value(f"benchmark remark {i}")
+        save_times.append(_timed(lambda: _click(at, label="Save All Progress")))
+    result['save'] = _summary(save_times)
+
+    # Export straight through the data layer, on the same saved reviews
+    from dataset_loader import LazyCSVDataset, load_dataset_cached
+    from review_export import EXPORT_FORMATS, export_reviews
+    from review_store import ReviewState, open_review_store
+
+    lazy = os.environ.get("QA_LAZY_LOADING") == "1"
+    state = ReviewState(
+        open_review_store("qa_dataset_with_remarks.csv", os.environ.get("QA_REVIEW_BACKEND", "journal")),
+        LazyCSVDataset(dataset) if lazy else load_dataset_cached(dataset),
+    )
+    result['export_ms'] = {
+        fmt: float(np.median([_timed(lambda: export_reviews(state, fmt).close()) for _ in range(EXPORT_REPEATS)]))
+        for fmt in EXPORT_FORMATS
+    }
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def _run_child(dataset, work_dir, args, start_only):
+    env = dict(os.environ, QA_INPUT_FILE=os.path.abspath(dataset), QA_REVIEW_BACKEND=args.backend,
+               QA_LAZY_LOADING="1" if args.lazy else "0")
+    command = [sys.executable, os.path.abspath(__file__), "--child", os.path.abspath(dataset),
+               "--repeats", str(args.repeats)]
+    if start_only:
+        command.append("--start-only")
+    proc = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed:\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def benchmark_size(n_rows, args):
+    """Cold run (no caches), then a warm start on the caches it left behind."""
+    dataset = dataset_path(args.data_dir, n_rows, args.answer_words)
+    if not os.path.exists(dataset):
+        print(f"Generating {n_rows} rows -> {dataset}", file=sys.stderr)
+        generate_dataset(dataset, n_rows, args.answer_words)
+    work_dir = tempfile.mkdtemp(prefix=f"qa_bench_{n_rows}_")
+    try:
+        # The app writes its caches next to the input; start from a clean copy
+        local = os.path.join(work_dir, os.path.basename(dataset))
+        shutil.copy(dataset, local)
+        cold = _run_child(local, work_dir, args, start_only=False)
+        warm = _run_child(local, work_dir, args, start_only=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    cold['cold_start_ms'] = cold.pop('start_ms')
+    cold['warm_start_ms'] = warm['start_ms']
+    cold['warm_peak_rss_mb'] = warm['peak_rss_mb']
+    return cold
+
+
+# -------------------------
+# Results and baseline comparison
+# -------------------------
+def flatten(results):
+    """``{"<rows>/<metric>": value}`` for every measurement in a results document."""
+    flat = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                walk(f"{prefix}/{key}", inner)
+        else:
+            flat[prefix] = float(value)
+
+    for size, metrics in results['results'].items():
+        walk(size, metrics)
+    return flat
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return a frame comparing two results documents, with a ``Regressed`` flag per gated metric."""
+    now, before = flatten(current), flatten(baseline)
+    rows = []
+    for metric in sorted(set(now) & set(before), key=lambda m: (int(m.split("/")[0]), m)):
+        floor = NOISE_FLOOR['mb'] if metric.endswith("_mb") else NOISE_FLOOR['ms']
+        change = now[metric] / before[metric] - 1 if before[metric] else 0.0
+        regressed = change > tolerance and now[metric] - before[metric] > floor \
+            and not metric.endswith(UNGATED_SUFFIXES)
+        rows.append((metric, before[metric], now[metric], change, regressed))
+    return pd.DataFrame(rows, columns=['Metric', 'Baseline', 'Current', 'Change', 'Regressed'])
+
+
+def _environment():
+    import streamlit
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'streamlit': streamlit.__version__,
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the QA review app on synthetic datasets.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts (up to 1000000)")
+    parser.add_argument("--answer-words", type=int, default=40, help="average words per answer / gold answer")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="timed interactions of each kind")
+    parser.add_argument("--backend", choices=["journal", "sqlite"], default="journal", help="review store")
+    parser.add_argument("--lazy", action="store_true", help="benchmark lazy CSV loading")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "qa_bench_data"),
+                        help="where generated datasets are kept between runs")
+    parser.add_argument("--output", default="benchmark_results.json", help="results file (JSON)")
+    parser.add_argument("--baseline", default=os.path.join(APP_DIR, "benchmark_baseline.json"),
+                        help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown counted as a regression (0.25 = 25%%)")
+    parser.add_argument("--child", metavar="DATASET", help=argparse.SUPPRESS)
+    parser.add_argument("--start-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_app(args.child, args.repeats, args.start_only)))
+        return 0
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        'environment': _environment(),
+        'config': {'answer_words': args.answer_words, 'repeats': args.repeats,
+                   'backend': args.backend, 'lazy': args.lazy},
+        'results': {},
+    }
+    for n_rows in (int(size) for size in args.sizes.split(",")):
+        print(f"Benchmarking {n_rows} rows...", file=sys.stderr)
+        results['results'][str(n_rows)] = benchmark_size(n_rows, args)
+
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(results, fh, indent=2)
+    print(f"Results -> {args.output}")
+    print(pd.Series(flatten(results)).round(1).to_string())
+
+    if args.save_baseline:
+        shutil.copy(args.output, args.baseline)
+        print(f"Baseline updated -> {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline to create one).")
+        return 0
+    with open(args.baseline, encoding='utf-8') as fh:
+        baseline = json.load(fh)
+    if baseline.get('config') != results['config']:
+        print(f"⚠️ Baseline was recorded with different settings: {baseline.get('config')}")
+    report = compare(results, baseline, args.tolerance)
+    print(report.to_string(index=False, formatters={'Change': "{:+.0%}".format}))
+    regressed = report[report['Regressed']]
+    if len(regressed):
+        print(f"❌ {len(regressed)} metric(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    print("✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,28 @@ import pandas as pd
 from datetime import datetime
 import pytz
 import os
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from answer_diff import DIFF_PREFETCH_ROWS, PLAIN_DIFF, AnswerDiffCache
+from answer_scoring import align_scores, load_score_cache, pair_hash, scores_path
+from dataset_loader import LazyCSVDataset, file_signature, load_dataset_cached, parse_sheets, sheets_variant
+from memory_budget import MemoryBudget, session_bytes
+from near_duplicates import NearDuplicateIndex
+from perf_trace import PerfTracer
+from review_queue import build_review_queue
+from row_identity import load_row_keys
+from search_index import SearchIndex, review_filter
+from work_scheduler import REVIEWER_QUOTAS, build_work_scheduler
+from review_export import EXPORT_FORMATS, export_reviews, export_reviews_as_of
+from review_history import ReviewHistory, history_path
+from review_store import (
+    RATING_OPTIONS,
+    REVIEW_TIMEZONE,
+    has_review,
+    make_record,
+    ReviewState,
+    open_review_store,
+)
 
 # -------------------------
 # Page configuration
@@ -16,723 +38,1437 @@ st.set_page_config(
 )
 
 # -------------------------
-# Enhanced CSS styling
+# Performance tracing (opt-in)
 # -------------------------
-st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .main {
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-    }
-    
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #f093fb 100%);
-        background-size: 200% 200%;
-        animation: gradientShift 8s ease infinite;
-        padding: 2.5rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        color: white;
-        box-shadow: 0 10px 30px rgba(102, 126, 234, 0.3);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .main-header::before {
-        content: '';
-        position: absolute;
-        top: -50%;
-        right: -50%;
-        width: 200%;
-        height: 200%;
-        background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
-        animation: rotate 20s linear infinite;
-    }
-    
-    @keyframes gradientShift {
-        0% { background-position: 0% 50%; }
-        50% { background-position: 100% 50%; }
-        100% { background-position: 0% 50%; }
-    }
-    
-    @keyframes rotate {
-        from { transform: rotate(0deg); }
-        to { transform: rotate(360deg); }
-    }
-    
-    .main-header h1 {
-        position: relative;
-        z-index: 1;
-        font-weight: 700;
-        letter-spacing: -0.5px;
-        text-shadow: 0 2px 10px rgba(0,0,0,0.2);
-        margin-bottom: 0.5rem;
-    }
-    
-    .main-header p {
-        position: relative;
-        z-index: 1;
-        margin: 0;
-        opacity: 0.95;
-    }
-    
-    .question-card {
-        background: rgba(255, 255, 255, 0.9);
-        backdrop-filter: blur(10px);
-        padding: 2rem;
-        border-radius: 15px;
-        border: 1px solid rgba(255, 255, 255, 0.3);
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
-        margin: 1.5rem 0;
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    
-    .question-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 12px 40px rgba(0, 0, 0, 0.15);
-    }
-    
-    .question-card p {
-        margin: 0;
-        line-height: 1.6;
-    }
-    
-    .question-card strong {
-        color: #667eea;
-        font-size: 1.1rem;
-    }
-    
-    .stTextArea textarea {
-        border: 2px solid #e0e7ff !important;
-        border-radius: 10px !important;
-        padding: 15px !important;
-        font-size: 15px !important;
-        transition: all 0.3s ease !important;
-        background: white !important;
-        color: #2d3748 !important;
-        line-height: 1.6 !important;
-    }
-    
-    .stTextArea textarea::placeholder {
-        color: #a0aec0 !important;
-    }
-    
-    .stTextArea textarea:focus {
-        border-color: #667eea !important;
-        box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1) !important;
-        outline: none !important;
-    }
-    
-    .stTextArea label {
-        color: #2d3748 !important;
-        font-weight: 600 !important;
-    }
-    
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #667eea 0%, #764ba2 100%) !important;
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    [data-testid="stSidebar"] .stTextInput input,
-    [data-testid="stSidebar"] .stNumberInput input,
-    [data-testid="stSidebar"] .stSelectbox select {
-        background: rgba(255, 255, 255, 0.2) !important;
-        border: 1px solid rgba(255, 255, 255, 0.3) !important;
-        color: white !important;
-        border-radius: 8px !important;
-    }
-    
-    [data-testid="stSidebar"] .stTextInput input::placeholder {
-        color: rgba(255, 255, 255, 0.7) !important;
-    }
-    
-    .stProgress > div > div {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%) !important;
-        border-radius: 10px !important;
-    }
-    
-    [data-testid="stMetric"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 1rem;
-        border-radius: 12px;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.2);
-    }
-    
-    [data-testid="stMetric"] label {
-        color: white !important;
-        font-weight: 600 !important;
-    }
-    
-    [data-testid="stMetric"] [data-testid="stMetricValue"] {
-        color: white !important;
-        font-size: 2rem !important;
-        font-weight: 700 !important;
-    }
-    
-    .stButton button {
-        border-radius: 10px !important;
-        padding: 0.75rem 2rem !important;
-        font-weight: 600 !important;
-        font-size: 15px !important;
-        transition: all 0.3s ease !important;
-        border: none !important;
-        box-shadow: 0 4px 15px rgba(0, 0, 0, 0.1) !important;
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 20px rgba(0, 0, 0, 0.15) !important;
-    }
-    
-    .stButton button[kind="primary"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
-    }
-    
-    .stButton button[kind="primary"]:hover {
-        background: linear-gradient(135deg, #764ba2 0%, #667eea 100%) !important;
-    }
-    
-    .stDownloadButton button {
-        background: linear-gradient(135deg, #28a745 0%, #20c997 100%) !important;
-        color: white !important;
-    }
-    
-    .stDownloadButton button:hover {
-        background: linear-gradient(135deg, #20c997 0%, #28a745 100%) !important;
-    }
-    
-    h1, h2, h3, h4 {
-        font-weight: 700 !important;
-        color: #2d3748 !important;
-    }
-    
-    h3 {
-        color: #667eea !important;
-    }
-    
-    .stSuccess {
-        animation: slideIn 0.5s ease;
-    }
-    
-    @keyframes slideIn {
-        from {
-            opacity: 0;
-            transform: translateY(-10px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-    
-    ::-webkit-scrollbar {
-        width: 10px;
-        height: 10px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: #f1f1f1;
-        border-radius: 10px;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 10px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: linear-gradient(135deg, #764ba2 0%, #667eea 100%);
-    }
-    
-    @media (max-width: 768px) {
+# QA_PERF_TRACE=1 times the hot paths below and logs every rerun to PERF_LOG_FILE;
+# QA_ADMIN=1 adds the timing / profiling panel to the sidebar
+PERF_TRACE = os.environ.get("QA_PERF_TRACE", "0") == "1"
+ADMIN_PANEL = os.environ.get("QA_ADMIN", "0") == "1"
+PERF_LOG_FILE = os.environ.get("QA_PERF_LOG", "qa_review_perf.log")
+
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+@st.cache_resource
+def get_tracer(enabled, log_path):
+    """One tracer per process: samples are kept per session and process-wide."""
+    return PerfTracer(enabled, log_path, session_id=current_session_id)
+
+tracer = get_tracer(PERF_TRACE, PERF_LOG_FILE)
+with tracer.rerun():
+    # -------------------------
+    # Enhanced CSS styling
+    # -------------------------
+    st.markdown("""
+        <style>
+        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
+    
+        * {
+            font-family: 'Inter', sans-serif;
+        }
+    
+        .main {
+            background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
+        }
+    
         .main-header {
-            padding: 1.5rem;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #f093fb 100%);
+            background-size: 200% 200%;
+            animation: gradientShift 8s ease infinite;
+            padding: 2.5rem;
+            border-radius: 15px;
+            margin-bottom: 2rem;
+            color: white;
+            box-shadow: 0 10px 30px rgba(102, 126, 234, 0.3);
+            position: relative;
+            overflow: hidden;
         }
-        
+    
+        .main-header::before {
+            content: '';
+            position: absolute;
+            top: -50%;
+            right: -50%;
+            width: 200%;
+            height: 200%;
+            background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
+            animation: rotate 20s linear infinite;
+        }
+    
+        @keyframes gradientShift {
+            0% { background-position: 0% 50%; }
+            50% { background-position: 100% 50%; }
+            100% { background-position: 0% 50%; }
+        }
+    
+        @keyframes rotate {
+            from { transform: rotate(0deg); }
+            to { transform: rotate(360deg); }
+        }
+    
+        .main-header h1 {
+            position: relative;
+            z-index: 1;
+            font-weight: 700;
+            letter-spacing: -0.5px;
+            text-shadow: 0 2px 10px rgba(0,0,0,0.2);
+            margin-bottom: 0.5rem;
+        }
+    
+        .main-header p {
+            position: relative;
+            z-index: 1;
+            margin: 0;
+            opacity: 0.95;
+        }
+    
         .question-card {
-            padding: 1.5rem;
+            background: rgba(255, 255, 255, 0.9);
+            backdrop-filter: blur(10px);
+            padding: 2rem;
+            border-radius: 15px;
+            border: 1px solid rgba(255, 255, 255, 0.3);
+            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
+            margin: 1.5rem 0;
+            transition: transform 0.3s ease, box-shadow 0.3s ease;
+        }
+    
+        .question-card:hover {
+            transform: translateY(-5px);
+            box-shadow: 0 12px 40px rgba(0, 0, 0, 0.15);
+        }
+    
+        .question-card p {
+            margin: 0;
+            line-height: 1.6;
+        }
+    
+        .question-card strong {
+            color: #667eea;
+            font-size: 1.1rem;
+        }
+    
+        .stTextArea textarea {
+            border: 2px solid #e0e7ff !important;
+            border-radius: 10px !important;
+            padding: 15px !important;
+            font-size: 15px !important;
+            transition: all 0.3s ease !important;
+            background: white !important;
+            color: #2d3748 !important;
+            line-height: 1.6 !important;
+        }
+    
+        .stTextArea textarea::placeholder {
+            color: #a0aec0 !important;
+        }
+    
+        .stTextArea textarea:focus {
+            border-color: #667eea !important;
+            box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1) !important;
+            outline: none !important;
+        }
+    
+        .stTextArea label {
+            color: #2d3748 !important;
+            font-weight: 600 !important;
+        }
+    
+        [data-testid="stSidebar"] {
+            background: linear-gradient(180deg, #667eea 0%, #764ba2 100%) !important;
+        }
+    
+        [data-testid="stSidebar"] * {
+            color: white !important;
+        }
+    
+        [data-testid="stSidebar"] .stTextInput input,
+        [data-testid="stSidebar"] .stNumberInput input,
+        [data-testid="stSidebar"] .stSelectbox select {
+            background: rgba(255, 255, 255, 0.2) !important;
+            border: 1px solid rgba(255, 255, 255, 0.3) !important;
+            color: white !important;
+            border-radius: 8px !important;
+        }
+    
+        [data-testid="stSidebar"] .stTextInput input::placeholder {
+            color: rgba(255, 255, 255, 0.7) !important;
+        }
+    
+        .stProgress > div > div {
+            background: linear-gradient(90deg, #667eea 0%, #764ba2 100%) !important;
+            border-radius: 10px !important;
+        }
+    
+        [data-testid="stMetric"] {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            padding: 1rem;
+            border-radius: 12px;
+            box-shadow: 0 4px 15px rgba(102, 126, 234, 0.2);
+        }
+    
+        [data-testid="stMetric"] label {
+            color: white !important;
+            font-weight: 600 !important;
+        }
+    
+        [data-testid="stMetric"] [data-testid="stMetricValue"] {
+            color: white !important;
+            font-size: 2rem !important;
+            font-weight: 700 !important;
+        }
+    
+        .stButton button {
+            border-radius: 10px !important;
+            padding: 0.75rem 2rem !important;
+            font-weight: 600 !important;
+            font-size: 15px !important;
+            transition: all 0.3s ease !important;
+            border: none !important;
+            box-shadow: 0 4px 15px rgba(0, 0, 0, 0.1) !important;
+        }
+    
+        .stButton button:hover {
+            transform: translateY(-2px) !important;
+            box-shadow: 0 6px 20px rgba(0, 0, 0, 0.15) !important;
+        }
+    
+        .stButton button[kind="primary"] {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
+        }
+    
+        .stButton button[kind="primary"]:hover {
+            background: linear-gradient(135deg, #764ba2 0%, #667eea 100%) !important;
+        }
+    
+        .stDownloadButton button {
+            background: linear-gradient(135deg, #28a745 0%, #20c997 100%) !important;
+            color: white !important;
+        }
+    
+        .stDownloadButton button:hover {
+            background: linear-gradient(135deg, #20c997 0%, #28a745 100%) !important;
+        }
+    
+        h1, h2, h3, h4 {
+            font-weight: 700 !important;
+            color: #2d3748 !important;
+        }
+    
+        h3 {
+            color: #667eea !important;
+        }
+    
+        .stSuccess {
+            animation: slideIn 0.5s ease;
+        }
+    
+        @keyframes slideIn {
+            from {
+                opacity: 0;
+                transform: translateY(-10px);
+            }
+            to {
+                opacity: 1;
+                transform: translateY(0);
+            }
+        }
+    
+        ::-webkit-scrollbar {
+            width: 10px;
+            height: 10px;
+        }
+    
+        ::-webkit-scrollbar-track {
+            background: #f1f1f1;
+            border-radius: 10px;
+        }
+    
+        ::-webkit-scrollbar-thumb {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            border-radius: 10px;
+        }
+    
+        ::-webkit-scrollbar-thumb:hover {
+            background: linear-gradient(135deg, #764ba2 0%, #667eea 100%);
+        }
+    
+        .answer-diff {
+            padding: 1rem;
+            border-radius: 0.5rem;
+            line-height: 1.6;
+            margin-bottom: 1rem;
         }
-    }
-    </style>
-""", unsafe_allow_html=True)
 
-# -------------------------
-# Header
-# -------------------------
-st.markdown("""
-  <div class="main-header">
-    <h1>🧠 QA Review Interface</h1>
-    <p>✨ Evaluate model responses against gold standard answers — clean & simple</p>
-  </div>
-""", unsafe_allow_html=True)
+        .answer-diff.model {
+            background: rgba(28, 131, 225, 0.1);
+        }
 
-# -------------------------
-# Timezone and file paths
-# -------------------------
-bd_tz = pytz.timezone('Asia/Dhaka')
-OUTPUT_FILE = "qa_dataset_with_remarks.csv"
-INPUT_FILE = "qa_dataset - Sheet1.csv"
+        .answer-diff.gold {
+            background: rgba(33, 195, 84, 0.1);
+        }
 
-# -------------------------
-# Data loader with caching
-# -------------------------
-@st.cache_data
-def load_data(input_path):
+        .diff-del {
+            background: rgba(239, 68, 68, 0.25);
+            text-decoration: line-through;
+            border-radius: 3px;
+        }
+
+        .diff-ins {
+            background: rgba(34, 197, 94, 0.3);
+            border-radius: 3px;
+        }
+
+        @media (max-width: 768px) {
+            .main-header {
+                padding: 1.5rem;
+            }
+        
+            .question-card {
+                padding: 1.5rem;
+            }
+        }
+        </style>
+    """, unsafe_allow_html=True)
+
+    # -------------------------
+    # Header
+    # -------------------------
+    st.markdown("""
+      <div class="main-header">
+        <h1>🧠 QA Review Interface</h1>
+        <p>✨ Evaluate model responses against gold standard answers — clean & simple</p>
+      </div>
+    """, unsafe_allow_html=True)
+
+    # -------------------------
+    # Timezone and file paths
+    # -------------------------
+    bd_tz = pytz.timezone(REVIEW_TIMEZONE)
+    OUTPUT_FILE = "qa_dataset_with_remarks.csv"
+    INPUT_FILE = os.environ.get("QA_INPUT_FILE", "qa_dataset - Sheet1.csv")
+    # Workbook sheets to review (.xlsx inputs only): unset for the first sheet,
+    # "*" for all sheets, or a comma-separated list of sheet names
+    INPUT_SHEETS = parse_sheets(os.environ.get("QA_INPUT_SHEETS"))
+    # "journal" (append-only log + CSV) or "sqlite" (WAL database, for many concurrent reviewers)
+    REVIEW_BACKEND = os.environ.get("QA_REVIEW_BACKEND", "journal")
+    # Read rows on demand from a memory-mapped, byte-offset indexed CSV (for very large inputs).
+    # Workbooks are always loaded through the Parquet cache instead.
+    LAZY_LOADING = os.environ.get("QA_LAZY_LOADING", "0") == "1" and INPUT_FILE.lower().endswith(".csv")
+    # How often the fragment-scoped sidebar status and summary refresh on their own
+    SAVE_STATUS_REFRESH_SECONDS = 2
+    SUMMARY_REFRESH_SECONDS = 10
+    # How often answers shown while their diff is computed check for it
+    DIFF_POLL_SECONDS = 0.5
+    # Per-process memory budget in MB (0: no limit); over it the answer-diff cache is dropped
+    MEMORY_BUDGET_MB = float(os.environ.get("QA_MEMORY_BUDGET_MB", "0") or 0)
+    NAVIGATION_MODES = ["Sequential", "Priority queue", "Assigned batches"]
+    # Grid layout: questions per page (each page is saved with one batched write)
+    REVIEW_LAYOUTS = ["One question", "Grid"]
+    GRID_PAGE_SIZE = 50
+    # Near-duplicates listed under a question (all of them get the bulk review)
+    SIMILAR_PREVIEW_ROWS = 20
+
+    # -------------------------
+    # Data loader with caching
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def load_data(input_path, signature, sheets=None):
+        """Load a .csv/.xlsx input through the Parquet cache; ``signature`` re-keys on file changes.
+
+        cache_resource hands every session the same frame instead of a fresh
+        unpickled copy per rerun; the app never mutates it.
+        """
+        return load_dataset_cached(input_path, sheets)
+
+    @st.cache_resource(max_entries=2)
+    def load_lazy_data(input_path, signature):
+        """Open the input as a lazily parsed dataset; only the row index stays in memory."""
+        return LazyCSVDataset(input_path)
+
+    # Try load
     try:
-        df_local = pd.read_csv(input_path)
-        required_cols = ['Question', 'Answer', 'Gold Answer']
-        missing = [c for c in required_cols if c not in df_local.columns]
-        if missing:
-            raise ValueError(f"Missing columns: {', '.join(missing)}")
-        return df_local
+        input_signature = file_signature(INPUT_FILE)
+        with tracer.span("load_data"):
+            if LAZY_LOADING:
+                df = load_lazy_data(INPUT_FILE, input_signature)
+            else:
+                df = load_data(INPUT_FILE, input_signature, INPUT_SHEETS)
     except FileNotFoundError:
-        raise
-    except Exception:
-        raise
-
-# Try load
-try:
-    df = load_data(INPUT_FILE)
-except FileNotFoundError:
-    st.error(f"❌ Input file not found: {INPUT_FILE}. Please upload or place it in the app folder.")
-    st.stop()
-except Exception as e:
-    st.error(f"❌ Error loading data: {e}")
-    st.stop()
+        st.error(f"❌ Input file not found: {INPUT_FILE}. Please upload or place it in the app folder.")
+        st.stop()
+    except Exception as e:
+        st.error(f"❌ Error loading data: {e}")
+        st.stop()
 
-# -------------------------
-# Helper to load saved reviews
-# -------------------------
-def load_existing_reviews(path):
-    if os.path.exists(path):
+    # -------------------------
+    # Shared review state (one per process, all sessions)
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def get_review_state(output_path, backend, input_path, input_signature, sheets, _df):
+        """Load saved reviews once per process; sessions share and update it in place.
+
+        Reviews are re-attached to the rows of this input version by content
+        key, so a reordered or edited input keeps them on their questions.
+        Every save is also kept in the review history (audit trail, time travel).
+        """
+        variant = sheets_variant(sheets) if input_path.lower().endswith(('.xlsx', '.xlsm')) else ""
+        row_keys = load_row_keys(input_path, _df, variant)
+        history = ReviewHistory(history_path(output_path))
+        return ReviewState(open_review_store(output_path, backend), _df, row_keys, history)
+
+    @tracer.traced("load_existing_reviews")
+    def load_existing_reviews(state):
+        """Re-read saved reviews only if the store's files changed outside this process."""
         try:
-            return pd.read_csv(path)
-        except Exception:
+            state.refresh()
+        except Exception as e:
+            st.warning(f"⚠️ Could not reload saved reviews: {e}")
+
+    review_state = get_review_state(OUTPUT_FILE, REVIEW_BACKEND, INPUT_FILE, input_signature, INPUT_SHEETS, df)
+    load_existing_reviews(review_state)
+
+    # -------------------------
+    # Answer similarity scores (computed offline by answer_scoring.py)
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def load_answer_scores(path, signature):
+        """Load the per-pair score cache; ``signature`` re-keys when the scorer rewrites it."""
+        return load_score_cache(path)
+
+    answer_scores_file = scores_path(INPUT_FILE)
+    answer_scores = None
+    if os.path.exists(answer_scores_file):
+        answer_scores = load_answer_scores(answer_scores_file, file_signature(answer_scores_file))
+
+    # -------------------------
+    # Priority review queue (shared by all sessions, built on first use)
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def get_review_queue(state_id, scores_signature, _state, _scores):
+        # Auto-scores need the row texts; lazy datasets are ordered by review status only
+        aligned = None
+        if _scores is not None and isinstance(_state.df, pd.DataFrame):
+            aligned = align_scores(_state.df, _scores)
+        return build_review_queue(_state, aligned)
+
+    def review_queue():
+        scores_signature = file_signature(answer_scores_file) if answer_scores is not None else None
+        return get_review_queue(id(review_state), scores_signature, review_state, answer_scores)
+
+    # -------------------------
+    # Full-text search index (built once per input version, in the background)
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def get_search_index(input_path, input_signature, sheets, _df):
+        index = SearchIndex(input_path, sheets_variant(sheets) if input_path.lower().endswith(('.xlsx', '.xlsm')) else "")
+        index.build_in_background(_df)
+        return index
+
+    search_index = get_search_index(INPUT_FILE, input_signature, INPUT_SHEETS, df)
+
+    # -------------------------
+    # Near-duplicate clusters (built once per input version, in the background)
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def get_near_duplicates(input_path, input_signature, sheets, _df, _row_keys):
+        """Signatures of unchanged rows are reused from the previous input version."""
+        index = NearDuplicateIndex(
+            input_path, sheets_variant(sheets) if input_path.lower().endswith(('.xlsx', '.xlsm')) else ""
+        )
+        index.build_in_background(_df, _row_keys)
+        return index
+
+    near_duplicates = get_near_duplicates(INPUT_FILE, input_signature, INPUT_SHEETS, df, review_state.row_keys)
+
+    # -------------------------
+    # Answer diff highlighting (shared LRU, next rows diffed in the background)
+    # -------------------------
+    @st.cache_resource
+    def get_answer_diffs():
+        return AnswerDiffCache()
+
+    answer_diffs = get_answer_diffs()
+
+    # Over the memory budget: drop the rebuildable caches and stop prefetching
+    memory_budget = MemoryBudget(MEMORY_BUDGET_MB)
+    over_memory_budget = memory_budget.shed(answer_diffs)
+
+    def upcoming_rows(index, held=None):
+        """Rows Next is likely to open after ``index``, given the navigation mode.
+
+        ``held`` is this reviewer's assigned batch (its leases, in claim order).
+        """
+        mode = st.session_state.get("nav_mode")
+        if mode == "Priority queue":
+            return review_queue().peek(DIFF_PREFETCH_ROWS, exclude=index)
+        if mode == "Assigned batches":
+            return list(held or [])[:DIFF_PREFETCH_ROWS]
+        return list(range(index + 1, min(index + 1 + DIFF_PREFETCH_ROWS, len(df))))
+
+    def prefetch_answer_diffs(row_ids):
+        """Queue the diffs of ``row_ids`` so Next shows them at once."""
+        if over_memory_budget or not row_ids:
+            return
+        rows = (df.take(row_ids) if LAZY_LOADING else df.iloc[row_ids])[['Answer', 'Gold Answer']]
+        answer_diffs.prefetch(zip(rows['Answer'].tolist(), rows['Gold Answer'].tolist()))
+
+    # -------------------------
+    # Lease-based work distribution (shared by all sessions, built on first use)
+    # -------------------------
+    @st.cache_resource(max_entries=2)
+    def get_work_scheduler(state_id, output_path, _state):
+        return build_work_scheduler(_state, output_path)
+
+    def release_assigned_work():
+        """Give back the questions leased to this session's previous reviewer, if any."""
+        holder = st.session_state.pop('_lease_holder', None)
+        if holder is not None:
+            get_work_scheduler(id(review_state), OUTPUT_FILE, review_state).release(holder[0])
+
+    def on_nav_mode_change():
+        if st.session_state.get("nav_mode") != "Assigned batches":
+            release_assigned_work()
+
+    def claim_assigned_work(renew=False):
+        """Return the rows leased to this reviewer, claiming a new batch when it runs low."""
+        reviewer = st.session_state.get('reviewer_name_input', '')
+        reviewer_type = st.session_state.get('reviewer_type_input', 'Select Type')
+        if st.session_state.get('_lease_holder') not in (None, (reviewer, reviewer_type)):
+            # The reviewer changed: their predecessor's unreviewed questions go back
+            release_assigned_work()
+        if not reviewer or reviewer_type not in REVIEWER_QUOTAS:
+            st.warning("⚠️ Enter your name and reviewer type in the sidebar to receive assigned questions.")
             return None
-    return None
+        scheduler = get_work_scheduler(id(review_state), OUTPUT_FILE, review_state)
+        if renew:
+            # Keep the leases alive while the reviewer is active; at most once a minute
+            now = datetime.now().timestamp()
+            if now - st.session_state.get('_lease_renewed_at', 0) > 60:
+                scheduler.renew(reviewer)
+                st.session_state._lease_renewed_at = now
+        held = scheduler.claim(reviewer, reviewer_type)
+        st.session_state._lease_holder = (reviewer, reviewer_type)
+        # Saved reviews complete their lease once written; skip them until then
+        return [row_id for row_id in held
+                if row_id != st.session_state.index and not has_review(review_state.record(row_id, reviewer))]
 
-df_saved = load_existing_reviews(OUTPUT_FILE)
+    # -------------------------
+    # Autosave indicator
+    # -------------------------
+    @st.fragment(run_every=SAVE_STATUS_REFRESH_SECONDS)
+    def render_save_status():
+        pending_saves = review_state.writer.pending_count
+        if review_state.writer.last_error is not None:
+            st.error(f"⚠️ Autosave failed, retrying: {review_state.writer.last_error}")
+        elif pending_saves:
+            st.warning(f"⏳ {pending_saves} change(s) pending save")
+        else:
+            st.success("💾 All changes saved")
 
-# -------------------------
-# Session state initialization
-# -------------------------
-if "index" not in st.session_state:
-    st.session_state.index = 0
+    # -------------------------
+    # Session state initialization
+    # -------------------------
+    if "index" not in st.session_state:
+        st.session_state.index = 0
 
-if "remark_counter" not in st.session_state:
-    st.session_state.remark_counter = 0
+    if "remark_counter" not in st.session_state:
+        st.session_state.remark_counter = 0
 
-if "rating_counter" not in st.session_state:
-    st.session_state.rating_counter = 0
+    if "rating_counter" not in st.session_state:
+        st.session_state.rating_counter = 0
 
-# -------------------------
-# Sidebar - Initialize first
-# -------------------------
-with st.sidebar:
-    st.markdown("### 📋 Review Settings")
-    reviewer_name = st.text_input(
-        "👤 Reviewer Name:", 
-        placeholder="Enter your name",
-        key="reviewer_name_input"
-    )
-    reviewer_type = st.selectbox(
-        "👥 Reviewer Type:",
-        options=["Select Type", "Tax Payer", "Non Tax Payer", "Tax Officer"],
-        index=0,
-        key="reviewer_type_input"
-    )
-
-    # Current time
-    current_time = datetime.now(bd_tz).strftime("%Y-%m-%d %I:%M:%S %p")
-    st.info(f"📅 {current_time}")
-
-    st.markdown("---")
-    st.markdown("### 🎯 Quick Navigation")
-
-    jump_to = st.number_input(
-        "Jump to question:",
-        min_value=1,
-        max_value=len(df),
-        value=st.session_state.index + 1,
-        step=1,
-        key="jump_to_input"
-    )
-
-    st.markdown("---")
-    
-    # Keyboard shortcuts info
-    with st.expander("⌨️ Keyboard Shortcuts"):
+    # -------------------------
+    # Sidebar - Initialize first
+    # -------------------------
+    with st.sidebar:
+        st.markdown("### 📋 Review Settings")
+        reviewer_name = st.text_input(
+            "👤 Reviewer Name:", 
+            placeholder="Enter your name",
+            key="reviewer_name_input"
+        )
+        reviewer_type = st.selectbox(
+            "👥 Reviewer Type:",
+            options=["Select Type", "Tax Payer", "Non Tax Payer", "Tax Officer"],
+            index=0,
+            key="reviewer_type_input"
+        )
+
+        # Current time
+        current_time = datetime.now(bd_tz).strftime("%Y-%m-%d %I:%M:%S %p")
+        st.info(f"📅 {current_time}")
+
+        # Autosave indicator (refreshes on its own)
+        render_save_status()
+
+        # What happened to the saved reviews when the input file changed
+        sync = review_state.sync
+        if sync['moved'] or sync['edited'] or sync['dropped']:
+            st.info(
+                f"🔄 Input changed since the reviews were saved: {sync['moved']} review(s) followed their "
+                f"question to a new row, {len(sync['edited'])} are on edited questions, "
+                f"{len(sync['dropped'])} of removed questions were dropped."
+            )
+
+        st.markdown("---")
+        st.markdown("### 🎯 Quick Navigation")
+
+        st.radio(
+            "🗂️ Layout:",
+            options=REVIEW_LAYOUTS,
+            key="review_layout",
+            horizontal=True,
+            help=f"Grid: rate {GRID_PAGE_SIZE} questions per page and save the whole page at once."
+        )
+
+        st.selectbox(
+            "🧭 Navigation mode:",
+            options=NAVIGATION_MODES,
+            key="nav_mode",
+            on_change=on_nav_mode_change,
+            help="Sequential: Next goes to the following question. "
+                 "Priority queue: Next jumps to the most valuable question: never-reviewed questions first, "
+                 "then by how far the answer is from gold plus how widely the reviewers' ratings spread "
+                 "(weighted equally). "
+                 "Assigned batches: Next serves questions leased to you so reviewers don't overlap."
+        )
+
+        jump_to = st.number_input(
+            "Jump to question:",
+            min_value=1,
+            max_value=len(df),
+            value=st.session_state.index + 1,
+            step=1,
+            key="jump_to_input"
+        )
+
+        st.markdown("---")
+    
+        # Keyboard shortcuts info
+        with st.expander("⌨️ Keyboard Shortcuts"):
+            st.markdown("""
+            - **Alt + ←**: Previous Question
+            - **Alt + →**: Next Question
+            - **Alt + S**: Save Review
+            - **Alt + 1-5**: Quick Rating
+            """)
+
+        st.markdown("### 📖 Instructions")
         st.markdown("""
-        - **Alt + ←**: Previous Question
-        - **Alt + →**: Next Question
-        - **Alt + S**: Save Review
-        - **Alt + 1-5**: Quick Rating
+        1. Read the question carefully.  
+        2. Compare Model Answer with Gold Answer.  
+        3. Rate the model's answer and add remarks.  
+        4. Use Previous / Next to navigate.  
+        5. Use Reset button to return to question 1.
         """)
 
-    st.markdown("### 📖 Instructions")
-    st.markdown("""
-    1. Read the question carefully.  
-    2. Compare Model Answer with Gold Answer.  
-    3. Rate the model's answer and add remarks.  
-    4. Use Previous / Next to navigate.  
-    5. Use Reset button to return to question 1.
-    """)
+        st.markdown("---")
+        st.markdown("### ⚙️ Actions")
 
-    st.markdown("---")
-    st.markdown("### ⚙️ Actions")
+    # -------------------------
+    # Save function (defined after sidebar)
+    # -------------------------
+    @tracer.traced("save_review")
+    def save_review(flush=False):
+        """Save current rating and remark for current index.
 
-# -------------------------
-# Save function (defined after sidebar)
-# -------------------------
-def save_review():
-    """Save current rating and remark for current index to OUTPUT_FILE."""
-    # Get current values from session state
-    reviewer_name = st.session_state.get('reviewer_name_input', '')
-    reviewer_type = st.session_state.get('reviewer_type_input', 'Select Type')
+        The shared state is updated immediately and the write happens in the
+        background; pass ``flush=True`` to wait until it has reached disk.
+        """
+        if st.session_state.get("review_layout") == "Grid":
+            # The grid saves whole pages itself; the single-question widgets are not shown
+            return review_state.flush() if flush else True
+
+        # Get current values from session state
+        reviewer_name = st.session_state.get('reviewer_name_input', '')
+        reviewer_type = st.session_state.get('reviewer_type_input', 'Select Type')
     
-    # Validate reviewer info
-    if not reviewer_name or reviewer_type == "Select Type":
-        st.error("⚠️ Please enter your name and select reviewer type in the sidebar!")
-        return False
+        # Validate reviewer info
+        if not reviewer_name or reviewer_type == "Select Type":
+            st.error("⚠️ Please enter your name and select reviewer type in the sidebar!")
+            return False
 
-    # Get rating and remark
-    rating_key = f"rating_{st.session_state.index}_{st.session_state.rating_counter}"
-    remark_key = f"remark_{st.session_state.index}_{st.session_state.remark_counter}"
+        # Get rating and remark
+        rating_key = f"rating_{st.session_state.index}_{st.session_state.rating_counter}"
+        remark_key = f"remark_{st.session_state.index}_{st.session_state.remark_counter}"
     
-    rating = st.session_state.get(rating_key, None)
-    remark = st.session_state.get(remark_key, "")
+        rating = st.session_state.get(rating_key, None)
+        remark = st.session_state.get(remark_key, "")
     
-    has_rating = rating is not None and str(rating).strip() != ""
-    has_remark = remark is not None and str(remark).strip() != ""
+        has_rating = rating is not None and str(rating).strip() != ""
+        has_remark = remark is not None and str(remark).strip() != ""
 
-    try:
-        # Load or create saved frame
-        if os.path.exists(OUTPUT_FILE):
-            df_out = pd.read_csv(OUTPUT_FILE)
-        else:
-            df_out = df.copy()
-            # initialize cols
-            df_out['Rating'] = ""
-            df_out['Rating_Value'] = ""
-            df_out['Remarks'] = ""
-            df_out['Reviewer'] = ""
-            df_out['Reviewer_Type'] = ""
-            df_out['Review_Date'] = ""
-
-        # Ensure columns exist
-        for col in ['Rating', 'Rating_Value', 'Remarks', 'Reviewer', 'Reviewer_Type', 'Review_Date']:
-            if col not in df_out.columns:
-                df_out[col] = ""
-
-        # Expand df_out if needed
-        if len(df_out) < len(df):
-            extra = pd.DataFrame([[""] * len(df_out.columns)] * (len(df) - len(df_out)), columns=df_out.columns)
-            df_out = pd.concat([df_out, extra], ignore_index=True)
-
-        # Save rating if present
-        rating_options = {
-            "⭐⭐⭐⭐⭐ Excellent": 5,
-            "⭐⭐⭐⭐ Good": 4,
-            "⭐⭐⭐ Fair": 3,
-            "⭐⭐ Poor": 2,
-            "⭐ Very Poor": 1
-        }
-        
-        if has_rating:
-            df_out.at[st.session_state.index, 'Rating'] = rating
-            df_out.at[st.session_state.index, 'Rating_Value'] = rating_options.get(rating, "")
+        try:
+            # Dirty tracking: nothing to write if this reviewer's review is already saved as shown
+            index = st.session_state.index
+            saved = review_state.record(index, reviewer_name)
+            if saved is not None and (saved.get('Rating') or saved.get('Remarks')) \
+                    and not review_state.is_edited(index, reviewer_name) \
+                    and (not has_rating or rating == saved.get('Rating')) \
+                    and (not has_remark or remark == saved.get('Remarks')):
+                return review_state.flush() if flush else True
 
-        # Save remark
-        if has_remark:
-            df_out.at[st.session_state.index, 'Remarks'] = remark
+            save_time = datetime.now(bd_tz).strftime("%Y-%m-%d %I:%M:%S %p")
+            record = make_record(
+                rating if has_rating else "",
+                remark if has_remark else "",
+                reviewer_name,
+                reviewer_type,
+                save_time,
+            )
 
-        # Save metadata
-        save_time = datetime.now(bd_tz).strftime("%Y-%m-%d %I:%M:%S %p")
-        df_out.at[st.session_state.index, 'Reviewer'] = reviewer_name
-        df_out.at[st.session_state.index, 'Reviewer_Type'] = reviewer_type
-        df_out.at[st.session_state.index, 'Review_Date'] = save_time
+            # Update the shared state in place and queue the write; the merged
+            # CSV is rewritten by background compaction
+            review_state.save(index, record)
 
-        # Write out
-        df_out.to_csv(OUTPUT_FILE, index=False)
-        st.session_state._df_saved = df_out
-        
-        return True
-    except Exception as e:
-        st.error(f"Error saving review: {e}")
-        return False
+            if flush and not review_state.flush():
+                st.warning("⏳ Review queued, but the disk write is taking longer than expected.")
+                return False
+            return True
+        except Exception as e:
+            st.error(f"Error saving review: {e}")
+            return False
 
-# Register the save function
-st.session_state.save_review_fn = save_review
+    # Register the save function
+    st.session_state.save_review_fn = save_review
 
-# -------------------------
-# Navigation helpers
-# -------------------------
-def navigate_to(new_index):
-    """Navigate to a specific question index."""
-    save_review()
-    st.session_state.index = max(0, min(len(df) - 1, new_index))
-    st.session_state.remark_counter += 1
-    st.session_state.rating_counter += 1
+    @tracer.traced("apply_to_similar")
+    def apply_to_similar(row_ids, skip_reviewed=True):
+        """Save the current question's review, then copy its rating and remark onto ``row_ids``.
 
-# -------------------------
-# Sidebar navigation buttons (continued)
-# -------------------------
-with st.sidebar:
-    if st.button("🔄 Go to Question", use_container_width=True, key="jump_button"):
-        navigate_to(int(jump_to) - 1)
+        All copies go to the store in one batched write.  Returns the number of
+        questions updated (None if the current review could not be saved).
+        """
+        if not save_review():
+            return None
+        reviewer_name = st.session_state.get('reviewer_name_input', '')
+        reviewer_type = st.session_state.get('reviewer_type_input', 'Select Type')
+        saved = review_state.record(st.session_state.index, reviewer_name) or {}
+        if not (saved.get('Rating') or saved.get('Remarks')):
+            st.warning("⚠️ Rate this question or write a remark first.")
+            return None
+        if skip_reviewed:
+            own = [review_state.record(row_id, reviewer_name) or {} for row_id in row_ids]
+            row_ids = [row_id for row_id, review in zip(row_ids, own) if not (review.get('Rating') or review.get('Remarks'))]
+        save_time = datetime.now(bd_tz).strftime("%Y-%m-%d %I:%M:%S %p")
+        items = [
+            (int(row_id), make_record(saved.get('Rating', ""), saved.get('Remarks', ""), reviewer_name, reviewer_type, save_time))
+            for row_id in row_ids
+        ]
+        try:
+            if items:
+                review_state.save_many(items)
+        except Exception as e:
+            st.error(f"Error saving reviews: {e}")
+            return None
+        return len(items)
+
+    # -------------------------
+    # Navigation helpers
+    # -------------------------
+    def navigate_to(new_index):
+        """Navigate to a specific question index."""
+        save_review()
+        held = st.session_state.get("queue_row")
+        if held is not None and held != new_index:
+            # The row this session popped from the queue goes back unless a save
+            # already re-queued it (requeue is then a no-op)
+            review_queue().requeue(held)
+            st.session_state.queue_row = None
+        st.session_state.index = max(0, min(len(df) - 1, new_index))
+        st.session_state.remark_counter += 1
+        st.session_state.rating_counter += 1
+
+    def navigate_next():
+        """Go to the next question, or to the highest-priority one in queue mode."""
+        target = st.session_state.index + 1
+        mode = st.session_state.get("nav_mode")
+        if mode == "Priority queue":
+            # Save first so the current row is re-queued with its new priority
+            if not save_review():
+                return
+            popped = review_queue().pop(exclude=st.session_state.index)
+            navigate_to(target if popped is None else popped)
+            # Held until saved or left; see navigate_to
+            st.session_state.queue_row = popped
+            return
+        elif mode == "Assigned batches":
+            # Saving completes the current lease; then top up the batch
+            if not save_review():
+                return
+            held = claim_assigned_work()
+            if not held:
+                st.success("🎉 No more questions need a review from your reviewer type!")
+                return
+            target = held[0]
+        navigate_to(target)
+
+    # -------------------------
+    # Sidebar navigation buttons (continued)
+    # -------------------------
+    with st.sidebar:
+        if st.button("🔄 Go to Question", use_container_width=True, key="jump_button"):
+            navigate_to(int(jump_to) - 1)
     
-    if st.button("🔁 Reset to First Question", use_container_width=True):
-        navigate_to(0)
+        if st.button("🔁 Reset to First Question", use_container_width=True):
+            navigate_to(0)
+
+        if st.button("⏭️ Next Pending Question", use_container_width=True, key="next_pending_button"):
+            next_pending = review_state.next_pending(st.session_state.index + 1)
+            if next_pending is None:
+                next_pending = review_state.next_pending()
+            if next_pending is None:
+                st.success("🎉 Every question has been reviewed!")
+            else:
+                navigate_to(next_pending)
     
-    # Bulk save button
-    if st.button("💾 Save All Progress", use_container_width=True, type="primary"):
-        if save_review():
-            st.success("All progress saved!")
+        # Bulk save button
+        if st.button("💾 Save All Progress", use_container_width=True, type="primary"):
+            if save_review(flush=True):
+                st.success("All progress saved!")
 
-# -------------------------
-# Progress bar & current row
-# -------------------------
-progress = (st.session_state.index + 1) / len(df)
-st.progress(progress)
+        st.markdown("---")
+        st.markdown("### 🔍 Search")
+        search_query = st.text_input(
+            "Search questions & answers:",
+            placeholder="Type words to find...",
+            key="search_query"
+        )
+        search_pending_only = st.checkbox("Pending only", key="search_pending_only")
+        search_low_rated = st.checkbox("Rating ≤ 2", key="search_low_rated")
+        search_reviewer_type = st.selectbox(
+            "Reviewed by:",
+            options=["Any", "Tax Payer", "Non Tax Payer", "Tax Officer"],
+            key="search_reviewer_type"
+        )
+        if search_query.strip():
+            if search_index.last_error is not None:
+                st.warning(f"⚠️ Search index could not be built: {search_index.last_error}")
+            elif not search_index.ready:
+                st.caption("⏳ Building the search index, try again in a moment...")
+            else:
+                hits = search_index.search(search_query, review_filter(
+                    review_state,
+                    pending_only=search_pending_only,
+                    max_rating=2 if search_low_rated else None,
+                    reviewer_type=None if search_reviewer_type == "Any" else search_reviewer_type,
+                ))
+                if not hits:
+                    st.caption("No matching questions.")
+                for hit in hits:
+                    question = str(df.iloc[hit]['Question'])
+                    st.button(
+                        f"Q{hit + 1}: {question[:60]}{'…' if len(question) > 60 else ''}",
+                        key=f"search_hit_{hit}",
+                        use_container_width=True,
+                        on_click=navigate_to,
+                        args=(hit,)
+                    )
 
-# Enhanced progress caption with percentage
-progress_pct = int(progress * 100)
-st.caption(f"📊 Progress: {st.session_state.index + 1} of {len(df)} questions ({progress_pct}%)")
+    # -------------------------
+    # Model & Gold answers, with their differences highlighted
+    # -------------------------
+    def show_answers(answer, gold, diff):
+        """The two answers side by side; ``diff`` is ``answer_diffs.get()``'s result (None: plain text)."""
+        plain = diff is None or diff is PLAIN_DIFF
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("#### 🤖 Model Answer")
+            if plain:
+                st.info(answer)
+            else:
+                st.markdown(f'<div class="answer-diff model">{diff[0]}</div>', unsafe_allow_html=True)
+        with col2:
+            st.markdown("#### ✅ Gold Answer")
+            if plain:
+                st.success(gold)
+            else:
+                st.markdown(f'<div class="answer-diff gold">{diff[1]}</div>', unsafe_allow_html=True)
+        if diff is PLAIN_DIFF:
+            st.caption("✂️ These answers are too long to highlight their differences.")
+        elif diff is not None and diff[2] == "sentences":
+            st.caption("✂️ Long answers: aligned sentence by sentence, then compared word by word where they differ.")
 
-# Safe bounds for index
-if st.session_state.index < 0:
-    st.session_state.index = 0
-if st.session_state.index >= len(df):
-    st.session_state.index = len(df) - 1
+    @st.fragment(run_every=DIFF_POLL_SECONDS)
+    def wait_for_answer_diff(answer, gold):
+        """Plain answers while their diff is computed; reruns the app once it is ready."""
+        if answer_diffs.get(answer, gold, timeout=0) is not None:
+            st.rerun()
+        show_answers(answer, gold, None)
+        st.caption("⏳ Still comparing these answers; the differences appear as soon as they are ready.")
 
-row = df.iloc[st.session_state.index]
+    # -------------------------
+    # Review panel (fragment)
+    # -------------------------
+    # Navigation, rating and saving rerun only this fragment, not the whole
+    # script: no CSS re-injection, sidebar rebuild or summary recomputation.
+    @st.fragment
+    @tracer.traced("review_panel", rerun=True)
+    def review_panel():
+        load_existing_reviews(review_state)
 
-# -------------------------
-# Load existing rating/remark
-# -------------------------
-existing_rating = None
-existing_remark = ""
-if df_saved is not None and st.session_state.index < len(df_saved):
-    if 'Rating' in df_saved.columns:
-        saved_rating = df_saved.iloc[st.session_state.index].get('Rating', "")
-        if pd.notna(saved_rating) and saved_rating != "":
-            existing_rating = saved_rating
-    if 'Remarks' in df_saved.columns:
-        saved_remark = df_saved.iloc[st.session_state.index].get('Remarks', "")
-        if pd.notna(saved_remark) and saved_remark != "":
-            existing_remark = saved_remark
+        # -------------------------
+        # Progress bar & current row
+        # -------------------------
+        progress = (st.session_state.index + 1) / len(df)
+        st.progress(progress)
 
-# -------------------------
-# Top bar with metrics
-# -------------------------
-col1, col2, col3 = st.columns([2, 1, 1])
-with col1:
-    st.markdown(f"### 📝 Question {st.session_state.index + 1}")
-with col2:
-    # Count reviewed
-    reviewed_count = 0
-    if df_saved is not None and len(df_saved) > 0:
-        for i in range(min(len(df), len(df_saved))):
-            has_rating = False
-            has_remark = False
-            if 'Rating' in df_saved.columns:
-                rv = df_saved.iloc[i].get('Rating', "")
-                if pd.notna(rv) and str(rv).strip() != "":
-                    has_rating = True
-            if 'Remarks' in df_saved.columns:
-                rm = df_saved.iloc[i].get('Remarks', "")
-                if pd.notna(rm) and str(rm).strip() != "":
-                    has_remark = True
-            if has_rating or has_remark:
-                reviewed_count += 1
-    st.metric("✅ Reviewed", f"{reviewed_count}/{len(df)}")
-
-with col3:
-    # Show if current question is already reviewed
-    is_reviewed = False
-    if df_saved is not None and st.session_state.index < len(df_saved):
-        if 'Rating' in df_saved.columns or 'Remarks' in df_saved.columns:
-            rating_val = df_saved.iloc[st.session_state.index].get('Rating', "")
-            remark_val = df_saved.iloc[st.session_state.index].get('Remarks', "")
-            if (pd.notna(rating_val) and str(rating_val).strip() != "") or \
-               (pd.notna(remark_val) and str(remark_val).strip() != ""):
-                is_reviewed = True
-    
-    if is_reviewed:
-        st.metric("📌 Status", "Reviewed")
+        # Enhanced progress caption with percentage
+        progress_pct = int(progress * 100)
+        st.caption(f"📊 Progress: {st.session_state.index + 1} of {len(df)} questions ({progress_pct}%)")
+
+        # Safe bounds for index
+        if st.session_state.index < 0:
+            st.session_state.index = 0
+        if st.session_state.index >= len(df):
+            st.session_state.index = len(df) - 1
+
+        row = df.iloc[st.session_state.index]
+        if LAZY_LOADING:
+            df.prefetch(st.session_state.index)
+
+        # -------------------------
+        # Load this reviewer's existing rating/remark
+        # -------------------------
+        existing_rating = None
+        existing_remark = ""
+        current_reviewer = st.session_state.get('reviewer_name_input', '')
+        saved_review = review_state.record(st.session_state.index, current_reviewer)
+        if saved_review is not None:
+            if saved_review.get('Rating', ""):
+                existing_rating = saved_review['Rating']
+            if saved_review.get('Remarks', ""):
+                existing_remark = saved_review['Remarks']
+
+        # -------------------------
+        # Top bar with metrics
+        # -------------------------
+        held = None
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.markdown(f"### 📝 Question {st.session_state.index + 1}")
+            if st.session_state.get("nav_mode") == "Priority queue":
+                st.caption(f"🎯 Priority {review_queue().priority(st.session_state.index):.2f}")
+            elif st.session_state.get("nav_mode") == "Assigned batches":
+                held = claim_assigned_work(renew=True)
+                if held is not None:
+                    st.caption(f"📥 {len(held)} question(s) assigned to you")
+        with col2:
+            st.metric("✅ Reviewed", f"{review_state.reviewed_count}/{len(df)}")
+
+        with col3:
+            # Show if current question is already reviewed
+            if review_state.is_reviewed(st.session_state.index):
+                st.metric("📌 Status", "Reviewed")
+            else:
+                st.metric("📌 Status", "Pending")
+
+        # -------------------------
+        # Question card
+        # -------------------------
+        st.markdown(f"""
+            <div class="question-card">
+              <p style="margin:0;"><strong>❓ Question:</strong></p>
+              <p style="margin-top: .6rem; font-size:1.05rem; color:#0f172a;">{row['Question']}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+        # Offline similarity scores for this answer pair, if the scorer has been run
+        if answer_scores is not None:
+            row_hash = pair_hash(row['Answer'], row['Gold Answer'])
+            if row_hash in answer_scores.index:
+                scores = answer_scores.loc[row_hash]
+                st.caption(
+                    f"🔎 Auto-scores vs gold — Exact match: {'✅' if scores['exact_match'] else '❌'} | "
+                    f"Token F1: {scores['token_f1']:.2f} | ROUGE-L: {scores['rouge_l']:.2f} | "
+                    f"Char 3-gram: {scores['char_ngram']:.2f}"
+                )
+
+        # Near-duplicates of this question (same question / answer up to small edits)
+        similar = near_duplicates.similar(st.session_state.index)
+        if len(similar):
+            with st.expander(f"👯 {len(similar)} similar item(s)", expanded=False):
+                shown = similar[:SIMILAR_PREVIEW_ROWS]
+                preview = (df.take(shown) if LAZY_LOADING else df.iloc[shown])[['Question', 'Answer']].reset_index(drop=True)
+                preview.insert(0, '#', shown + 1)
+                preview.insert(1, 'Similarity', near_duplicates.similarity(st.session_state.index, shown) * 100)
+                preview['Status'] = ["✅ Reviewed" if review_state.is_reviewed(row_id) else "⏳ Pending" for row_id in shown]
+                st.dataframe(preview, hide_index=True, use_container_width=True, column_config={
+                    'Similarity': st.column_config.ProgressColumn("🔗 Similarity", format="%.0f%%", min_value=0, max_value=100)
+                })
+                if len(similar) > len(shown):
+                    st.caption(f"… and {len(similar) - len(shown)} more.")
+                skip_reviewed = st.checkbox("Skip questions I already reviewed", value=True, key="similar_skip_reviewed")
+                if st.button(f"📋 Apply my rating & remark to all {len(similar)}", key="apply_similar"):
+                    applied = apply_to_similar(similar, skip_reviewed)
+                    if applied is not None:
+                        st.success(f"✅ Review applied to {applied} similar question(s)!")
+
+        # Ratings other reviewers gave this question
+        other_ratings = [
+            (name, value) for name, value in review_state.ratings.row(st.session_state.index)
+            if name != current_reviewer
+        ]
+        if other_ratings:
+            labels = {value: label for label, value in RATING_OPTIONS.items()}
+            st.caption("👥 Also rated by: " + " | ".join(f"{name}: {labels[value]}" for name, value in other_ratings))
+        if review_state.is_edited(st.session_state.index, current_reviewer):
+            st.warning("✏️ This question was edited in the input after you reviewed it. Please check your review and save it again.")
+
+        # Every change ever saved for this question (indexed by its content key)
+        with st.expander("🕘 Review history", expanded=False):
+            history = review_state.history.question_history(review_state.row_keys[st.session_state.index])
+            if history.empty:
+                st.caption("No changes recorded for this question yet.")
+            else:
+                history['Time'] = pd.to_datetime(history['Time'], unit='s', utc=True) \
+                    .dt.tz_convert(bd_tz).dt.strftime("%Y-%m-%d %I:%M:%S %p")
+                st.dataframe(history.iloc[::-1], hide_index=True, use_container_width=True)
+
+        # -------------------------
+        # Show Model & Gold answers side by side
+        # -------------------------
+        show_diff = st.checkbox("🔍 Highlight differences", value=True, key="show_answer_diff")
+        diff = None
+        if show_diff:
+            with tracer.span("answer_diff"):
+                diff = answer_diffs.get(row['Answer'], row['Gold Answer'])
+            prefetch_answer_diffs(upcoming_rows(st.session_state.index, held))
+        if show_diff and diff is None and not over_memory_budget:
+            wait_for_answer_diff(row['Answer'], row['Gold Answer'])
+        else:
+            # Over the memory budget the cache is emptied on every rerun, so a
+            # diff that missed the wait would never show: keep the plain answers
+            show_answers(row['Answer'], row['Gold Answer'], diff)
+
+        # -------------------------
+        # Rating UI
+        # -------------------------
+        st.markdown("---")
+        st.markdown("### ⭐ Rate the Model Answer")
+
+        rating_options = RATING_OPTIONS
+
+        default_index = 0
+        if existing_rating:
+            keys = list(rating_options.keys())
+            if existing_rating in keys:
+                default_index = keys.index(existing_rating)
+
+        rating_key = f"rating_{st.session_state.index}_{st.session_state.rating_counter}"
+        st.radio(
+            "Select a rating:",
+            options=list(rating_options.keys()),
+            index=default_index,
+            key=rating_key,
+            horizontal=True
+        )
+
+        # -------------------------
+        # Remarks UI
+        # -------------------------
+        st.markdown("---")
+        st.markdown("### 💭 Your Remarks")
+
+        remark_key = f"remark_{st.session_state.index}_{st.session_state.remark_counter}"
+        st.text_area(
+            "Add your evaluation remarks here:",
+            value=existing_remark,
+            height=150,
+            key=remark_key,
+            placeholder="✍️ Write your observations, corrections, or comments..."
+        )
+
+        # -------------------------
+        # Quick save button
+        # -------------------------
+        st.markdown("---")
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            if st.button("💾 Quick Save", use_container_width=True, type="primary"):
+                if save_review():
+                    st.success("✅ Review saved!")
+
+        # -------------------------
+        # Navigation buttons
+        # -------------------------
+        st.markdown("---")
+        if st.session_state.index == len(df) - 1 and st.session_state.get("nav_mode", "Sequential") == "Sequential":
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                st.button("⬅️ Previous", use_container_width=True, disabled=(st.session_state.index == 0), key="prev_final",
+                          on_click=navigate_to, args=(st.session_state.index - 1,))
+            with col2:
+                if st.button("💾 Save & Finish", use_container_width=True, key="save_finish"):
+                    if save_review(flush=True):
+                        st.balloons()
+                        st.success("✅ All reviews completed!")
+            with col3:
+                st.empty()
+        else:
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                st.button("⬅️ Previous", use_container_width=True, disabled=(st.session_state.index == 0), key="prev_btn",
+                          on_click=navigate_to, args=(st.session_state.index - 1,))
+            with col2:
+                if st.button("💾 Save Current", use_container_width=True, key="save_current"):
+                    if save_review():
+                        st.success("✅ Saved!")
+            with col3:
+                st.button("Next ➡️", use_container_width=True, key="next_btn", on_click=navigate_next)
+
+    # -------------------------
+    # Grid review (fragment)
+    # -------------------------
+    # Many short questions per screen: edits stay in the grid (a form, so no
+    # rerun per cell) until "Save page" writes the whole page in one batch.
+    # Only the rows of the visible page are read.
+    def load_page(start, stop):
+        """Question / answer columns of rows ``start:stop`` (parsed on demand for lazy inputs)."""
+        if LAZY_LOADING:
+            page = df.take(range(start, stop))
+        else:
+            page = df.iloc[start:stop]
+        return page[['Question', 'Answer', 'Gold Answer']].reset_index(drop=True)
+
+    def turn_grid_page(step):
+        st.session_state.grid_page = st.session_state.grid_page + step
+
+    @st.fragment
+    @tracer.traced("review_grid", rerun=True)
+    def review_grid():
+        load_existing_reviews(review_state)
+
+        n_pages = max(1, -(-len(df) // GRID_PAGE_SIZE))
+        # Follow jumps made from the sidebar (Go to, Next Pending, search results)
+        if st.session_state.get("_grid_index") != st.session_state.index or "grid_page" not in st.session_state:
+            st.session_state.grid_page = st.session_state.index // GRID_PAGE_SIZE + 1
+
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            page = st.number_input("📄 Page:", min_value=1, max_value=n_pages, step=1, key="grid_page")
+        with col2:
+            st.metric("✅ Reviewed", f"{review_state.reviewed_count}/{len(df)}")
+        with col3:
+            st.metric("📑 Pages", n_pages)
+
+        start = (page - 1) * GRID_PAGE_SIZE
+        stop = min(start + GRID_PAGE_SIZE, len(df))
+        if not start <= st.session_state.index < stop:
+            st.session_state.index = start
+        st.session_state._grid_index = st.session_state.index
+        st.caption(f"📊 Questions {start + 1}–{stop} of {len(df)}")
+
+        current_reviewer = st.session_state.get('reviewer_name_input', '')
+        rows = range(start, stop)
+        saved = [review_state.record(row_id, current_reviewer) or {} for row_id in rows]
+        grid = load_page(start, stop)
+        grid.insert(0, '#', [row_id + 1 for row_id in rows])
+        grid['Status'] = [
+            "✏️ Edited" if review_state.is_edited(row_id, current_reviewer)
+            else "✅ Reviewed" if review_state.is_reviewed(row_id) else "⏳ Pending"
+            for row_id in rows
+        ]
+        grid['Rating'] = [review.get('Rating') or None for review in saved]
+        grid['Remarks'] = [review.get('Remarks', "") for review in saved]
+
+        with st.form(f"grid_form_{page}", border=False):
+            edited = st.data_editor(
+                grid,
+                key=f"grid_{page}_{current_reviewer}",
+                hide_index=True,
+                use_container_width=True,
+                num_rows="fixed",
+                disabled=['#', 'Question', 'Answer', 'Gold Answer', 'Status'],
+                column_config={
+                    '#': st.column_config.NumberColumn("#", width="small"),
+                    'Question': st.column_config.TextColumn("❓ Question", width="large"),
+                    'Answer': st.column_config.TextColumn("🤖 Model Answer", width="medium"),
+                    'Gold Answer': st.column_config.TextColumn("✅ Gold Answer", width="medium"),
+                    'Status': st.column_config.TextColumn("📌 Status", width="small"),
+                    'Rating': st.column_config.SelectboxColumn("⭐ Rating", options=list(RATING_OPTIONS), width="medium"),
+                    'Remarks': st.column_config.TextColumn("💭 Remarks", width="large"),
+                },
+            )
+            submitted = st.form_submit_button("💾 Save page", use_container_width=True, type="primary")
+
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            st.button("⬅️ Previous page", use_container_width=True, disabled=page == 1, key="grid_prev",
+                      on_click=turn_grid_page, args=(-1,))
+        with col3:
+            st.button("Next page ➡️", use_container_width=True, disabled=page == n_pages, key="grid_next",
+                      on_click=turn_grid_page, args=(1,))
+
+        if not submitted:
+            return
+        reviewer_type = st.session_state.get('reviewer_type_input', 'Select Type')
+        if not current_reviewer or reviewer_type == "Select Type":
+            st.error("⚠️ Please enter your name and select reviewer type in the sidebar!")
+            return
+
+        # Dirty tracking: only rows whose rating or remark changed (or whose question was edited)
+        ratings = edited['Rating'].fillna("").astype(str).str.strip()
+        remarks = edited['Remarks'].fillna("").astype(str).str.strip()
+        # An emptied cell clears the saved value instead of leaving it unchanged
+        cleared_ratings = ratings.eq("") & grid['Rating'].fillna("").ne("")
+        cleared_remarks = remarks.eq("") & grid['Remarks'].ne("")
+        changed = ratings.ne(grid['Rating'].fillna("")) | remarks.ne(grid['Remarks'])
+        changed |= grid['Status'].eq("✏️ Edited") & (ratings.ne("") | remarks.ne(""))
+        save_time = datetime.now(bd_tz).strftime("%Y-%m-%d %I:%M:%S %p")
+        items = [
+            (start + offset, make_record(
+                ratings[offset], remarks[offset], current_reviewer, reviewer_type, save_time,
+                cleared=[col for col, emptied in (('Rating', cleared_ratings), ('Remarks', cleared_remarks))
+                         if emptied[offset]],
+            ))
+            for offset in changed[changed].index
+        ]
+        if not items:
+            st.info("Nothing changed on this page.")
+            return
+        try:
+            review_state.save_many(items)
+            st.success(f"✅ Saved {len(items)} review(s) from this page!")
+        except Exception as e:
+            st.error(f"Error saving page: {e}")
+
+    if st.session_state.get("review_layout") == "Grid":
+        review_grid()
     else:
-        st.metric("📌 Status", "Pending")
+        review_panel()
 
-# -------------------------
-# Question card
-# -------------------------
-st.markdown(f"""
-    <div class="question-card">
-      <p style="margin:0;"><strong>❓ Question:</strong></p>
-      <p style="margin-top: .6rem; font-size:1.05rem; color:#0f172a;">{row['Question']}</p>
-    </div>
-""", unsafe_allow_html=True)
+    # -------------------------
+    # Download and statistics section
+    # -------------------------
+    # Statistics are maintained incrementally by the review state and cached
+    # per state version, so they never rescan the dataset.
+    @st.fragment(run_every=SUMMARY_REFRESH_SECONDS)
+    @tracer.traced("review_summary", rerun=True)
+    def review_summary():
+        st.markdown("---")
+        st.markdown("### 📊 Review Summary & Export")
 
-# -------------------------
-# Show Model & Gold answers side by side
-# -------------------------
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown("#### 🤖 Model Answer")
-    st.info(row['Answer'])
-with col2:
-    st.markdown("#### ✅ Gold Answer")
-    st.success(row['Gold Answer'])
+        col1, col2 = st.columns([2, 1])
+        has_reviews = bool(review_state.reviews)
 
-# -------------------------
-# Rating UI
-# -------------------------
-st.markdown("---")
-st.markdown("### ⭐ Rate the Model Answer")
-
-rating_options = {
-    "⭐⭐⭐⭐⭐ Excellent": 5,
-    "⭐⭐⭐⭐ Good": 4,
-    "⭐⭐⭐ Fair": 3,
-    "⭐⭐ Poor": 2,
-    "⭐ Very Poor": 1
-}
-
-default_index = 0
-if existing_rating:
-    keys = list(rating_options.keys())
-    if existing_rating in keys:
-        default_index = keys.index(existing_rating)
-
-rating_key = f"rating_{st.session_state.index}_{st.session_state.rating_counter}"
-rating = st.radio(
-    "Select a rating:",
-    options=list(rating_options.keys()),
-    index=default_index,
-    key=rating_key,
-    horizontal=True
-)
+        # Statistics in expandable section
+        with col1:
+            if has_reviews:
+                with tracer.span("statistics"):
+                    stats = review_state.statistics()
+                with st.expander("📈 Detailed Statistics", expanded=False):
+                    # Rating statistics
+                    if stats['rated'] > 0:
+                        col_a, col_b, col_c, col_d = st.columns(4)
+                        with col_a:
+                            st.metric("Average Rating", f"{stats['mean']:.2f} ⭐")
+                        with col_b:
+                            st.metric("Std. Deviation", f"{stats['variance'] ** 0.5:.2f}")
+                        with col_c:
+                            st.metric("Total Rated", stats['rated'])
+                        with col_d:
+                            st.metric("Completion", f"{stats['completion']}%")
 
-# -------------------------
-# Remarks UI
-# -------------------------
-st.markdown("---")
-st.markdown("### 💭 Your Remarks")
-
-remark_key = f"remark_{st.session_state.index}_{st.session_state.remark_counter}"
-remark = st.text_area(
-    "Add your evaluation remarks here:",
-    value=existing_remark,
-    height=150,
-    key=remark_key,
-    placeholder="✍️ Write your observations, corrections, or comments..."
-)
+                        st.markdown("**Rating Distribution:**")
+                        st.dataframe(
+                            pd.DataFrame(stats['rating_dist'], columns=["Rating", "Count", "% of ratings"]),
+                            hide_index=True, use_container_width=True
+                        )
 
-# -------------------------
-# Quick save button
-# -------------------------
-st.markdown("---")
-col1, col2, col3 = st.columns([1, 2, 1])
-with col2:
-    if st.button("💾 Quick Save", use_container_width=True, type="primary"):
-        if save_review():
-            st.success("✅ Review saved!")
+                    # Reviewer statistics
+                    st.markdown("---")
+                    st.markdown("**Reviews by Reviewer Type:**")
+                    st.dataframe(
+                        pd.DataFrame(stats['reviewer_types'], columns=["Reviewer Type", "Reviews"]),
+                        hide_index=True, use_container_width=True
+                    )
+                    if stats['rating_by_type']:
+                        st.markdown("**Ratings by Reviewer Type:**")
+                        st.dataframe(pd.DataFrame.from_dict(stats['rating_by_type'], orient='index'), use_container_width=True)
+                    if stats['rating_by_category']:
+                        st.markdown("**Ratings by Question Category:**")
+                        st.dataframe(pd.DataFrame.from_dict(stats['rating_by_category'], orient='index'), use_container_width=True)
 
-# -------------------------
-# Navigation buttons
-# -------------------------
-st.markdown("---")
-if st.session_state.index == len(df) - 1:
-    col1, col2, col3 = st.columns([1, 1, 1])
-    with col1:
-        if st.button("⬅️ Previous", use_container_width=True, disabled=(st.session_state.index == 0), key="prev_final"):
-            navigate_to(st.session_state.index - 1)
-    with col2:
-        if st.button("💾 Save & Finish", use_container_width=True, key="save_finish"):
-            if save_review():
-                st.balloons()
-                st.success("✅ All reviews completed!")
-    with col3:
-        st.empty()
-else:
-    col1, col2, col3 = st.columns([1, 1, 1])
-    with col1:
-        if st.button("⬅️ Previous", use_container_width=True, disabled=(st.session_state.index == 0), key="prev_btn"):
-            navigate_to(st.session_state.index - 1)
-    with col2:
-        if st.button("💾 Save Current", use_container_width=True, key="save_current"):
-            if save_review():
-                st.success("✅ Saved!")
-    with col3:
-        if st.button("Next ➡️", use_container_width=True, key="next_btn"):
-            navigate_to(st.session_state.index + 1)
+                    col_a, col_b = st.columns(2)
+                    with col_a:
+                        st.markdown("**Reviews by Reviewer:**")
+                        st.dataframe(
+                            pd.DataFrame(stats['by_reviewer'], columns=["Reviewer", "Reviews"]),
+                            hide_index=True, use_container_width=True
+                        )
+                    with col_b:
+                        st.markdown("**Reviews by Day:**")
+                        st.dataframe(
+                            pd.DataFrame(stats['by_day'], columns=["Day", "Reviews"]),
+                            hide_index=True, use_container_width=True
+                        )
+
+                # Inter-annotator agreement over questions rated by two or more reviewers
+                with tracer.span("agreement"):
+                    agreement = review_state.agreement()
+                with st.expander("🤝 Inter-Annotator Agreement", expanded=False):
+                    if agreement['items'] == 0:
+                        st.info("💡 No question has been rated by two or more reviewers yet.")
+                    else:
+                        def coefficient(value):
+                            return "—" if value is None else f"{value:.3f}"
+
+                        col_a, col_b, col_c, col_d = st.columns(4)
+                        with col_a:
+                            st.metric("Multi-rated Questions", agreement['items'])
+                        with col_b:
+                            st.metric("Cohen's κ (mean)", coefficient(agreement['cohen_kappa']))
+                        with col_c:
+                            st.metric("Fleiss' κ", coefficient(agreement['fleiss_kappa']))
+                        with col_d:
+                            st.metric("Krippendorff's α", coefficient(agreement['krippendorff_alpha']))
+
+                        st.markdown("**Pairwise Cohen's κ:**")
+                        st.dataframe(agreement['pairwise'].round(3), hide_index=True, use_container_width=True)
+
+                        st.markdown(f"**Disagreements ({len(agreement['disagreeing_items'])} questions):**")
+                        pairs = agreement['disagreeing_pairs'].head(500).copy()
+                        pairs['Row'] += 1
+                        st.dataframe(
+                            pairs.rename(columns={'Row': "Question"}),
+                            hide_index=True, use_container_width=True
+                        )
+
+        # Download button
+        with col2:
+            if has_reviews:
+                export_format = st.selectbox("Format:", list(EXPORT_FORMATS), key="export_format")
+                reviewed_only = st.checkbox("Only reviewed rows", value=True, key="export_reviewed_only")
+                export_reviewer_type = st.selectbox(
+                    "Reviewer type:",
+                    options=["All", "Tax Payer", "Non Tax Payer", "Tax Officer"],
+                    key="export_reviewer_type"
+                )
+                export_ratings = st.slider("Rating range:", 1, 5, (1, 5), key="export_rating_range")
+
+                @tracer.traced("export")
+                def build_export():
+                    # Runs only when the button is clicked, on Streamlit's download thread
+                    return export_reviews(
+                        review_state,
+                        export_format,
+                        reviewed_only=reviewed_only,
+                        reviewer_type=None if export_reviewer_type == "All" else export_reviewer_type,
+                        rating_range=None if export_ratings == (1, 5) else export_ratings,
+                    )
+
+                extension, mime = EXPORT_FORMATS[export_format]
+                st.download_button(
+                    label=f"⬇️ Download Reviews {export_format}",
+                    data=build_export,
+                    file_name=f"qa_review_{datetime.now(bd_tz).strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime=mime,
+                    use_container_width=True
+                )
+            else:
+                st.info("💡 No reviews saved yet. Start reviewing to enable download!")
+
+            # Time travel: the reviews as they were at an earlier moment
+            with st.expander("⏪ Reviews as of…", expanded=False):
+                now = datetime.now(bd_tz)
+                as_of_day = st.date_input("Date:", value=now.date(), key="as_of_date")
+                as_of_time = st.time_input("Time:", value=now.time().replace(microsecond=0), key="as_of_time")
+                as_of = bd_tz.localize(datetime.combine(as_of_day, as_of_time))
+
+                @tracer.traced("export_as_of")
+                def build_export_as_of():
+                    return export_reviews_as_of(review_state, as_of.timestamp(), "CSV")
+
+                st.download_button(
+                    label="⬇️ Download Reviews CSV as of then",
+                    data=build_export_as_of,
+                    file_name=f"qa_review_as_of_{as_of.strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv",
+                    use_container_width=True,
+                    key="as_of_download"
+                )
+                history_stats = review_state.history.stats()
+                st.caption(
+                    f"🗂️ History: {history_stats['deltas']:,} change(s), {history_stats['snapshots']} snapshot(s), "
+                    f"{history_stats['bytes'] / 1024:,.0f} KB"
+                )
+                if review_state.history_error is not None:
+                    st.warning(f"⚠️ Could not record review history: {review_state.history_error}")
+
+    review_summary()
 
 # -------------------------
-# Download and statistics section
+# Admin: hot-path timings and profiling (after the timed run, so it shows this run)
 # -------------------------
-st.markdown("---")
-st.markdown("### 📊 Review Summary & Export")
-
-col1, col2 = st.columns([2, 1])
-
-# Statistics in expandable section
-with col1:
-    df_to_stats = st.session_state.get('_df_saved', df_saved)
-    if df_to_stats is not None:
-        with st.expander("📈 Detailed Statistics", expanded=False):
-            # Rating statistics
-            if 'Rating_Value' in df_to_stats.columns:
-                ratings = pd.to_numeric(df_to_stats['Rating_Value'], errors='coerce').dropna()
-                if len(ratings) > 0:
-                    col_a, col_b, col_c = st.columns(3)
-                    with col_a:
-                        st.metric("Average Rating", f"{ratings.mean():.2f} ⭐")
-                    with col_b:
-                        st.metric("Total Rated", len(ratings))
-                    with col_c:
-                        st.metric("Completion", f"{int(len(ratings)/len(df)*100)}%")
-                    
-                    st.markdown("**Rating Distribution:**")
-                    rating_dist = df_to_stats['Rating'].value_counts()
-                    for rating_label, count in rating_dist.items():
-                        if pd.notna(rating_label) and rating_label != "":
-                            pct = int(count / len(df) * 100)
-                            st.write(f"- {rating_label}: {count} ({pct}%)")
-
-            # Reviewer statistics
-            if 'Reviewer_Type' in df_to_stats.columns:
-                st.markdown("---")
-                st.markdown("**Reviews by Reviewer Type:**")
-                reviewer_types = df_to_stats['Reviewer_Type'].value_counts()
-                for rtype, count in reviewer_types.items():
-                    if pd.notna(rtype) and rtype != "" and rtype != "Select Type":
-                        st.write(f"- {rtype}: {count}")
-
-# Download button
-with col2:
-    if os.path.exists(OUTPUT_FILE):
-        try:
-            df_download = pd.read_csv(OUTPUT_FILE)
-            csv = df_download.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="⬇️ Download Reviews CSV",
-                data=csv,
-                file_name=f"qa_review_{datetime.now(bd_tz).strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
+if ADMIN_PANEL:
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("⏱️ Performance (admin)", expanded=False):
+            if PERF_TRACE:
+                scope = st.radio("Scope:", ["This session", "All sessions"], horizontal=True, key="perf_scope")
+                timings = tracer.summary(session_only=scope == "This session")
+                if timings.empty:
+                    st.caption("No samples yet.")
+                else:
+                    st.dataframe(timings.round(1), hide_index=True, use_container_width=True)
+                st.caption(f"📝 Every rerun is logged to {PERF_LOG_FILE}")
+            else:
+                st.caption("Timing spans are off; start the app with QA_PERF_TRACE=1 to collect them.")
+
+            st.button(
+                "🧪 Profile next rerun",
+                key="perf_profile_button",
+                use_container_width=True,
+                on_click=tracer.request_profile
             )
-        except Exception as e:
-            st.error(f"Error loading file: {e}")
-    else:
-        st.info("💡 No reviews saved yet. Start reviewing to enable download!")
+            profile = tracer.profile()
+            if profile is not None:
+                profiled_at, rerun_ms, report = profile
+                st.caption(
+                    f"Profiled rerun at {datetime.fromtimestamp(profiled_at, bd_tz).strftime('%I:%M:%S %p')}: "
+                    f"{rerun_ms:.0f} ms"
+                )
+                st.download_button(
+                    "⬇️ Download profile",
+                    data=report,
+                    file_name="qa_review_profile.txt",
+                    mime="text/plain",
+                    use_container_width=True
+                )
+                st.code(report[:20000])
+
+        with st.expander("🧠 Memory (admin)", expanded=False):
+            budget = memory_budget
+            rss, limit, over = budget.status()
+            if rss is None:
+                st.caption("Process memory cannot be read on this platform.")
+            elif limit:
+                st.progress(min(rss / limit, 1.0), text=f"{rss / 2**20:,.0f} of {limit / 2**20:,.0f} MB")
+                if over:
+                    st.warning("⚠️ This process is over its memory budget (QA_MEMORY_BUDGET_MB): "
+                               "answer diffs are no longer cached or prefetched.")
+            else:
+                st.metric("Process memory", f"{rss / 2**20:,.0f} MB")
+            this_session = session_bytes(st.session_state)
+            fit = budget.sessions_that_fit(this_session)
+            st.caption(
+                f"👤 This session holds ≈{this_session / 1024:,.0f} KB"
+                + (f"; ≈{fit:,} more such sessions fit in the budget." if fit is not None else ".")
+            )
+            if st.button("📏 Measure shared data", key="memory_measure_button", use_container_width=True):
+                st.dataframe(budget.footprint({
+                    "Input data": df,
+                    "Review frame": review_state.frame,
+                    "Review records": review_state.records,
+                    "Per-question reviews": review_state.reviews,
+                    "Ratings matrix": review_state.ratings,
+                    "Row keys": review_state.row_keys,
+                    "Near-duplicate signatures": near_duplicates,
+                    "Answer diffs": answer_diffs,
+                }).round(2), hide_index=True, use_container_width=True)
 
 # -------------------------
 # Footer
@@ -0,0 +1,325 @@
+# review_cli.py
+"""Headless bulk import and merging of reviewer output files.
+
+Usage:
+  python review_cli.py merge FILE... [--input INPUT] [--out MERGED.csv] [--long REVIEWS.csv]
+                                     [--conflicts latest|all]
+  python review_cli.py import FILE... [--input INPUT] [--output OUTPUT.csv]
+                                      [--backend journal|sqlite]
+
+FILE can be a reviewed copy of the output CSV, a ``*.reviewers.csv``, a
+review journal, or a CSV / JSONL / Parquet export from the app.
+Every review is validated against the input dataset. Reviews are matched
+to input rows by content key when the file carries the question text or a
+``Row_Key``, and by position otherwise. Rows that cannot be matched, or
+that fall outside the input, are reported and skipped. Ratings are
+checked against the rating scale.
+
+Of several reviews of the same question by the same reviewer, the one
+with the latest ``Review_Date`` wins (file order breaks ties): the app
+keeps one review per question and reviewer.  ``merge`` writes the
+per-question output CSV, and optionally every review in long format,
+where ``--conflicts all`` keeps every distinct review instead of the
+latest.  ``import`` writes into the app's review store and its review
+history, and compacts the store under the store's file lock, so it can
+run while the app is serving reviewers.
+All matching and conflict resolution is done with whole-frame joins, so
+hundreds of files and millions of rows go through in one pass.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset_loader import REQUIRED_COLUMNS, load_dataset_cached, parse_sheets, sheets_variant
+from review_store import (
+    RATING_OPTIONS,
+    REVIEW_COLUMNS,
+    REVIEW_DATE_FORMAT,
+    merge_record,
+    open_review_store,
+    records_frame,
+    resync_records,
+    review_key,
+    row_reviews,
+    write_reviews_csv,
+)
+from review_history import ReviewHistory, history_path
+from row_identity import RowKeys, hash_rows, load_row_keys
+
+CONFLICT_STRATEGIES = ("latest", "all")
+# Reviews written to the store per save_many() call
+IMPORT_BATCH_SIZE = 50_000
+
+_RATING_LABELS = {str(value): label for label, value in RATING_OPTIONS.items()}
+_RATING_VALUES = {label: str(value) for label, value in RATING_OPTIONS.items()}
+
+
+# -------------------------
+# Reading reviewer files
+# -------------------------
+def read_review_file(path):
+    """Read a reviewer file as an all-string frame."""
+    lower = path.lower()
+    if lower.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    elif lower.endswith((".jsonl", ".json", ".ndjson")):
+        frame = pd.read_json(path, lines=True, dtype=False)
+    else:
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    frame = frame.rename(columns={'row': 'Row'})
+    return frame.astype(object).where(frame.notna(), "").astype(str)
+
+
+def _positions(frame, row_keys):
+    """Input row of every review and how it was matched ('exact', 'edited', 'position' or 'unmatched')."""
+    n_rows = len(frame)
+    keys = None
+    if all(col in frame.columns for col in REQUIRED_COLUMNS):
+        keys = RowKeys(*hash_rows(frame)).keys
+    elif 'Row_Key' in frame.columns and frame['Row_Key'].ne("").all():
+        keys = frame['Row_Key'].to_numpy(dtype=object)
+
+    match = np.full(n_rows, "unmatched", dtype=object)
+    if keys is not None:
+        positions = row_keys.positions(keys)
+        match[positions >= 0] = "exact"
+        missing = positions < 0
+        positions[missing] = row_keys.edited_positions(keys[missing])
+        match[missing & (positions >= 0)] = "edited"
+        return positions, match, keys
+
+    if 'Row' in frame.columns:
+        positions = pd.to_numeric(frame['Row'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64, copy=True)
+    else:
+        # A per-question output without the question text: one row per input row
+        positions = np.arange(n_rows, dtype=np.int64)
+    valid = (positions >= 0) & (positions < len(row_keys))
+    positions[~valid] = -1
+    match[valid] = "position"
+    keys = np.full(n_rows, "", dtype=object)
+    keys[valid] = row_keys.keys[positions[valid]]
+    return positions, match, keys
+
+
+def _review_dates(dates):
+    parsed = pd.to_datetime(dates, format=REVIEW_DATE_FORMAT, errors='coerce')
+    unparsed = parsed.isna() & dates.ne("")
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(dates[unparsed], format='mixed', errors='coerce')
+    return parsed
+
+
+def normalize_reviews(frame, row_keys, source=0, reviewer=""):
+    """Validate one reviewer file against the input; return ``(reviews, counts)``.
+
+    ``reviews`` has ``Row`` plus the review columns, the parsed review date
+    and the file's order, for reviewed rows that matched an input row.
+    """
+    positions, match, keys = _positions(frame, row_keys)
+    reviews = pd.DataFrame({col: frame[col] if col in frame.columns else "" for col in REVIEW_COLUMNS},
+                           index=frame.index).reset_index(drop=True)
+    reviews['Row_Key'] = keys
+    if reviewer:
+        reviews['Reviewer'] = reviews['Reviewer'].mask(reviews['Reviewer'].eq(""), reviewer)
+
+    # Ratings: the label decides; a bare 1-5 value gets its label; anything else is dropped
+    label_values = reviews['Rating'].map(RATING_OPTIONS)
+    value_labels = reviews['Rating_Value'].str.replace(r"\.0$", "", regex=True).map(_RATING_LABELS)
+    invalid = (reviews['Rating'].ne("") & label_values.isna()) | \
+        (reviews['Rating'].eq("") & reviews['Rating_Value'].ne("") & value_labels.isna())
+    reviews['Rating'] = reviews['Rating'].where(label_values.notna(), value_labels.fillna(""))
+    reviews['Rating_Value'] = reviews['Rating'].map(_RATING_VALUES).fillna("")
+
+    reviewed = (reviews['Rating'].ne("") | reviews['Remarks'].ne("")).to_numpy()
+    matched = positions >= 0
+    keep = reviewed & matched
+    counts = {
+        'rows': len(frame),
+        'reviews': int(reviewed.sum()),
+        'exact': int((keep & (match == "exact")).sum()),
+        'edited': int((keep & (match == "edited")).sum()),
+        'by_position': int((keep & (match == "position")).sum()),
+        'unmatched': int((reviewed & ~matched).sum()),
+        'invalid_rating': int((invalid.to_numpy() & keep).sum()),
+        'no_reviewer': int((reviews['Reviewer'].eq("").to_numpy() & keep).sum()),
+    }
+    reviews.insert(0, 'Row', positions)
+    reviews = reviews[keep].reset_index(drop=True)
+    reviews['_date'] = _review_dates(reviews['Review_Date'])
+    reviews['_source'] = source
+    reviews['_line'] = np.arange(len(reviews))
+    return reviews, counts
+
+
+def load_reviews(paths, row_keys, reviewer="", progress=None):
+    """Read and validate every file; return all reviews and a per-file report frame."""
+    frames, report = [], []
+    total = 0
+    for source, path in enumerate(paths, start=1):
+        reviews, counts = normalize_reviews(read_review_file(path), row_keys, source, reviewer)
+        frames.append(reviews)
+        report.append({'File': path, **counts})
+        total += len(reviews)
+        if progress is not None:
+            progress(source, len(paths), total)
+    if frames:
+        reviews = pd.concat(frames, ignore_index=True)
+    else:
+        reviews = pd.DataFrame(columns=['Row', *REVIEW_COLUMNS, '_date', '_source', '_line'])
+    return reviews, pd.DataFrame(report)
+
+
+# -------------------------
+# Conflict resolution
+# -------------------------
+def resolve_conflicts(reviews, strategy="latest"):
+    """Order reviews oldest first and apply ``strategy`` per (question, reviewer).
+
+    ``latest`` keeps only the review with the latest ``Review_Date`` (later
+    files and lines win ties; undated reviews count as oldest).  ``all``
+    keeps every distinct review.
+    """
+    if strategy not in CONFLICT_STRATEGIES:
+        raise ValueError(f"Unknown conflict strategy: {strategy}")
+    reviews = reviews.sort_values(['_date', '_source', '_line'], kind='stable', na_position='first')
+    if strategy == "latest":
+        reviews = reviews.drop_duplicates(['Row', 'Reviewer'], keep='last')
+    else:
+        reviews = reviews.drop_duplicates(['Row', *REVIEW_COLUMNS], keep='last')
+    return reviews.reset_index(drop=True)
+
+
+def to_records(reviews):
+    """Latest resolved review (oldest first) of every question and reviewer as ``{(row_id, reviewer): record}``."""
+    records = {}
+    rows = reviews['Row'].to_numpy()
+    for row_id, record in zip(rows.tolist(), reviews[REVIEW_COLUMNS].to_dict('records')):
+        key = review_key(row_id, record)
+        records.pop(key, None)
+        records[key] = record
+    return records
+
+
+# -------------------------
+# Commands
+# -------------------------
+def _load_input(path, sheets):
+    df = load_dataset_cached(path, sheets)
+    variant = sheets_variant(sheets) if path.lower().endswith(('.xlsx', '.xlsm')) else ""
+    return df, load_row_keys(path, df, variant)
+
+
+def _progress(done, total, reviews):
+    print(f"\rRead {done}/{total} files ({reviews:,} reviews)", end="", file=sys.stderr, flush=True)
+
+
+def merge_files(paths, row_keys, strategy="latest", reviewer="", progress=None):
+    """Merge reviewer files; return ``(reviews, report)`` with the resolved reviews oldest first."""
+    reviews, report = load_reviews(paths, row_keys, reviewer, progress)
+    return resolve_conflicts(reviews, strategy), report
+
+
+def import_files(paths, store, df, row_keys, reviewer="", progress=None, history=None):
+    """Import reviewer files into ``store``; return ``(imported, report)``.
+
+    A stored review newer than the imported one for the same question and
+    reviewer is kept.  Imported changes are appended to ``history`` (a
+    ``ReviewHistory``) when given.
+    """
+    reviews, report = load_reviews(paths, row_keys, reviewer, progress)
+    reviews = resolve_conflicts(reviews, "latest")
+    records = resync_records(store.load(), row_keys)[0] if len(reviews) else {}
+    if len(reviews):
+        existing = records_frame(records)
+        existing = pd.DataFrame({
+            'Row': existing['Row'].to_numpy(dtype=np.int64),
+            'Reviewer': existing['Reviewer'].astype(str),
+            '_stored': _review_dates(existing['Review_Date'].astype(str)),
+        })
+        stored = reviews[['Row', 'Reviewer']].merge(existing, on=['Row', 'Reviewer'], how='left')['_stored']
+        # Undated imports count as older than any dated stored review
+        newer = stored.notna() & (reviews['_date'].isna() | (stored > reviews['_date']))
+        reviews = reviews[~newer.to_numpy()].reset_index(drop=True)
+
+    if history is not None:
+        # A history started by this import begins with the reviews already stored
+        history.seed(records)
+    rows = reviews['Row'].to_numpy().tolist()
+    imported = reviews[REVIEW_COLUMNS].to_dict('records')
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        batch = list(zip(rows[start:start + IMPORT_BATCH_SIZE], imported[start:start + IMPORT_BATCH_SIZE]))
+        store.save_many(batch)
+        if history is not None:
+            changes = []
+            for row_id, record in batch:
+                key = review_key(row_id, record)
+                previous = records.get(key)
+                records[key] = merge_record(previous, record)
+                changes.append((row_id, previous, records[key]))
+            history.record(changes)
+        if progress is not None:
+            print(f"\rWrote {min(start + IMPORT_BATCH_SIZE, len(rows)):,}/{len(rows):,} reviews",
+                  end="", file=sys.stderr, flush=True)
+    store.compact(df, row_keys)
+    return len(rows), report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and merge reviewer output files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("merge", "merge reviewer files into one output file"),
+                            ("import", "import reviewer files into the app's review store")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("files", nargs="+", help="reviewer files (.csv, .jsonl or .parquet)")
+        command.add_argument("--input", default=os.environ.get("QA_INPUT_FILE", "qa_dataset - Sheet1.csv"),
+                             help="input dataset the reviews belong to")
+        command.add_argument("--sheets", default=None, help="workbook sheets (as QA_INPUT_SHEETS)")
+        command.add_argument("--reviewer", default="", help="reviewer name for reviews without one")
+    merge = commands.choices["merge"]
+    merge.add_argument("--out", default="qa_dataset_merged.csv", help="per-question output CSV")
+    merge.add_argument("--long", default=None, help="also write every review (one row per review) here")
+    merge.add_argument("--conflicts", choices=CONFLICT_STRATEGIES, default="latest",
+                       help="same question and reviewer in --long: latest Review_Date wins, or keep all")
+    store_command = commands.choices["import"]
+    store_command.add_argument("--output", default="qa_dataset_with_remarks.csv", help="the app's output CSV")
+    store_command.add_argument("--backend", choices=["journal", "sqlite"],
+                               default=os.environ.get("QA_REVIEW_BACKEND", "journal"), help="review store")
+    store_command.add_argument("--no-history", dest="history", action="store_false",
+                               help="do not record the imported changes in the review history")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df, row_keys = _load_input(args.input, parse_sheets(args.sheets))
+
+    if args.command == "merge":
+        reviews, report = merge_files(args.files, row_keys, args.conflicts, args.reviewer, _progress)
+        # Kept distinct reviews are oldest first, so each reviewer's latest wins here
+        questions = row_reviews(to_records(reviews))
+        write_reviews_csv(df, questions, args.out)
+        if args.long:
+            reviews[['Row', *REVIEW_COLUMNS]].to_csv(args.long, index=False)
+        print(file=sys.stderr)
+        print(f"Merged {len(reviews):,} reviews of {len(questions):,} questions "
+              f"in {time.perf_counter() - start:.1f}s -> {args.out}")
+    else:
+        store = open_review_store(args.output, args.backend)
+        history = ReviewHistory(history_path(args.output)) if args.history else None
+        imported, report = import_files(args.files, store, df, row_keys, args.reviewer, _progress, history)
+        print(file=sys.stderr)
+        print(f"Imported {imported:,} reviews in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+    print(report.to_string(index=False))
+    unmatched, invalid = int(report['unmatched'].sum()), int(report['invalid_rating'].sum())
+    if unmatched:
+        print(f"⚠️ Skipped {unmatched:,} review(s) matching no input row")
+    if invalid:
+        print(f"⚠️ Dropped {invalid:,} invalid rating(s) (remarks kept)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# review_export.py
+import json
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from review_history import reviews_as_of
+from review_store import REVIEW_COLUMNS, decode_reviews, review_frame, row_reviews
+
+# Rows written per step; bounds the memory an export needs
+EXPORT_CHUNK_SIZE = 5000
+
+# format label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "JSONL": ("jsonl", "application/x-ndjson"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+# -------------------------
+# Row selection
+# -------------------------
+def select_rows(frame, reviewed_only=False, reviewer_type=None, rating_range=None):
+    """Return the positions of rows matching the export filters.
+
+    Works on the review columns only (vectorized), so filtering never
+    touches the input text.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    if reviewed_only:
+        mask &= (frame['Rating'].ne("") | frame['Remarks'].ne("")).to_numpy(dtype=bool)
+    if reviewer_type:
+        mask &= frame['Reviewer_Type'].eq(reviewer_type).to_numpy(dtype=bool)
+    if rating_range is not None:
+        low, high = rating_range
+        values = pd.to_numeric(frame['Rating_Value'], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            mask &= (values >= low) & (values <= high)
+    return np.flatnonzero(mask)
+
+
+def iter_export_chunks(df, frame, positions, chunk_size=None):
+    """Yield input rows at ``positions`` joined with their review columns, chunk by chunk."""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    take = getattr(df, 'take', None)
+    for start in range(0, len(positions), chunk_size):
+        chunk_positions = positions[start:start + chunk_size]
+        rows = take(chunk_positions) if take is not None else df.iloc[chunk_positions]
+        rows = rows.drop(columns=[col for col in REVIEW_COLUMNS if col in rows.columns]).reset_index(drop=True)
+        reviews = decode_reviews(frame.iloc[chunk_positions]).reset_index(drop=True)
+        # One concat instead of a column insert per review column
+        yield pd.concat([rows, reviews[REVIEW_COLUMNS]], axis=1)
+
+
+# -------------------------
+# Chunked writers
+# -------------------------
+def _write_csv(chunks, fh):
+    for i, chunk in enumerate(chunks):
+        fh.write(chunk.to_csv(index=False, header=(i == 0)).encode('utf-8'))
+
+
+def _write_jsonl(chunks, fh):
+    for chunk in chunks:
+        records = chunk.astype(object).where(chunk.notna(), None).to_dict(orient='records')
+        fh.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records).encode('utf-8'))
+
+
+def _write_parquet(chunks, fh):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(fh, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(chunks, fh):
+    from openpyxl import Workbook
+
+    # write_only streams rows to the zip instead of keeping cells in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Reviews")
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            sheet.append(list(chunk.columns))
+        for values in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            sheet.append(list(values))
+    workbook.save(fh)
+
+
+_WRITERS = {
+    "CSV": _write_csv,
+    "Parquet": _write_parquet,
+    "JSONL": _write_jsonl,
+    "XLSX": _write_xlsx,
+}
+
+
+def write_export(fh, fmt, df, frame, positions):
+    """Write the selected rows to the binary file object ``fh`` in ``fmt``."""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if len(positions) == 0:
+        # Still emit the header / schema for an empty selection
+        chunks = iter([pd.DataFrame(columns=list(df.columns) + REVIEW_COLUMNS, dtype=object)])
+    else:
+        chunks = iter_export_chunks(df, frame, positions)
+    _WRITERS[fmt](chunks, fh)
+
+
+def export_reviews(state, fmt, reviewed_only=False, reviewer_type=None, rating_range=None):
+    """Export the shared review state to a rewound temporary file.
+
+    Only the small review-column frame is snapshotted; input rows are read
+    and written chunk by chunk, and the output spills to disk past 64 MB.
+    With ``reviewer_type``, every question carries its review by a reviewer
+    of that type, even when the question shows another type's review.
+    """
+    frame = state.snapshot_frame(reviewer_type)
+    positions = select_rows(frame, reviewed_only, reviewer_type, rating_range)
+    fh = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+    write_export(fh, fmt, state.df, frame, positions)
+    fh.seek(0)
+    return fh
+
+
+def export_reviews_as_of(state, ts, fmt, reviewed_only=True):
+    """Export the reviews as they were at ``ts`` (epoch seconds), from ``state.history``.
+
+    Past reviews are placed on the rows of the current input by content key.
+    """
+    frame = review_frame(len(state.df), row_reviews(reviews_as_of(state.history, state.row_keys, ts)))
+    positions = select_rows(frame, reviewed_only)
+    fh = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+    write_export(fh, fmt, state.df, frame, positions)
+    fh.seek(0)
+    return fh
@@ -0,0 +1,315 @@
+# review_history.py
+"""Versioned review history: every change as a compact delta, with time travel.
+
+Each save is appended to ``review_deltas`` as one row holding only the
+fields that changed for that (question, reviewer) review, keyed by the
+question's content key (see row_identity) so the history follows a
+question when the input is reordered.  ``review_snapshots`` periodically
+stores the whole state (zlib-compressed) so that "reviews as of T" loads
+the latest snapshot at or before T and replays only the deltas after it.
+A snapshot is taken once the deltas since the previous one outnumber the
+reviews it held (and at least ``SNAPSHOT_EVERY``), which keeps both the
+replay per query and the snapshot storage proportional to the log.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from review_store import (
+    RATING_OPTIONS, REVIEW_COLUMNS, REVIEW_TIMEZONE, date_seconds, resync_records, stored_key,
+)
+
+# Minimum number of deltas between two snapshots
+SNAPSHOT_EVERY = 10_000
+
+# Review field -> short key stored in a delta.  The rating label is not
+# stored: it follows from the rating value.
+_DELTA_FIELDS = {
+    'Rating_Value': 'v',
+    'Remarks': 'm',
+    'Reviewer_Type': 't',
+    'Review_Date': 'd',
+}
+_RATING_LABELS = {value: label for label, value in RATING_OPTIONS.items()}
+
+_SQL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS review_deltas (
+        seq INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        row_key TEXT NOT NULL,
+        reviewer TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        changes TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS deltas_question ON review_deltas (row_key, seq);
+    CREATE INDEX IF NOT EXISTS deltas_time ON review_deltas (ts);
+    CREATE TABLE IF NOT EXISTS review_snapshots (
+        seq INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        reviews INTEGER NOT NULL,
+        data BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS snapshots_time ON review_snapshots (ts);
+"""
+
+
+def history_path(output_path):
+    return f"{os.path.splitext(output_path)[0]}.history.sqlite3"
+
+
+def _value(record, col):
+    value = record.get(col, "") if record else ""
+    if col == 'Rating_Value':
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return ""
+    return "" if value is None else str(value)
+
+
+def review_times(dates, now=None):
+    """Epoch times of ``Review_Date`` strings (wall-clock in ``REVIEW_TIMEZONE``); ``now`` where undated."""
+    seconds = date_seconds(dates)
+    offsets = pd.to_datetime(seconds[seconds > 0], unit='s').tz_localize(
+        REVIEW_TIMEZONE, ambiguous='NaT', nonexistent='shift_forward'
+    )
+    times = np.full(len(seconds), time.time() if now is None else now, dtype=float)
+    known = ~offsets.isna()
+    times[np.flatnonzero(seconds > 0)[known]] = (offsets[known] - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)
+    return times
+
+
+def review_delta(old, new):
+    """Fields of ``new`` that differ from ``old``, as ``{short_key: value}``."""
+    return {
+        short: _value(new, col)
+        for col, short in _DELTA_FIELDS.items()
+        if _value(new, col) != _value(old, col)
+    }
+
+
+def _apply_delta(state, row_key, reviewer, row_id, changes):
+    """Fold one delta into ``{(row_key, reviewer): [row_id, {short_key: value}]}``."""
+    entry = state.get((row_key, reviewer))
+    if entry is None:
+        state[(row_key, reviewer)] = [row_id, dict(changes)]
+    else:
+        entry[0] = row_id
+        entry[1].update(changes)
+
+
+def _record(row_key, reviewer, fields):
+    value = fields.get('v', "")
+    record = {col: fields.get(short, "") for col, short in _DELTA_FIELDS.items()}
+    record.update({
+        'Rating': _RATING_LABELS.get(value, ""),
+        'Reviewer': reviewer,
+        # Reviews recorded without a content key are kept under "#<row_id>"
+        'Row_Key': "" if row_key.startswith("#") else row_key,
+    })
+    return {col: record.get(col, "") for col in REVIEW_COLUMNS}
+
+
+class ReviewHistory:
+    """Append-only review history in a SQLite database (WAL mode) next to the output."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_running = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SQL_SCHEMA)
+        self._count_since_snapshot()
+
+    def _connect(self):
+        # One connection per thread (sessions and the snapshot thread)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------------------------
+    # Writing
+    # -------------------------
+    def record(self, changes, ts=None):
+        """Append ``(row_id, old_record, new_record)`` changes; return the number of deltas written.
+
+        ``ts`` is one time for all changes (default: now) or a list with
+        one time per change.  Saves that change nothing (e.g. re-saving the
+        same review) are skipped.
+        """
+        changes = list(changes)
+        if ts is None or isinstance(ts, (int, float)):
+            ts = [time.time() if ts is None else ts] * len(changes)
+        rows = []
+        for change_ts, (row_id, old, new) in zip(ts, changes):
+            delta = review_delta(old, new)
+            if delta:
+                rows.append((
+                    change_ts,
+                    new.get('Row_Key', "") or f"#{int(row_id)}",
+                    new.get('Reviewer', "") or "",
+                    int(row_id),
+                    json.dumps(delta, ensure_ascii=False, separators=(',', ':')),
+                ))
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO review_deltas (ts, row_key, reviewer, row_id, changes) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        with self._snapshot_lock:
+            self._since_snapshot += len(rows)
+            due = self._since_snapshot >= self._snapshot_threshold
+            if due:
+                self._since_snapshot = 0
+        if due:
+            threading.Thread(target=self.snapshot, daemon=True).start()
+        return len(rows)
+
+    def seed(self, records):
+        """Start the history from the current ``{(row_id, reviewer): record}`` if it is empty.
+
+        Every review is stamped with its own ``Review_Date`` (undated ones
+        with the current time), in time order, so "as of" queries before
+        the history existed still see when each review was made.
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM review_deltas LIMIT 1").fetchone() is not None or not records:
+            return 0
+        changes = [(row_id, None, record) for (row_id, _), record in records.items()]
+        times = review_times([record.get('Review_Date', "") for _, _, record in changes])
+        order = np.argsort(times, kind='stable')
+        return self.record([changes[i] for i in order], times[order].tolist())
+
+    def _count_since_snapshot(self):
+        # Counted once; afterwards record() keeps the count in memory (writes
+        # from other processes are picked up at the next snapshot)
+        conn = self._connect()
+        last = conn.execute("SELECT seq, reviews FROM review_snapshots ORDER BY seq DESC LIMIT 1").fetchone()
+        last_seq, reviews = last or (0, 0)
+        since = conn.execute("SELECT COUNT(*) FROM review_deltas WHERE seq > ?", (last_seq,)).fetchone()[0]
+        with self._snapshot_lock:
+            self._since_snapshot = since
+            self._snapshot_threshold = max(SNAPSHOT_EVERY, reviews)
+
+    def snapshot(self):
+        """Store the full state as of the latest delta (no-op if another snapshot is running)."""
+        if not self._snapshot_running.acquire(blocking=False):
+            return None
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT seq, ts FROM review_deltas ORDER BY seq DESC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            seq, ts = row
+            state = self._state(conn, seq)
+            data = zlib.compress(json.dumps(
+                [[row_key, reviewer, row_id, fields] for (row_key, reviewer), (row_id, fields) in state.items()],
+                ensure_ascii=False, separators=(',', ':'),
+            ).encode('utf-8'))
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO review_snapshots (seq, ts, reviews, data) VALUES (?, ?, ?, ?)",
+                    (seq, ts, len(state), data),
+                )
+            self._count_since_snapshot()
+            return seq
+        finally:
+            self._snapshot_running.release()
+
+    # -------------------------
+    # Reading
+    # -------------------------
+    def _state(self, conn, until_seq=None, until_ts=None):
+        """Replay the log onto the nearest snapshot; ``{(row_key, reviewer): [row_id, fields]}``."""
+        if until_ts is not None:
+            snapshot = conn.execute(
+                "SELECT seq, data FROM review_snapshots WHERE ts <= ? ORDER BY ts DESC, seq DESC LIMIT 1",
+                (until_ts,)
+            ).fetchone()
+        else:
+            snapshot = conn.execute(
+                "SELECT seq, data FROM review_snapshots WHERE seq <= ? ORDER BY seq DESC LIMIT 1", (until_seq,)
+            ).fetchone()
+        state = {}
+        from_seq = 0
+        if snapshot is not None:
+            from_seq = snapshot[0]
+            for row_key, reviewer, row_id, fields in json.loads(zlib.decompress(snapshot[1])):
+                state[(row_key, reviewer)] = [row_id, fields]
+        if until_ts is not None:
+            deltas = conn.execute(
+                "SELECT row_key, reviewer, row_id, changes FROM review_deltas WHERE seq > ? AND ts <= ? ORDER BY seq",
+                (from_seq, until_ts)
+            )
+        else:
+            deltas = conn.execute(
+                "SELECT row_key, reviewer, row_id, changes FROM review_deltas WHERE seq > ? AND seq <= ? ORDER BY seq",
+                (from_seq, until_seq)
+            )
+        for row_key, reviewer, row_id, changes in deltas:
+            _apply_delta(state, row_key, reviewer, row_id, json.loads(changes))
+        return state
+
+    def state_at(self, ts):
+        """Reviews as they were at ``ts`` (epoch seconds) as ``{(row_key, reviewer): (row_id, record)}``.
+
+        The same shape as a review store's ``load()``, so ``resync_records``
+        can place them on the rows of the current input.
+        """
+        stored = {}
+        for (row_key, reviewer), (row_id, fields) in self._state(self._connect(), until_ts=ts).items():
+            record = _record(row_key, reviewer, fields)
+            stored[stored_key(row_id, record)] = (row_id, record)
+        return stored
+
+    def question_history(self, row_key):
+        """Every change to the reviews of one question, oldest first.
+
+        Each row shows the reviewer's full review after the change and which
+        fields changed (``Changed``).
+        """
+        rows = self._connect().execute(
+            "SELECT ts, reviewer, changes FROM review_deltas WHERE row_key = ? ORDER BY seq", (row_key,)
+        ).fetchall()
+        shorts = {short: col for col, short in _DELTA_FIELDS.items()}
+        state, history = {}, []
+        for ts, reviewer, changes in rows:
+            changes = json.loads(changes)
+            fields = state.setdefault(reviewer, {})
+            fields.update(changes)
+            record = _record(row_key, reviewer, fields)
+            history.append({
+                'Time': ts,
+                'Reviewer': reviewer,
+                'Reviewer_Type': record['Reviewer_Type'],
+                'Rating': record['Rating'],
+                'Remarks': record['Remarks'],
+                'Changed': ", ".join(shorts[short].replace('_Value', '') for short in changes),
+            })
+        return pd.DataFrame(history, columns=['Time', 'Reviewer', 'Reviewer_Type', 'Rating', 'Remarks', 'Changed'])
+
+    def stats(self):
+        """Delta and snapshot counts and the database size in bytes."""
+        conn = self._connect()
+        deltas = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM review_deltas").fetchone()[0]
+        snapshots = conn.execute("SELECT COUNT(*) FROM review_snapshots").fetchone()[0]
+        size = sum(os.path.getsize(path) for path in (self.db_path, f"{self.db_path}-wal") if os.path.exists(path))
+        return {'deltas': deltas, 'snapshots': snapshots, 'bytes': size}
+
+
+def reviews_as_of(history, row_keys, ts):
+    """Reviews at ``ts`` re-attached to the current input rows: ``{(row_id, reviewer): record}``."""
+    records, _ = resync_records(history.state_at(ts), row_keys)
+    return records
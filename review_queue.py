@@ -0,0 +1,198 @@
+# review_queue.py
+import heapq
+import threading
+import time
+
+import numpy as np
+
+from review_agreement import RatingMatrix
+
+# Weights of the priority components (each component lies in [0, 1]).
+# 'pending' outweighs the other two combined, so every unreviewed row is
+# served before any reviewed row comes back for a second look.
+PRIORITY_WEIGHTS = {
+    'pending': 2.0,        # never reviewed
+    'dissimilarity': 1.0,  # 1 - auto-score similarity to gold
+    'disagreement': 1.0,   # spread of the reviewers' ratings
+}
+# Auto-score columns averaged into one similarity value
+SIMILARITY_COLUMNS = ['token_f1', 'rouge_l', 'char_ngram']
+# Similarity assumed for rows without an auto-score
+UNKNOWN_SIMILARITY = 0.5
+# A popped row returns to the queue if it is neither saved nor handed back
+# within this many seconds (e.g. the reviewer closed the tab)
+QUEUE_LEASE_SECONDS = 15 * 60
+
+
+def row_similarity(scores):
+    """Collapse a per-row score frame (aligned with the dataset) into one similarity in [0, 1]."""
+    if scores is None or len(scores) == 0:
+        return None
+    return scores[SIMILARITY_COLUMNS].mean(axis=1).fillna(UNKNOWN_SIMILARITY).to_numpy(dtype=float)
+
+
+def rating_spread(ratings):
+    """Disagreement per row of a (question x reviewer) rating matrix (NaN: not rated), in [0, 1].
+
+    The gap between the highest and the lowest rating, over the full 1-5
+    scale; 0 for rows rated by fewer than two reviewers.  ``ratings`` may
+    also be a ``RatingMatrix``: only its multiply-rated rows are then
+    made dense.
+    """
+    if isinstance(ratings, RatingMatrix):
+        spread = np.zeros(ratings.n_rows)
+        multi = ratings.multi_rated()
+        spread[multi] = rating_spread(ratings.dense(multi))
+        return spread
+    ratings = np.asarray(ratings, dtype=float)
+    rated = ~np.isnan(ratings)
+    high = np.where(rated, ratings, -np.inf).max(axis=1, initial=-np.inf)
+    low = np.where(rated, ratings, np.inf).min(axis=1, initial=np.inf)
+    return np.where(rated.sum(axis=1) >= 2, (high - low) / 4, 0.0)
+
+
+def compute_priorities(reviewed, ratings, similarity=None, weights=None):
+    """Vectorized priority for every row; higher means review sooner.
+
+    ``reviewed`` is the reviewed bitmap, ``ratings`` the (question x
+    reviewer) ratings (a ``RatingMatrix`` or a dense array with NaN where a
+    reviewer has not rated a question, see ``rating_spread``) and ``similarity`` the auto-score
+    similarity per row (None when no scores are available).
+    """
+    weights = weights or PRIORITY_WEIGHTS
+    n_rows = len(reviewed)
+    if similarity is None:
+        similarity = np.full(n_rows, UNKNOWN_SIMILARITY)
+    pending = ~reviewed
+    disagreement = rating_spread(ratings)
+    return (
+        weights['pending'] * pending
+        + weights['dissimilarity'] * (1 - similarity)
+        + weights['disagreement'] * disagreement
+    )
+
+
+class ReviewQueue:
+    """Indexed max-priority queue of rows, updated incrementally.
+
+    A binary heap with lazy invalidation: ``update()`` pushes a fresh entry
+    and bumps the row's generation, and ``pop()`` skips entries whose
+    generation is stale.  Both are O(log n).  A popped row is leased to
+    its reviewer: it comes back with its next ``update()`` (its next
+    save), when it is handed back with ``requeue()``, or once the lease
+    expires after ``lease_seconds``, so rows left unsaved are not lost.
+    """
+
+    def __init__(self, priorities, lease_seconds=QUEUE_LEASE_SECONDS):
+        self._lock = threading.Lock()
+        self.lease_seconds = lease_seconds
+        self._generation = np.zeros(len(priorities), dtype=np.int64)
+        self._priority = np.asarray(priorities, dtype=float).copy()
+        self._queued = np.ones(len(priorities), dtype=bool)
+        self._heap = [(-p, row_id, 0) for row_id, p in enumerate(self._priority.tolist())]
+        heapq.heapify(self._heap)
+        # (expiry, row_id, generation when popped), earliest expiry first
+        self._leases = []
+
+    def __len__(self):
+        return int(self._queued.sum())
+
+    def priority(self, row_id):
+        return float(self._priority[row_id])
+
+    def update(self, row_id, priority):
+        with self._lock:
+            self._push(row_id, priority)
+
+    def _push(self, row_id, priority):
+        # Called with the lock held
+        self._generation[row_id] += 1
+        self._priority[row_id] = priority
+        self._queued[row_id] = True
+        heapq.heappush(self._heap, (-priority, row_id, int(self._generation[row_id])))
+        # Stale entries accumulate; rebuild once they dominate the heap
+        if len(self._heap) > 2 * len(self._priority) + 1024:
+            self._rebuild()
+
+    def requeue(self, row_id):
+        """Hand a popped row back (with its last priority); no-op if it is queued."""
+        with self._lock:
+            if 0 <= row_id < len(self._queued) and not self._queued[row_id]:
+                self._push(row_id, float(self._priority[row_id]))
+
+    def _expire_leases(self, now):
+        # Called with the lock held
+        while self._leases and self._leases[0][0] <= now:
+            _, row_id, generation = heapq.heappop(self._leases)
+            # Still taken by that pop: neither saved nor handed back since
+            if not self._queued[row_id] and self._generation[row_id] == generation:
+                self._push(row_id, float(self._priority[row_id]))
+
+    def pop(self, exclude=None):
+        """Remove and return the highest-priority row (None when the queue is empty)."""
+        with self._lock:
+            self._expire_leases(time.monotonic())
+            skipped = None
+            while self._heap:
+                neg_priority, row_id, generation = heapq.heappop(self._heap)
+                if generation != self._generation[row_id]:
+                    continue
+                if row_id == exclude:
+                    skipped = (neg_priority, row_id, generation)
+                    continue
+                # Mark as taken so older duplicates are ignored too
+                self._generation[row_id] += 1
+                self._queued[row_id] = False
+                heapq.heappush(
+                    self._leases, (time.monotonic() + self.lease_seconds, row_id, int(self._generation[row_id]))
+                )
+                if skipped is not None:
+                    heapq.heappush(self._heap, skipped)
+                return row_id
+            if skipped is not None:
+                heapq.heappush(self._heap, skipped)
+            return None
+
+    def peek(self, count, exclude=None):
+        """The ``count`` highest-priority queued rows, best first, without taking them.
+
+        Walks the heap from its root through a frontier heap, so only the
+        entries above the last row returned are visited (stale ones included).
+        """
+        with self._lock:
+            rows = []
+            frontier = [(self._heap[0], 0)] if self._heap else []
+            while frontier and len(rows) < count:
+                (_, row_id, generation), i = heapq.heappop(frontier)
+                if generation == self._generation[row_id] and row_id != exclude:
+                    rows.append(row_id)
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(frontier, (self._heap[child], child))
+            return rows
+
+    def _rebuild(self):
+        self._heap = [
+            (-self._priority[row_id], row_id, int(self._generation[row_id]))
+            for row_id in np.flatnonzero(self._queued).tolist()
+        ]
+        heapq.heapify(self._heap)
+
+
+def build_review_queue(state, scores=None):
+    """Build the queue for a ``ReviewState`` and keep it updated on every save."""
+    similarity = row_similarity(scores)
+    queue = ReviewQueue(compute_priorities(state.reviewed, state.ratings, similarity))
+
+    def on_save(row_id, record):
+        # Runs after the save reached ``state.ratings``: every reviewer's rating of the row
+        if not 0 <= row_id < len(state.reviewed):
+            return
+        row_sim = None if similarity is None else similarity[row_id:row_id + 1]
+        priority = compute_priorities(
+            state.reviewed[row_id:row_id + 1], state.ratings.dense([row_id]), row_sim
+        )[0]
+        queue.update(row_id, float(priority))
+
+    state.add_listener(on_save)
+    return queue
@@ -0,0 +1,168 @@
+# review_stats.py
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Input columns used for the "rating by question category" breakdown, in
+# order of preference ("Sheet" is added when several workbook sheets are loaded)
+CATEGORY_COLUMNS = ['Category', 'Sheet']
+# Review record fields the statistics read
+_RECORD_COLUMNS = ['Rating', 'Rating_Value', 'Remarks', 'Reviewer', 'Reviewer_Type', 'Review_Date']
+
+
+def _histogram():
+    # Index = rating value (1-5); slot 0 is unused
+    return np.zeros(6, dtype=np.int64)
+
+
+def _rating_value(record):
+    try:
+        value = int(float(record.get('Rating_Value', "")))
+    except (TypeError, ValueError):
+        return None
+    return value if 1 <= value <= 5 else None
+
+
+def _day(record):
+    # Review_Date is "%Y-%m-%d %I:%M:%S %p"
+    return (record.get('Review_Date') or "")[:10]
+
+
+def category_values(df):
+    """Return the per-row category array for ``df`` (None if it has no category column)."""
+    if not isinstance(df, pd.DataFrame):
+        return None
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            return df[col].astype(str).to_numpy()
+    return None
+
+
+class ReviewStatistics:
+    """Aggregates over the saved reviews, maintained incrementally.
+
+    Every reviewer's review of a question counts on its own (two reviews
+    of one question are two ratings, each credited to its reviewer and
+    reviewer type); completion counts the questions rated by anyone.
+    Built once from the ``{(row_id, reviewer): record}`` reviews with
+    vectorized pandas, then kept up to date by ``replace(old, new)`` on
+    every save, so reading the statistics never rescans the dataset.
+    """
+
+    def __init__(self, n_rows=0):
+        self.histogram = _histogram()
+        self.reviewed = 0
+        self.by_reviewer = Counter()
+        self.by_type = Counter()
+        self.by_day = Counter()
+        self.rating_by_type = defaultdict(_histogram)
+        self.rating_by_category = defaultdict(_histogram)
+        # Ratings per question, and the number of questions with at least one
+        self.row_ratings = np.zeros(n_rows, dtype=np.int32)
+        self.rated_questions = 0
+
+    @classmethod
+    def from_records(cls, n_rows, records, categories=None):
+        """Build from ``{(row_id, reviewer): record}`` (see review_store)."""
+        stats = cls(n_rows)
+        if not records:
+            return stats
+        frame = pd.DataFrame(list(records.values()), columns=_RECORD_COLUMNS).fillna("").astype(str)
+        rows = np.fromiter((row_id for row_id, _ in records), dtype=np.int64, count=len(records))
+        values = pd.to_numeric(frame['Rating_Value'], errors='coerce')
+        rated = values.between(1, 5).to_numpy(dtype=bool)
+        rated_values = values[rated].astype(np.int64).to_numpy()
+        stats.histogram = np.bincount(rated_values, minlength=6).astype(np.int64)
+        rated_rows = rows[rated]
+        rated_rows = rated_rows[(rated_rows >= 0) & (rated_rows < n_rows)]
+        stats.row_ratings = np.bincount(rated_rows, minlength=n_rows).astype(np.int32)
+        stats.rated_questions = int(np.count_nonzero(stats.row_ratings))
+
+        reviewed = (frame['Rating'].ne("") | frame['Remarks'].ne("")).to_numpy(dtype=bool)
+        stats.reviewed = int(reviewed.sum())
+        stats.by_reviewer.update(frame.loc[reviewed, 'Reviewer'].value_counts().to_dict())
+        stats.by_type.update(frame.loc[reviewed, 'Reviewer_Type'].value_counts().to_dict())
+        stats.by_day.update(frame.loc[reviewed, 'Review_Date'].str[:10].value_counts().to_dict())
+
+        rated_types = frame.loc[rated, 'Reviewer_Type'].to_numpy()
+        for rtype in pd.unique(rated_types):
+            stats.rating_by_type[rtype] = np.bincount(rated_values[rated_types == rtype], minlength=6)
+        if categories is not None:
+            in_range = (rows[rated] >= 0) & (rows[rated] < len(categories))
+            rated_categories = categories[rows[rated][in_range]]
+            for category in pd.unique(rated_categories):
+                stats.rating_by_category[category] = np.bincount(
+                    rated_values[in_range][rated_categories == category], minlength=6
+                )
+        return stats
+
+    def _apply(self, record, row_id, category, sign):
+        if not record or not (record.get('Rating') or record.get('Remarks')):
+            return
+        self.reviewed += sign
+        self.by_reviewer[record.get('Reviewer', "")] += sign
+        self.by_type[record.get('Reviewer_Type', "")] += sign
+        self.by_day[_day(record)] += sign
+        value = _rating_value(record)
+        if value is not None:
+            self.histogram[value] += sign
+            self.rating_by_type[record.get('Reviewer_Type', "")][value] += sign
+            if category is not None:
+                self.rating_by_category[category][value] += sign
+            if row_id is not None and 0 <= row_id < len(self.row_ratings):
+                before = self.row_ratings[row_id]
+                self.row_ratings[row_id] += sign
+                self.rated_questions += int(self.row_ratings[row_id] > 0) - int(before > 0)
+
+    def replace(self, old, new, row_id=None, category=None):
+        """Swap one reviewer's review of question ``row_id`` from record ``old`` to record ``new``."""
+        self._apply(old, row_id, category, -1)
+        self._apply(new, row_id, category, +1)
+
+    def summary(self, total_rows, rating_labels):
+        """Return a plain dict of the current aggregates for display.
+
+        ``rating_labels`` maps rating values (1-5) to their display labels;
+        ``rating_dist`` percentages are shares of all ratings.
+        """
+        values = np.arange(6)
+        rated = int(self.histogram.sum())
+        mean = float((self.histogram * values).sum() / rated) if rated else None
+        variance = float((self.histogram * (values - mean) ** 2).sum() / rated) if rated else None
+
+        def counts(counter):
+            return sorted(
+                ((key, count) for key, count in counter.items() if key and key != "Select Type" and count > 0),
+                key=lambda item: -item[1]
+            )
+
+        def breakdown(histograms):
+            rows = {
+                key: {rating_labels[v]: int(h[v]) for v in range(5, 0, -1)}
+                for key, h in histograms.items()
+                if key and h.sum() > 0
+            }
+            for key, h in histograms.items():
+                if key in rows:
+                    rows[key]['Average'] = round(float((h * values).sum() / h.sum()), 2)
+            return rows
+
+        return {
+            'rated': rated,
+            'rated_questions': self.rated_questions,
+            'reviewed': self.reviewed,
+            'mean': mean,
+            'variance': variance,
+            'completion': int(self.rated_questions / total_rows * 100) if total_rows else 0,
+            'rating_dist': [
+                (rating_labels[v], int(self.histogram[v]), int(self.histogram[v] / rated * 100))
+                for v in range(5, 0, -1)
+                if self.histogram[v] > 0
+            ],
+            'by_reviewer': counts(self.by_reviewer),
+            'reviewer_types': counts(self.by_type),
+            'by_day': sorted(counts(self.by_day)),
+            'rating_by_type': breakdown(self.rating_by_type),
+            'rating_by_category': breakdown(self.rating_by_category),
+        }
@@ -0,0 +1,1171 @@
+# review_store.py
+import atexit
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the journal is only guarded within one process
+    fcntl = None
+
+from dataset_loader import HAVE_PYARROW, iter_row_chunks
+from review_agreement import RatingMatrix, agreement_report
+from row_identity import RowKeys
+from review_stats import ReviewStatistics, category_values
+
+# -------------------------
+# Review schema
+# -------------------------
+# Row_Key is the content key of the question the review was made on (see row_identity)
+REVIEW_COLUMNS = ['Rating', 'Rating_Value', 'Remarks', 'Reviewer', 'Reviewer_Type', 'Review_Date', 'Row_Key']
+
+RATING_OPTIONS = {
+    "⭐⭐⭐⭐⭐ Excellent": 5,
+    "⭐⭐⭐⭐ Good": 4,
+    "⭐⭐⭐ Fair": 3,
+    "⭐⭐ Poor": 2,
+    "⭐ Very Poor": 1
+}
+
+# Fields a save can empty on purpose (see ``make_record``); Rating carries Rating_Value
+CLEARABLE_COLUMNS = ('Rating', 'Remarks')
+
+# Format and time zone of Review_Date as written by the app
+REVIEW_DATE_FORMAT = "%Y-%m-%d %I:%M:%S %p"
+REVIEW_TIMEZONE = "Asia/Dhaka"
+
+# Saved rows whose Arrow-backed text columns are buffered before being
+# written into the review frame in one pass
+TEXT_FOLD_ROWS = 1024
+
+# Compact the journal into the output CSV once it holds this many records
+COMPACT_EVERY = 500
+# Input rows written per step when the output CSV is rewritten
+WRITE_CHUNK_SIZE = 5000
+
+# Autosave: flush pending rows after this many seconds or this many rows,
+# and block new saves once this many distinct rows are waiting
+AUTOSAVE_INTERVAL = 1.0
+AUTOSAVE_BATCH_SIZE = 64
+AUTOSAVE_MAX_PENDING = 1024
+
+
+def _clean(value):
+    """Normalise a cell read from CSV/JSON to a plain string ('' for missing)."""
+    if value is None:
+        return ""
+    try:
+        if pd.isna(value):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def make_record(rating, remark, reviewer, reviewer_type, review_date, cleared=()):
+    """Build a review record; empty rating/remark mean 'leave unchanged'.
+
+    ``cleared`` names the fields ('Rating', 'Remarks') the reviewer emptied
+    on purpose; they are stored as the record's ``Cleared`` list.
+    """
+    record = {
+        'Rating': rating or "",
+        'Rating_Value': RATING_OPTIONS.get(rating, "") if rating else "",
+        'Remarks': remark or "",
+        'Reviewer': reviewer,
+        'Reviewer_Type': reviewer_type,
+        'Review_Date': review_date,
+    }
+    if cleared:
+        record['Cleared'] = [col for col in CLEARABLE_COLUMNS if col in cleared]
+    return record
+
+
+def merge_record(old, new):
+    """Apply a reviewer's saved record on top of their existing one (same rules as the old in-place save).
+
+    Fields listed in ``new['Cleared']`` are emptied.  Records still waiting
+    to be written (``old`` with a ``Cleared`` list) keep the union, so a
+    coalesced write clears every field either save cleared.
+    """
+    merged = dict(old) if old else {col: "" for col in REVIEW_COLUMNS}
+    cleared = new.get('Cleared') or ()
+    if new.get('Rating') or 'Rating' in cleared:
+        merged['Rating'] = new.get('Rating', "")
+        merged['Rating_Value'] = new.get('Rating_Value', "")
+    if new.get('Remarks') or 'Remarks' in cleared:
+        merged['Remarks'] = new.get('Remarks', "")
+    if cleared and 'Cleared' in merged:
+        merged['Cleared'] = [col for col in CLEARABLE_COLUMNS if col in merged['Cleared'] or col in cleared]
+    for col in ('Reviewer', 'Reviewer_Type', 'Review_Date'):
+        merged[col] = new.get(col, "")
+    if new.get('Row_Key'):
+        merged['Row_Key'] = new['Row_Key']
+    return merged
+
+
+def review_key(row_id, record):
+    """Reviews are stored per (question, reviewer)."""
+    return int(row_id), record.get('Reviewer', "") or ""
+
+
+def put_record(records, row_id, record):
+    """Merge ``record`` into ``records`` and move its key to the end (most recent save)."""
+    key = review_key(row_id, record)
+    records[key] = merge_record(records.pop(key, None), record)
+    return records[key]
+
+
+def stored_key(row_id, record):
+    """Identity of a review on disk: (row content key, reviewer).
+
+    Reviews saved before rows had keys fall back to their position.
+    """
+    return record.get('Row_Key', "") or int(row_id), record.get('Reviewer', "") or ""
+
+
+def put_stored(stored, row_id, record):
+    """Like ``put_record`` for ``{stored_key: (row_id, record)}``; the latest position wins.
+
+    A keyed record replaces the same reviewer's unkeyed review at its
+    position: that is how an adopted key is stored (see ``adopt_keys``).
+    """
+    key = stored_key(row_id, record)
+    old = stored.pop(key, None)
+    if old is None and record.get('Row_Key'):
+        old = stored.pop((int(row_id), record.get('Reviewer', "") or ""), None)
+    stored[key] = (int(row_id), merge_record(old[1] if old else None, record))
+
+
+def resync_records(stored, row_keys):
+    """Re-attach stored reviews to the rows of the current input by content key.
+
+    ``stored`` is ``{stored_key: (row_id, record)}``, oldest save first.  A
+    review stays on its row while the key there still matches, follows its
+    question to a new position when the input was reordered, is kept on
+    the edited question (and reported as edited) when only its question or
+    only its answers changed, and is dropped when neither is found.
+    Reviews without a key are taken to match the current input at their
+    position and adopt that row's key.
+
+    Returns ``(records, sync)``: ``{(row_id, reviewer): record}`` in save
+    order, and a dict with the ``moved``/``adopted`` counts and the
+    ``edited`` review keys, ``dropped`` ``(row_id, record)`` pairs and
+    ``adopted`` ``(old_row_id, reviewer, row_key)`` triples.
+    """
+    items = list(stored.values())
+    n_rows = len(row_keys)
+    rows = np.fromiter((row_id for row_id, _ in items), dtype=np.int64, count=len(items))
+    keys = np.array([record.get('Row_Key', "") or "" for _, record in items], dtype=object)
+    in_range = (rows >= 0) & (rows < n_rows)
+    current = np.full(len(items), "", dtype=object)
+    current[in_range] = row_keys.keys[rows[in_range]]
+
+    legacy = keys == ""
+    same = ~legacy & (keys == current)
+    positions = np.where(same | (legacy & in_range), rows, -1)
+    moved = ~legacy & ~same
+    if moved.any():
+        positions[moved] = row_keys.positions(keys[moved])
+    gone = moved & (positions < 0)
+    if gone.any():
+        positions[gone] = row_keys.edited_positions(keys[gone])
+
+    records, dropped, adopted, edited = {}, [], [], set()
+    for position, (row_id, record), was_gone in zip(positions.tolist(), items, gone.tolist()):
+        if position < 0:
+            dropped.append((row_id, record))
+            continue
+        if not record.get('Row_Key'):
+            record = {**record, 'Row_Key': row_keys[position]}
+            adopted.append((row_id, record.get('Reviewer', "") or "", record['Row_Key']))
+        key = review_key(position, record)
+        if key in records:
+            put_record(records, position, record)
+        else:
+            # Stored records are already merged; only collisions need merging
+            records[key] = record
+        if was_gone:
+            edited.add(key)
+    # A newer review of the edited question, moved here from elsewhere, clears the flag
+    edited = {key for key in edited if records[key]['Row_Key'] != row_keys[key[0]]}
+    return records, {
+        'moved': int((moved & ~gone).sum()),
+        'edited': edited,
+        'dropped': dropped,
+        'adopted': adopted,
+    }
+
+
+def has_review(record):
+    """True if ``record`` holds a rating or a remark."""
+    return bool(record and (record.get('Rating') or record.get('Remarks')))
+
+
+def shown_review(old, new):
+    """The review a question shows once ``new`` is saved after ``old`` (see ``row_reviews``)."""
+    return new if old is None or has_review(new) or not has_review(old) else old
+
+
+def row_reviews(records):
+    """Collapse ``{(row_id, reviewer): record}`` (oldest save first) into ``{row_id: record}``.
+
+    A question shows one reviewer's whole review: the most recently saved
+    one with a rating or a remark (the latest one when none has either).
+    Fields of different reviewers are never combined.
+    """
+    reviews = {}
+    for (row_id, _), record in records.items():
+        reviews[row_id] = shown_review(reviews.get(row_id), record)
+    return reviews
+
+
+def reviewer_type_counts(n_rows, records):
+    """``{reviewer_type: int16 array}``: reviews with a rating or remark of each question, by reviewer type."""
+    by_type = {}
+    for (row_id, _), record in records.items():
+        if has_review(record) and 0 <= row_id < n_rows:
+            by_type.setdefault(record.get('Reviewer_Type', "") or "", []).append(row_id)
+    return {rtype: np.bincount(rows, minlength=n_rows).astype(np.int16) for rtype, rows in by_type.items()}
+
+
+def records_frame(records):
+    """Return ``{(row_id, reviewer): record}`` as a long frame, one row per review."""
+    frame = pd.DataFrame(list(records.values()), columns=REVIEW_COLUMNS).fillna("")
+    frame.insert(0, 'Row', [row_id for row_id, _ in records])
+    return frame
+
+
+# -------------------------
+# Compact review frame
+# -------------------------
+# The per-question review columns are held in memory as:
+#   Rating, Reviewer, Reviewer_Type  categorical ("" is a category: not reviewed)
+#   Rating_Value                     int8 (0: no rating)
+#   Review_Date                      int64 epoch seconds of the wall-clock time (0: none)
+#   Remarks, Row_Key                 Arrow-backed strings ("" for none)
+# ``decode_reviews()`` turns rows back into the plain strings written to files.
+_TEXT_DTYPE = "string[pyarrow]" if HAVE_PYARROW else object
+# Arrow arrays are immutable: writing one value copies the whole column, so
+# ReviewState buffers updates of these columns and folds them in batches
+TEXT_COLUMNS = ('Remarks', 'Row_Key')
+_EPOCH = datetime(1970, 1, 1)
+_CATEGORY_COLUMNS = {
+    'Rating': ["", *RATING_OPTIONS],
+    'Reviewer': [""],
+    'Reviewer_Type': ["", "Tax Payer", "Non Tax Payer", "Tax Officer"],
+}
+
+
+def date_seconds(dates):
+    """Parse ``Review_Date`` strings to int64 epoch seconds of their wall-clock time (0 if unparseable)."""
+    dates = pd.Series(dates, dtype=object).fillna("").astype(str)
+    parsed = pd.to_datetime(dates, format=REVIEW_DATE_FORMAT, errors='coerce')
+    unparsed = parsed.isna() & dates.ne("")
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(dates[unparsed], format='mixed', errors='coerce')
+    seconds = (parsed - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    return seconds.fillna(0).to_numpy(dtype=np.int64)
+
+
+def format_dates(seconds):
+    """Inverse of ``date_seconds``: ``Review_Date`` strings, "" where 0."""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    text = np.full(len(seconds), "", dtype=object)
+    dated = seconds != 0
+    if dated.any():
+        # strftime is slow per value: format each distinct time once (most
+        # rows are unreviewed, and a page saved at once shares its time)
+        unique, inverse = np.unique(seconds[dated], return_inverse=True)
+        formatted = pd.to_datetime(unique, unit='s').strftime(REVIEW_DATE_FORMAT).to_numpy(dtype=object)
+        text[dated] = formatted[inverse]
+    return text
+
+
+def _encode(col, values):
+    """Encode cleaned string ``values`` of review column ``col`` to its compact dtype."""
+    if col in _CATEGORY_COLUMNS:
+        values = pd.Series(values, dtype=object)
+        if col == 'Rating':
+            values = values.where(values.isin(_CATEGORY_COLUMNS['Rating']), "")
+        categories = list(dict.fromkeys([*_CATEGORY_COLUMNS[col], *pd.unique(values)]))
+        return pd.Categorical(values, categories=categories)
+    if col == 'Rating_Value':
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+        return numbers.where(numbers.between(1, 5), 0).fillna(0).to_numpy(dtype=np.int8)
+    if col == 'Review_Date':
+        return date_seconds(values)
+    return pd.array(values, dtype=_TEXT_DTYPE) if HAVE_PYARROW else np.asarray(values, dtype=object)
+
+
+def review_frame(n_rows, reviews):
+    """Return an ``n_rows`` frame holding only the review columns, in the compact layout."""
+    data = {col: np.full(n_rows, "", dtype=object) for col in REVIEW_COLUMNS}
+    for row_id, record in reviews.items():
+        if 0 <= row_id < n_rows:
+            for col in REVIEW_COLUMNS:
+                data[col][row_id] = _clean(record.get(col, ""))
+    return pd.DataFrame({col: _encode(col, values) for col, values in data.items()})
+
+
+def _encode_value(col, value):
+    """Per-value ``_encode`` for the few rows of a save (no array round trips)."""
+    if col == 'Rating':
+        return value if value in RATING_OPTIONS else ""
+    if col == 'Rating_Value':
+        try:
+            number = int(float(value))
+        except ValueError:
+            return 0
+        return number if 1 <= number <= 5 else 0
+    if col == 'Review_Date':
+        try:
+            return int((datetime.strptime(value, REVIEW_DATE_FORMAT) - _EPOCH).total_seconds())
+        except ValueError:
+            return int(date_seconds([value])[0]) if value else 0
+    return value
+
+
+def set_review_rows(frame, row_ids, records, columns=REVIEW_COLUMNS):
+    """Write ``records`` into rows ``row_ids`` of a compact review frame, one assignment per column."""
+    row_ids = list(row_ids)
+    for col in columns:
+        values = [_encode_value(col, _clean(record.get(col, ""))) for record in records]
+        if col in _CATEGORY_COLUMNS:
+            categories = frame[col].cat.categories
+            new = [value for value in dict.fromkeys(values) if value not in categories]
+            if new:
+                frame[col] = frame[col].cat.add_categories(new)
+        loc = frame.columns.get_loc(col)
+        if len(row_ids) == 1:
+            frame.iat[row_ids[0], loc] = values[0]
+        else:
+            dtype = frame[col].dtype if col in ('Rating_Value', 'Review_Date') else object
+            frame.iloc[row_ids, loc] = np.asarray(values, dtype=dtype)
+
+
+def decode_reviews(frame):
+    """Return review columns of a compact frame as plain strings ("" for empty), as written to files."""
+    values = frame['Rating_Value'].to_numpy()
+    decoded = {
+        'Rating': frame['Rating'].astype(object).to_numpy(),
+        'Rating_Value': np.where(values > 0, values.astype(str), "").astype(object),
+        'Remarks': frame['Remarks'].astype(object).to_numpy(),
+        'Reviewer': frame['Reviewer'].astype(object).to_numpy(),
+        'Reviewer_Type': frame['Reviewer_Type'].astype(object).to_numpy(),
+        'Review_Date': format_dates(frame['Review_Date'].to_numpy()),
+        'Row_Key': frame['Row_Key'].astype(object).to_numpy(),
+    }
+    # Plain object columns: no string-dtype inference on the way out
+    return pd.DataFrame(decoded, index=frame.index, dtype=object)
+
+
+def iter_review_chunks(df, frame, chunk_size=None):
+    """Yield every input row with its review columns from ``frame`` appended, chunk by chunk.
+
+    Lazy datasets are streamed from their file, so the memory needed is
+    bounded by ``chunk_size`` rather than by the size of the input.
+    """
+    columns = [col for col in df.columns if col not in REVIEW_COLUMNS]
+    start = 0
+    for rows in iter_row_chunks(df, columns, chunk_size or WRITE_CHUNK_SIZE):
+        reviews = decode_reviews(frame.iloc[start:start + len(rows)])
+        start += len(rows)
+        yield pd.concat([rows.reset_index(drop=True), reviews.reset_index(drop=True)], axis=1)
+
+
+def write_reviews_csv(df, reviews, path, chunk_size=None):
+    """Atomically write the input rows with the review columns filled in from ``reviews`` to ``path``."""
+    frame = review_frame(len(df), reviews)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as fh:
+        header = True
+        for chunk in iter_review_chunks(df, frame, chunk_size):
+            chunk.to_csv(fh, index=False, header=header)
+            header = False
+        if header:
+            # No input rows: still write the header
+            columns = [col for col in df.columns if col not in REVIEW_COLUMNS]
+            pd.DataFrame(columns=columns + REVIEW_COLUMNS).to_csv(fh, index=False)
+    os.replace(tmp_path, path)
+
+
+def _write_csv_atomic(frame, path):
+    tmp_path = f"{path}.tmp"
+    frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# -------------------------
+# Append-only journal store
+# -------------------------
+class JournalReviewStore:
+    """Review store backed by an append-only JSONL journal.
+
+    Each save appends one line ``{"row": ..., <review columns>}`` to the
+    journal.  Compaction re-attaches the reviews to the current input rows,
+    writes every (question, reviewer) review to ``reviewers_path`` and the
+    per-question view to the CSV at ``output_path``, appends reviews of
+    questions no longer in the input to ``dropped_path``, then truncates
+    the journal.  Appends and compaction hold an exclusive lock on
+    ``lock_path`` (``flock``), so another process (a second app worker,
+    ``review_cli.py import``) never appends to a journal that a
+    compaction has already read and is about to remove.
+    """
+
+    def __init__(self, output_path, journal_path=None, reviewers_path=None, dropped_path=None):
+        self.output_path = output_path
+        stem = os.path.splitext(output_path)[0]
+        self.journal_path = journal_path or f"{stem}.journal.jsonl"
+        self.reviewers_path = reviewers_path or f"{stem}.reviewers.csv"
+        self.dropped_path = dropped_path or f"{stem}.dropped.jsonl"
+        self.lock_path = f"{stem}.journal.lock"
+        self._lock = threading.Lock()
+        self._compacting = False
+        self.journal_records = 0
+
+    def load(self):
+        """Rebuild ``{stored_key: (row_id, record)}``, oldest save first, from disk plus the journal."""
+        records = {}
+        if os.path.exists(self.reviewers_path):
+            long_frame = pd.read_csv(self.reviewers_path, dtype=str, keep_default_na=False)
+            for values in long_frame.to_dict('records'):
+                put_stored(records, int(values.pop('Row')), values)
+        elif os.path.exists(self.output_path):
+            # Output written before reviews were kept per reviewer: one review per question
+            try:
+                df_out = pd.read_csv(self.output_path, dtype=str, keep_default_na=False)
+            except Exception:
+                df_out = None
+            if df_out is not None and any(col in df_out.columns for col in REVIEW_COLUMNS):
+                cols = [col for col in REVIEW_COLUMNS if col in df_out.columns]
+                reviewed = df_out[cols].ne("").any(axis=1)
+                for row_id, values in df_out.loc[reviewed, cols].iterrows():
+                    put_stored(records, row_id, {col: values.get(col, "") for col in REVIEW_COLUMNS})
+
+        self.journal_records = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-append; skip it
+                        continue
+                    put_stored(records, entry.pop('row'), entry)
+                    self.journal_records += 1
+        return records
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Hold the store's thread lock and, where available, its cross-process file lock."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self, row_id, record):
+        """Append one review record to the journal."""
+        self.save_many([(row_id, record)])
+
+    def save_many(self, items):
+        """Append several ``(row_id, record)`` pairs with a single write and fsync."""
+        lines = [
+            json.dumps({'row': int(row_id), **record}, ensure_ascii=False) + "\n"
+            for row_id, record in items
+        ]
+        with self._exclusive():
+            with open(self.journal_path, 'a', encoding='utf-8') as fh:
+                fh.write("".join(lines))
+                fh.flush()
+                os.fsync(fh.fileno())
+            self.journal_records += len(lines)
+
+    def adopt_keys(self, items):
+        """Store the row keys adopted by reviews saved before rows had keys.
+
+        The re-keyed ``(row_id, record)`` pairs are appended to the journal
+        (each replaces its unkeyed review on load); the CSVs are rewritten by
+        the next regular compaction.
+        """
+        self.save_many(items)
+
+    def needs_compaction(self):
+        return self.journal_records >= COMPACT_EVERY and not self._compacting
+
+    def compact(self, df, row_keys):
+        """Write the per-reviewer and per-question CSVs for the rows of ``df`` and truncate the journal."""
+        with self._exclusive():
+            self._compacting = True
+            try:
+                records, sync = resync_records(self.load(), row_keys)
+                if sync['dropped']:
+                    with open(self.dropped_path, 'a', encoding='utf-8') as fh:
+                        fh.writelines(
+                            json.dumps({'row': int(row_id), **record}, ensure_ascii=False) + "\n"
+                            for row_id, record in sync['dropped']
+                        )
+                _write_csv_atomic(records_frame(records), self.reviewers_path)
+                write_reviews_csv(df, row_reviews(records), self.output_path)
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self.journal_records = 0
+            finally:
+                self._compacting = False
+
+    def compact_in_background(self, df, row_keys):
+        """Start compaction on a daemon thread if the journal has grown large enough."""
+        if not self.needs_compaction():
+            return None
+        thread = threading.Thread(target=self.compact, args=(df, row_keys), daemon=True)
+        thread.start()
+        return thread
+
+
+# -------------------------
+# SQLite store (WAL mode)
+# -------------------------
+_SQL_COLUMNS = {
+    'Rating': 'rating',
+    'Rating_Value': 'rating_value',
+    'Remarks': 'remarks',
+    'Reviewer': 'reviewer',
+    'Reviewer_Type': 'reviewer_type',
+    'Review_Date': 'review_date',
+    'Row_Key': 'row_key',
+}
+
+_SQL_CREATE = """
+    CREATE TABLE IF NOT EXISTS review_records (
+        row_id INTEGER NOT NULL,
+        reviewer TEXT NOT NULL DEFAULT '',
+        row_key TEXT NOT NULL DEFAULT '',
+        rating TEXT NOT NULL DEFAULT '',
+        rating_value TEXT NOT NULL DEFAULT '',
+        remarks TEXT NOT NULL DEFAULT '',
+        reviewer_type TEXT NOT NULL DEFAULT '',
+        review_date TEXT NOT NULL DEFAULT '',
+        saved_seq INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (row_id, reviewer, row_key)
+    )
+"""
+
+_SQL_UPSERT = """
+    INSERT INTO review_records
+        (row_id, rating, rating_value, remarks, reviewer, reviewer_type, review_date, row_key, saved_seq)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9)
+    ON CONFLICT(row_id, reviewer, row_key) DO UPDATE SET
+        rating = CASE WHEN excluded.rating != '' OR ?10 THEN excluded.rating ELSE review_records.rating END,
+        rating_value = CASE WHEN excluded.rating != '' OR ?10 THEN excluded.rating_value ELSE review_records.rating_value END,
+        remarks = CASE WHEN excluded.remarks != '' OR ?11 THEN excluded.remarks ELSE review_records.remarks END,
+        reviewer_type = excluded.reviewer_type,
+        review_date = excluded.review_date,
+        saved_seq = excluded.saved_seq
+"""
+
+
+class SqliteReviewStore:
+    """Review store backed by a SQLite database in WAL mode.
+
+    Every save is a single-row upsert keyed by ``(row_id, reviewer,
+    row_key)``, so concurrent reviewers never overwrite each other's
+    reviews, a review never lands on a different question that moved into
+    its position, and save latency does not depend on the dataset size.
+    ``saved_seq`` orders the reviews by their latest save.  The CSV at
+    ``output_path`` is only written by ``compact()`` (export on demand).
+    """
+
+    def __init__(self, output_path, db_path=None):
+        self.output_path = output_path
+        self.db_path = db_path or f"{os.path.splitext(output_path)[0]}.sqlite3"
+        self._local = threading.local()
+        with self._connect() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(review_records)")}
+            if columns and 'row_key' not in columns:
+                # Tables from before row keys: rebuild with the new primary key
+                conn.execute("ALTER TABLE review_records RENAME TO review_records_unkeyed")
+                conn.execute(_SQL_CREATE)
+                conn.execute("""
+                    INSERT INTO review_records
+                        (row_id, reviewer, rating, rating_value, remarks, reviewer_type, review_date, saved_seq)
+                    SELECT row_id, reviewer, rating, rating_value, remarks, reviewer_type, review_date, saved_seq
+                    FROM review_records_unkeyed
+                """)
+                conn.execute("DROP TABLE review_records_unkeyed")
+            conn.execute(_SQL_CREATE)
+            empty = conn.execute("SELECT 1 FROM review_records LIMIT 1").fetchone() is None
+            legacy = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reviews'"
+            ).fetchone() is not None
+        if empty:
+            self._import_legacy() if legacy else self._import_csv()
+
+    def _connect(self):
+        # sqlite3 connections must not be shared across threads; Streamlit
+        # runs each session on its own thread, so keep one per thread.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _import_csv(self):
+        """Seed an empty database from an existing output CSV."""
+        if not os.path.exists(self.output_path):
+            return
+        seed = JournalReviewStore(self.output_path, journal_path=os.devnull)
+        self.save_many(seed.load().values())
+
+    def _import_legacy(self):
+        """Seed from the one-review-per-question ``reviews`` table of older databases."""
+        cols = ", ".join(_SQL_COLUMNS[col] for col in REVIEW_COLUMNS if col != 'Row_Key')
+        rows = self._connect().execute(f"SELECT row_id, {cols} FROM reviews ORDER BY row_id").fetchall()
+        self.save_many((row[0], dict(zip(_SQL_COLUMNS, row[1:]))) for row in rows)
+
+    def load(self):
+        """Return ``{stored_key: (row_id, record)}``, oldest save first."""
+        cols = ", ".join(_SQL_COLUMNS.values())
+        rows = self._connect().execute(
+            f"SELECT row_id, {cols} FROM review_records ORDER BY saved_seq, row_id"
+        ).fetchall()
+        records = {}
+        for row in rows:
+            put_stored(records, row[0], dict(zip(_SQL_COLUMNS, row[1:])))
+        return records
+
+    def save(self, row_id, record):
+        self.save_many([(row_id, record)])
+
+    def save_many(self, items):
+        """Upsert several ``(row_id, record)`` pairs in one transaction."""
+        items = list(items)
+        params = [
+            (int(row_id), *(_clean(record.get(col, "")) for col in _SQL_COLUMNS))
+            for row_id, record in items
+        ]
+        # Per record: is its (empty) rating / remark a deliberate clear?
+        cleared = [
+            tuple(col in (record.get('Cleared') or ()) for col in CLEARABLE_COLUMNS)
+            for _, record in items
+        ]
+        with self._connect() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(saved_seq), 0) FROM review_records").fetchone()[0]
+            conn.executemany(_SQL_UPSERT, [
+                (*p, seq + i, *flags) for i, (p, flags) in enumerate(zip(params, cleared), start=1)
+            ])
+
+    def needs_compaction(self):
+        return False
+
+    def adopt_keys(self, items):
+        """Store the row keys adopted by reviews saved before rows had keys, in place."""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE OR IGNORE review_records SET row_key = ? WHERE row_id = ? AND reviewer = ? AND row_key = ''",
+                [(record['Row_Key'], int(row_id), record.get('Reviewer', "") or "") for row_id, record in items],
+            )
+            # Left over only where the same review was also saved with its key
+            conn.execute("DELETE FROM review_records WHERE row_key = ''")
+
+    def compact(self, df, row_keys):
+        """Store the keys adopted by unkeyed reviews and export the current reviews to the output CSV."""
+        records, sync = resync_records(self.load(), row_keys)
+        if sync['adopted']:
+            self.adopt_keys([(row_id, records[(row_id, reviewer)]) for row_id, reviewer, _ in sync['adopted']])
+        write_reviews_csv(df, row_reviews(records), self.output_path)
+
+    def compact_in_background(self, df, row_keys):
+        return None
+
+
+def open_review_store(output_path, backend="journal"):
+    """Return the review store for ``backend`` ('journal' or 'sqlite')."""
+    if backend == "sqlite":
+        return SqliteReviewStore(output_path)
+    if backend == "journal":
+        return JournalReviewStore(output_path)
+    raise ValueError(f"Unknown review backend: {backend}")
+
+
+# -------------------------
+# Background autosave (write-behind)
+# -------------------------
+class AutosaveWriter:
+    """Write-behind queue in front of a review store.
+
+    ``submit()`` only records the review as dirty; repeated edits of the
+    same (question, reviewer) are coalesced with ``merge_record``.  A daemon thread writes the
+    pending rows with one ``save_many()`` call every ``interval`` seconds,
+    or sooner once ``batch_size`` rows are waiting.  The queue is bounded:
+    ``submit()`` blocks while ``max_pending`` rows are waiting.  Failed
+    batches are put back and retried on the next tick.  With a ``history``
+    (see review_history), ``submit_history()`` queues the saves' deltas,
+    stamped with their save time, and the same thread appends them.
+    ``on_written(items)`` is called on that thread with the ``(row_id,
+    record)`` pairs of every batch once it has been written.
+    """
+
+    def __init__(self, store, on_written=None, interval=None, batch_size=None, max_pending=None, history=None):
+        self.store = store
+        self.history = history
+        self.history_error = None
+        self.on_written = on_written
+        self.interval = AUTOSAVE_INTERVAL if interval is None else interval
+        self.batch_size = batch_size or AUTOSAVE_BATCH_SIZE
+        self.max_pending = max_pending or AUTOSAVE_MAX_PENDING
+        self.last_error = None
+        self.last_saved_at = None
+        self._pending = OrderedDict()
+        self._in_flight = 0
+        # (save time, (row_id, old_record, new_record)) waiting for the history
+        self._history = []
+        self._history_in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="review-autosave", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    @property
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def pending_items(self):
+        """Snapshot of ``(row_id, record)`` pairs not yet written."""
+        with self._cond:
+            return [(row_id, record) for (row_id, _), record in self._pending.items()]
+
+    def submit(self, row_id, record):
+        with self._cond:
+            self._add(row_id, record)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def submit_many(self, items):
+        """Queue several reviews at once and write them now, together in one ``save_many()``."""
+        with self._cond:
+            for row_id, record in items:
+                self._add(row_id, record)
+            self._cond.notify_all()
+
+    def submit_history(self, changes):
+        """Queue ``(row_id, old_record, new_record)`` changes for ``history.record()``."""
+        if self.history is None:
+            return
+        ts = time.time()
+        with self._cond:
+            self._history.extend((ts, change) for change in changes)
+
+    def _add(self, row_id, record):
+        # Called with the lock held
+        key = review_key(row_id, record)
+        if key in self._pending:
+            self._pending[key] = merge_record(self._pending[key], record)
+            # Keep the write order equal to the order of the latest saves
+            self._pending.move_to_end(key)
+            return
+        while len(self._pending) >= self.max_pending:
+            self._cond.notify_all()
+            self._cond.wait()
+        self._pending[key] = record
+
+    def flush(self, timeout=30):
+        """Write everything pending now; return True if the queue drained in time."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._in_flight or self._history or self._history_in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.interval)
+                if not self._pending and not self._history:
+                    continue
+                items = list(self._pending.items())
+                self._pending.clear()
+                self._in_flight = len(items)
+                history, self._history = self._history, []
+                self._history_in_flight = len(history)
+                self._cond.notify_all()
+            if items:
+                self._write(items)
+            if history:
+                self._write_history(history)
+            if self.last_error is not None or self.history_error is not None:
+                time.sleep(self.interval)
+
+    def _write(self, items):
+        try:
+            self.store.save_many([(row_id, record) for (row_id, _), record in items])
+        except Exception as e:
+            self.last_error = e
+            with self._cond:
+                # Newer edits submitted meanwhile win over the failed batch
+                for key, record in items:
+                    newer = self._pending.get(key)
+                    self._pending[key] = merge_record(record, newer) if newer else record
+        else:
+            self.last_error = None
+            self.last_saved_at = time.time()
+            if self.on_written is not None:
+                self.on_written([(row_id, record) for (row_id, _), record in items])
+        finally:
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write_history(self, history):
+        # The reviews themselves are saved regardless; failed deltas are retried
+        try:
+            self.history.record([change for _, change in history], [ts for ts, _ in history])
+        except Exception as e:
+            self.history_error = e
+            with self._cond:
+                self._history[:0] = history
+        else:
+            self.history_error = None
+        finally:
+            with self._cond:
+                self._history_in_flight = 0
+                self._cond.notify_all()
+
+
+# -------------------------
+# Shared in-memory review state
+# -------------------------
+def _file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class ReviewState:
+    """Process-wide view of the saved reviews, shared by all sessions.
+
+    Holds every review as ``records`` (``{(row_id, reviewer): record}``),
+    the per-question view ``reviews`` (``{row_id: record}``, one whole
+    review per question, see ``row_reviews``) with a frame of its review
+    columns (one row per input row), and the (question x reviewer)
+    ``ratings`` matrix used for agreement, all in memory.  Statistics,
+    ``type_counts`` and the reviewer-type exports are kept per review, so
+    every reviewer's work counts whichever review a question shows.  The
+    frame uses the compact layout (see ``review_frame``); its text columns
+    trail the saves by up to ``TEXT_FOLD_ROWS`` rows, so read them through
+    ``snapshot_frame()``.  Saves update both in place and are
+    handed to an ``AutosaveWriter``, so callers never wait on storage; the
+    full CSV is rewritten by the store's background compaction.
+    ``refresh()`` only reloads from disk when the store's files were
+    changed by someone else (another process, a manual edit).  Reviews are
+    matched to rows by content key (``row_keys``), so an edited input file
+    keeps them on their questions; ``sync`` describes the last re-sync.
+    With a ``history`` (see review_history), every save is also appended
+    to it as a delta of the reviewer's previous review, by the writer's
+    thread.
+    """
+
+    def __init__(self, store, df, row_keys=None, history=None):
+        self.store = store
+        self.history = history
+        self._seed_error = None
+        self.df = df
+        self.row_keys = row_keys if row_keys is not None else RowKeys.from_frame(df)
+        self.version = 0
+        self._lock = threading.RLock()
+        self._compact_scheduled = False
+        self.categories = category_values(df)
+        self._stats_cache = (None, None)
+        self._agreement_cache = (None, None)
+        self.listener_error = None
+        self._listeners = []
+        self._write_listeners = []
+        self.writer = AutosaveWriter(store, on_written=self._after_write, history=history)
+        self._reload()
+        if history is not None:
+            try:
+                history.seed(self.records)
+            except Exception as e:
+                # Reported (``history_error``) but never fails the state
+                self._seed_error = e
+        if self.sync['adopted']:
+            # Reviews saved before rows had keys: store the keys now, while
+            # their positions still match the input they were made on
+            self.store.adopt_keys([
+                (row_id, self.records[(row_id, reviewer)]) for row_id, reviewer, _ in self.sync['adopted']
+            ])
+            self._signature = _file_signature(self._watched_files())
+
+    def _watched_files(self):
+        paths = [self.store.output_path]
+        for attr in ('journal_path', 'reviewers_path', 'db_path'):
+            path = getattr(self.store, attr, None)
+            if path:
+                paths.append(path)
+                if attr == 'db_path':
+                    paths.append(f"{path}-wal")
+        return paths
+
+    def _reload(self):
+        self.records, self.sync = resync_records(self.store.load(), self.row_keys)
+        # Edits still queued in the writer are newer than anything on disk
+        for row_id, record in self.writer.pending_items():
+            put_record(self.records, row_id, record)
+            self.sync['edited'].discard(review_key(row_id, record))
+        self.reviews = row_reviews(self.records)
+        self.ratings = RatingMatrix.from_records(len(self.df), self.records)
+        self.frame = review_frame(len(self.df), self.reviews)
+        self._text_updates = {}
+        # Reviewed bitmap: a row counts as reviewed once it has a rating or a remark
+        self.reviewed = (
+            self.frame['Rating'].ne("") | self.frame['Remarks'].ne("")
+        ).to_numpy(dtype=bool, copy=True)
+        self.reviewed_count = int(self.reviewed.sum())
+        self._first_pending = 0
+        self.stats = ReviewStatistics.from_records(len(self.df), self.records, self.categories)
+        self.type_counts = reviewer_type_counts(len(self.df), self.records)
+        self._signature = _file_signature(self._watched_files())
+        self.version += 1
+
+    def refresh(self):
+        """Reload if the store's files changed outside this process; return True if reloaded."""
+        with self._lock:
+            if self._compact_scheduled or _file_signature(self._watched_files()) == self._signature:
+                # Our own compaction may be rewriting the files right now
+                return False
+            self._reload()
+            return True
+
+    def save(self, row_id, record):
+        """Update the in-memory state in place and queue the review for writing."""
+        record = {**record, 'Row_Key': self.row_keys[row_id]}
+        with self._lock:
+            previous, mine, shown = self._apply(row_id, record)
+            self._set_frame_rows([(row_id, shown)])
+        # Queued before the listeners run, so a failing listener never loses the review
+        self.writer.submit(row_id, record)
+        self.writer.submit_history([(row_id, previous, mine)])
+        for listener in self._listeners:
+            listener(row_id, mine)
+        return mine
+
+    def save_many(self, items):
+        """Save several ``(row_id, record)`` reviews as one batch; they reach the store in one write."""
+        items = [(row_id, {**record, 'Row_Key': self.row_keys[row_id]}) for row_id, record in items]
+        saved, shown, changes = [], {}, []
+        with self._lock:
+            for row_id, record in items:
+                previous, mine, shown[row_id] = self._apply(row_id, record)
+                saved.append((row_id, mine))
+                changes.append((row_id, previous, mine))
+            # The page's shown review per question, written in one assignment per column
+            self._set_frame_rows(list(shown.items()))
+        self.writer.submit_many(items)
+        self.writer.submit_history(changes)
+        for row_id, mine in saved:
+            for listener in self._listeners:
+                listener(row_id, mine)
+        return [mine for _, mine in saved]
+
+    def _set_frame_rows(self, saved):
+        saved = [(row_id, merged) for row_id, merged in saved if 0 <= row_id < len(self.frame)]
+        if not saved:
+            return
+        set_review_rows(self.frame, [row_id for row_id, _ in saved], [merged for _, merged in saved],
+                        [col for col in REVIEW_COLUMNS if col not in TEXT_COLUMNS])
+        self._text_updates.update(saved)
+        if len(self._text_updates) >= TEXT_FOLD_ROWS:
+            self._fold_text()
+
+    def _fold_text(self):
+        # Called with the lock held
+        if self._text_updates:
+            set_review_rows(self.frame, list(self._text_updates), list(self._text_updates.values()), TEXT_COLUMNS)
+            self._text_updates = {}
+
+    @property
+    def history_error(self):
+        """The last error seeding or appending to the history (None if it is healthy)."""
+        return self.writer.history_error or self._seed_error
+
+    def _apply(self, row_id, record):
+        """Apply one save; return the reviewer's previous and new review and the review the question shows."""
+        # Called with the lock held
+        previous = self.records.get(review_key(row_id, record))
+        mine = put_record(self.records, row_id, record)
+        self.sync['edited'].discard(review_key(row_id, record))
+        self.ratings.set(row_id, record.get('Reviewer', ""), mine['Rating_Value'])
+        # The question shows one whole review (the rule ``row_reviews`` applies on reload)
+        old_shown = self.reviews.get(row_id)
+        shown = shown_review(old_shown, mine)
+        if 0 <= row_id < len(self.frame):
+            category = self.categories[row_id] if self.categories is not None else None
+            self.stats.replace(previous, mine, row_id, category)
+            self._count_type(previous, row_id, -1)
+            self._count_type(mine, row_id, +1)
+            if shown is old_shown and shown.get('Reviewer') == mine.get('Reviewer') and not has_review(mine):
+                # The reviewer cleared the review the question showed
+                shown = self._shown_after_clear(row_id, mine)
+            reviewed = has_review(shown)
+            if reviewed != self.reviewed[row_id]:
+                self.reviewed[row_id] = reviewed
+                self.reviewed_count += 1 if reviewed else -1
+                if not reviewed:
+                    self._first_pending = min(self._first_pending, row_id)
+        self.reviews[row_id] = shown
+        self.version += 1
+        return previous, mine, shown
+
+    def _shown_after_clear(self, row_id, mine):
+        # Called with the lock held; the per-type counts already include the clear
+        if not any(counts[row_id] for counts in self.type_counts.values()):
+            return mine
+        # Another reviewer's review takes its place: rare, so found by a scan
+        return row_reviews({key: record for key, record in self.records.items() if key[0] == row_id})[row_id]
+
+    def _count_type(self, record, row_id, sign):
+        # Called with the lock held
+        if has_review(record):
+            rtype = record.get('Reviewer_Type', "") or ""
+            if rtype not in self.type_counts:
+                self.type_counts[rtype] = np.zeros(len(self.frame), dtype=np.int16)
+            self.type_counts[rtype][row_id] += sign
+
+    def record(self, row_id, reviewer):
+        """Return ``reviewer``'s own review of ``row_id`` (None if they have not reviewed it)."""
+        return self.records.get((row_id, reviewer))
+
+    def is_edited(self, row_id, reviewer):
+        """True if ``row_id`` was edited in the input after ``reviewer`` reviewed it."""
+        return (row_id, reviewer) in self.sync['edited']
+
+    def add_listener(self, listener):
+        """Call ``listener(row_id, record)`` with the reviewer's own review after every save."""
+        self._listeners.append(listener)
+
+    def add_write_listener(self, listener):
+        """Call ``listener([(row_id, record), ...])`` on the writer's thread after each batch reaches the store.
+
+        Errors are kept in ``listener_error`` and never stop the writer.
+        """
+        self._write_listeners.append(listener)
+
+    def flush(self, timeout=30):
+        """Block until every queued review has been written."""
+        return self.writer.flush(timeout)
+
+    def _after_write(self, written):
+        error = None
+        for listener in self._write_listeners:
+            try:
+                listener(written)
+            except Exception as e:
+                error = e
+        self.listener_error = error
+        # Our own writes change the watched files; record the new signature
+        # so they are not mistaken for an external change.
+        with self._lock:
+            self._signature = _file_signature(self._watched_files())
+            if not self.store.needs_compaction() or self._compact_scheduled:
+                return
+            self._compact_scheduled = True
+        threading.Thread(target=self._compact, daemon=True).start()
+
+    def statistics(self):
+        """Return the statistics summary, recomputed at most once per state version."""
+        with self._lock:
+            version, summary = self._stats_cache
+            if version != self.version:
+                labels = {value: label for label, value in RATING_OPTIONS.items()}
+                summary = self.stats.summary(len(self.frame), labels)
+                self._stats_cache = (self.version, summary)
+            return summary
+
+    def agreement(self):
+        """Return the inter-annotator agreement report, recomputed at most once per state version."""
+        with self._lock:
+            version, report = self._agreement_cache
+            if version == self.version:
+                return report
+            # Only the multiply-rated questions are measured, so only they are copied
+            version, ratings = self.version, self.ratings.copy(self.ratings.multi_rated())
+        # Computed outside the lock so saves are not held up
+        report = agreement_report(ratings)
+        with self._lock:
+            self._agreement_cache = (version, report)
+        return report
+
+    def snapshot_frame(self, reviewer_type=None):
+        """Return a copy of the review columns, safe to read while saves continue.
+
+        With ``reviewer_type``, every question holds its review by a reviewer
+        of that type instead (chosen like ``row_reviews``; empty if none).
+        """
+        with self._lock:
+            if reviewer_type:
+                records = {key: record for key, record in self.records.items()
+                           if record.get('Reviewer_Type') == reviewer_type}
+            else:
+                self._fold_text()
+                return self.frame.copy()
+        return review_frame(len(self.frame), row_reviews(records))
+
+    def is_reviewed(self, row_id):
+        return 0 <= row_id < len(self.reviewed) and bool(self.reviewed[row_id])
+
+    def next_pending(self, start=0):
+        """Return the first unreviewed row at or after ``start`` (None if there is none)."""
+        if start <= self._first_pending:
+            # Rows before the cursor are all reviewed; it only moves back when
+            # a review is cleared, so this is amortized O(1).
+            while self._first_pending < len(self.reviewed) and self.reviewed[self._first_pending]:
+                self._first_pending += 1
+            start = self._first_pending
+        if start >= len(self.reviewed):
+            return None
+        offset = int(np.argmin(self.reviewed[start:]))
+        if self.reviewed[start + offset]:
+            return None
+        return start + offset
+
+    def _compact(self):
+        # The store rewrites its files from disk without the state lock, so
+        # saves and reruns carry on meanwhile (``refresh()`` ignores the
+        # files changing under it); the rewritten files' signature is then
+        # recorded so they are not mistaken for an external change.
+        try:
+            self.store.compact(self.df, self.row_keys)
+            with self._lock:
+                self._signature = _file_signature(self._watched_files())
+        finally:
+            self._compact_scheduled = False
@@ -0,0 +1,160 @@
+# row_identity.py
+"""Stable, content-based identity for the rows of the input dataset.
+
+A row's key is the 64-bit blake2b hash of its Question followed by the
+64-bit hash of its Answer + Gold Answer, written as 32 hex characters.
+Reviews store the key of the row they were made on, so when the input
+file is reordered, extended or trimmed they follow their question instead
+of its old position.  The keys are computed once per input version and
+kept next to the input as ``<input>.rowkeys.npz`` (same size/mtime rule
+as the CSV row index); the key -> position lookups are pandas hash
+indexes, so re-attaching a million reviews takes a second or two.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset_loader import file_signature, iter_column_chunks
+
+KEY_COLUMNS = ['Question', 'Answer', 'Gold Answer']
+# Rows hashed per step
+KEY_BATCH_SIZE = 50_000
+# Hex characters per key half (question | answer + gold)
+_HALF = 16
+# Odd 64-bit constant mixing the two halves into one lookup value
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _hash64(texts):
+    digests = b"".join(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest() for text in texts)
+    return np.frombuffer(digests, dtype='>u8').astype(np.uint64)
+
+
+def hash_rows(df):
+    """Return the (question, answer + gold) hash halves of every row as two uint64 arrays."""
+    questions, answers = [], []
+    for chunk in iter_column_chunks(df, KEY_COLUMNS, KEY_BATCH_SIZE):
+        questions.append(_hash64(chunk['Question'].tolist()))
+        answers.append(_hash64((chunk['Answer'] + "\x1f" + chunk['Gold Answer']).tolist()))
+    if not questions:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+    return np.concatenate(questions), np.concatenate(answers)
+
+
+def _split(keys):
+    """Parse hex keys back into their (question, answer + gold) hash halves."""
+    keys = list(keys)
+    return (
+        np.array([int(key[:_HALF], 16) for key in keys], dtype=np.uint64),
+        np.array([int(key[_HALF:], 16) for key in keys], dtype=np.uint64),
+    )
+
+
+def _combine(question_hashes, answer_hashes):
+    return question_hashes ^ (answer_hashes * _MIX)
+
+
+def _unique_lookup(values):
+    """Index of the values that occur exactly once, and their positions."""
+    index = pd.Index(values)
+    single = ~index.duplicated(keep=False)
+    return index[single], np.flatnonzero(single)
+
+
+class RowKeys:
+    """Content keys of the current input rows with key -> position lookups.
+
+    ``positions()`` finds rows by their full key (the first of identical
+    rows wins).  ``edited_positions()`` finds the row a key most likely
+    became after an edit: the only row with the same question, or else the
+    only row with the same answer and gold answer.
+    """
+
+    def __init__(self, question_hashes, answer_hashes):
+        self.question_hashes = np.asarray(question_hashes, dtype=np.uint64)
+        self.answer_hashes = np.asarray(answer_hashes, dtype=np.uint64)
+        halves = np.empty((len(self.question_hashes), 2), dtype='>u8')
+        halves[:, 0] = self.question_hashes
+        halves[:, 1] = self.answer_hashes
+        text = halves.tobytes().hex()
+        self.keys = np.array([text[i:i + 2 * _HALF] for i in range(0, len(text), 2 * _HALF)], dtype=object)
+        self._exact = None
+        self._halves = None
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(*hash_rows(df))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, row_id):
+        return self.keys[row_id]
+
+    def positions(self, keys):
+        """Positions of ``keys`` in the current input (-1 where a key is gone)."""
+        return self.hash_positions(*_split(keys))
+
+    def hash_positions(self, questions, answers):
+        """Positions of the rows with these (question, answer + gold) hash halves (-1 where absent)."""
+        if self._exact is None:
+            # Look up one mixed 64-bit value per row (much faster to index
+            # than the hex strings); hits are checked against both halves
+            index = pd.Index(_combine(self.question_hashes, self.answer_hashes))
+            first = ~index.duplicated(keep='first')
+            self._exact = (index[first], np.flatnonzero(first))
+        questions = np.asarray(questions, dtype=np.uint64)
+        answers = np.asarray(answers, dtype=np.uint64)
+        positions = _lookup(self._exact, _combine(questions, answers))
+        hit = positions >= 0
+        hit[hit] = (self.question_hashes[positions[hit]] == questions[hit]) \
+            & (self.answer_hashes[positions[hit]] == answers[hit])
+        positions[~hit] = -1
+        return positions
+
+    def edited_positions(self, keys):
+        """Positions of the rows that ``keys`` (no longer present) were most likely edited into."""
+        if self._halves is None:
+            self._halves = (_unique_lookup(self.question_hashes), _unique_lookup(self.answer_hashes))
+        questions, answers = _split(keys)
+        positions = _lookup(self._halves[0], questions)
+        missing = positions < 0
+        positions[missing] = _lookup(self._halves[1], answers[missing])
+        return positions
+
+
+def _lookup(table, values):
+    index, positions = table
+    found = index.get_indexer(pd.Index(values, dtype=np.uint64))
+    return np.where(found >= 0, positions[found], -1)
+
+
+def _keys_path(path):
+    return f"{path}.rowkeys.npz"
+
+
+def load_row_keys(path, df, variant=""):
+    """Return the ``RowKeys`` of ``df`` (loaded from ``path``), reusing the persisted hashes when the file is unchanged."""
+    size, mtime_ns = file_signature(path)
+    keys_path = _keys_path(f"{path}{variant}")
+    if os.path.exists(keys_path):
+        try:
+            with np.load(keys_path) as saved:
+                if int(saved['size']) == size and int(saved['mtime_ns']) == mtime_ns \
+                        and len(saved['question']) == len(df):
+                    return RowKeys(saved['question'], saved['answer'])
+        except Exception:
+            pass
+
+    question, answer = hash_rows(df)
+    tmp_path = f"{keys_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as fh:
+            np.savez(fh, question=question, answer=answer, size=size, mtime_ns=mtime_ns)
+        os.replace(tmp_path, keys_path)
+    except OSError:
+        # Read-only data directory: keep the keys in memory only
+        pass
+    return RowKeys(question, answer)
@@ -0,0 +1,342 @@
+# search_index.py
+"""Full-text search over the Question / Answer / Gold Answer columns.
+
+An inverted index is built once per input version and stored next to the
+input as ``<input>.search.<hash>/`` (plain ``.npy`` arrays, memory-mapped
+on load) with a ``<input>.search.json`` pointer, following the same
+size/mtime/content-hash rules as the Parquet cache.  Posting lists are
+sorted by term, and terms are sorted alphabetically so the last query word
+can be expanded as a prefix with a binary search.  The length-normalised
+BM25 weight of every posting is computed at build time, so a query only
+scales each posting list by its word's IDF and sums them per row with
+``np.bincount``; even a word that appears in every row of a million-row
+dataset ranks in tens of milliseconds.
+"""
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from answer_scoring import normalize_text
+from dataset_loader import content_hash, file_signature, iter_column_chunks
+
+SEARCH_COLUMNS = ['Question', 'Answer', 'Gold Answer']
+# Results shown per query
+SEARCH_LIMIT = 20
+# Rows tokenized per step while building
+INDEX_BATCH_SIZE = 50_000
+# The last query word also matches the most common words starting with it,
+# up to this many words and this many postings in total
+PREFIX_EXPANSIONS = 50
+PREFIX_POSTINGS_BUDGET = 1_000_000
+# Words found in more than this fraction of rows are treated like stopwords
+# (their BM25 IDF is close to zero): skipped when the query has rarer words,
+# and only the rarest of them is used when it does not
+COMMON_WORD_FRACTION = 0.5
+# Look candidates up in a posting list by binary search once they are this
+# many times fewer than its postings; otherwise sum the whole list
+SPARSE_LOOKUP_RATIO = 32
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_ARRAYS = ('offsets', 'docs', 'weight', 'doc_len')
+
+
+def _meta_path(path):
+    return f"{path}.search.json"
+
+
+def _read_meta(path):
+    try:
+        with open(_meta_path(path), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(path, meta):
+    meta_path = _meta_path(path)
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_path, meta_path)
+
+
+def _iter_text_chunks(df):
+    """Yield the dataset's search text, one list of row strings per chunk."""
+    for texts in iter_column_chunks(df, SEARCH_COLUMNS, INDEX_BATCH_SIZE):
+        yield (texts['Question'] + " " + texts['Answer'] + " " + texts['Gold Answer']).tolist()
+
+
+def build_postings(chunks):
+    """Tokenize text chunks into sorted posting arrays.
+
+    Returns ``(vocab, offsets, docs, weight, doc_len)``: the alphabetically
+    sorted vocabulary, the start of each term's postings, the row id and
+    BM25 term weight (without IDF) of every posting, and the token count
+    of every row.
+    """
+    term_ids = {}
+    terms, docs, tfs, lengths = [], [], [], []
+    start = 0
+    for texts in chunks:
+        tokens = [normalize_text(text).split() for text in texts]
+        counts = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+        flat = [token for row in tokens for token in row]
+        local, uniques = pd.factorize(pd.Series(flat, dtype=object))
+        mapping = np.fromiter(
+            (term_ids.setdefault(token, len(term_ids)) for token in uniques), dtype=np.int64, count=len(uniques)
+        )
+        row_ids = np.repeat(np.arange(start, start + len(texts), dtype=np.int64), counts)
+        # One posting per (term, row), with its count
+        keys, tf = np.unique((mapping[local] << 32) | row_ids, return_counts=True)
+        terms.append(keys >> 32)
+        docs.append((keys & 0xFFFFFFFF).astype(np.int32))
+        tfs.append(tf.astype(np.float32))
+        lengths.append(counts.astype(np.int32))
+        start += len(texts)
+
+    vocab = np.array(list(term_ids), dtype=object)
+    order = np.argsort(vocab, kind='stable')
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[order] = np.arange(len(vocab))
+    term = rank[np.concatenate(terms)] if terms else np.empty(0, dtype=np.int64)
+    by_term = np.argsort(term, kind='stable')
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term, minlength=len(vocab)), out=offsets[1:])
+    docs = np.concatenate(docs)[by_term] if docs else np.empty(0, dtype=np.int32)
+    tf = np.concatenate(tfs)[by_term] if tfs else np.empty(0, dtype=np.float32)
+    doc_len = np.concatenate(lengths) if lengths else np.empty(0, dtype=np.int32)
+    avg_len = max(float(doc_len.mean()), 1.0) if len(doc_len) else 1.0
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[docs].astype(np.float32) / avg_len)
+    weight = (tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32)
+    return vocab[order].tolist(), offsets, docs, weight, doc_len
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over one version of the input dataset.
+
+    ``build_in_background()`` builds a missing or stale index on a daemon
+    thread; ``ready`` turns True once a current index is loaded.
+    """
+
+    def __init__(self, input_path, variant=""):
+        self.input_path = input_path
+        self.cache_key = f"{input_path}{variant}"
+        self._build_lock = threading.Lock()
+        self._thread = None
+        self.last_error = None
+        self.ready = False
+        meta = self._current_meta()
+        if meta is not None:
+            self._load(meta['dir'])
+
+    def _current_meta(self):
+        """Return the index metadata if it matches the input file, else None."""
+        meta = _read_meta(self.cache_key)
+        if not meta or not os.path.isdir(meta.get('dir', "")):
+            return None
+        size, mtime_ns = file_signature(self.input_path)
+        if meta['size'] == size and meta['mtime_ns'] == mtime_ns:
+            return meta
+        if meta['size'] == size and meta['hash'] == content_hash(self.input_path):
+            # Touched or copied, content unchanged: record the new mtime
+            meta['mtime_ns'] = mtime_ns
+            _write_meta(self.cache_key, meta)
+            return meta
+        return None
+
+    def _load(self, index_dir):
+        arrays = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode='r') for name in _ARRAYS}
+        with open(os.path.join(index_dir, "vocab.txt"), encoding='utf-8') as fh:
+            vocab = fh.read().split("\n") if os.path.getsize(fh.name) else []
+        self.vocab = vocab
+        self.offsets = arrays['offsets']
+        self.docs = arrays['docs']
+        self.weight = arrays['weight']
+        self.n_docs = len(arrays['doc_len'])
+        self.ready = True
+
+    def build(self, df):
+        """Index every row of ``df`` (the loaded input) unless a current index exists."""
+        with self._build_lock:
+            meta = self._current_meta()
+            if meta is None:
+                size, mtime_ns = file_signature(self.input_path)
+                digest = content_hash(self.input_path)
+                vocab, offsets, docs, weight, doc_len = build_postings(_iter_text_chunks(df))
+                index_dir = f"{self.cache_key}.search.{digest}"
+                tmp_dir = f"{index_dir}.{os.getpid()}.tmp"
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                os.makedirs(tmp_dir)
+                for name, array in zip(_ARRAYS, (offsets, docs, weight, doc_len)):
+                    np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+                with open(os.path.join(tmp_dir, "vocab.txt"), 'w', encoding='utf-8') as fh:
+                    fh.write("\n".join(vocab))
+                shutil.rmtree(index_dir, ignore_errors=True)
+                os.replace(tmp_dir, index_dir)
+                old = _read_meta(self.cache_key)
+                meta = {'size': size, 'mtime_ns': mtime_ns, 'hash': digest, 'dir': index_dir}
+                _write_meta(self.cache_key, meta)
+                if old and old.get('dir') not in (None, index_dir):
+                    shutil.rmtree(old['dir'], ignore_errors=True)
+            self._load(meta['dir'])
+
+    def build_in_background(self, df):
+        """Start ``build(df)`` on a daemon thread unless the index is loaded or already building."""
+        if self.ready or (self._thread is not None and self._thread.is_alive()):
+            return self._thread
+
+        def run():
+            try:
+                self.build(df)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+        self._thread = threading.Thread(target=run, name="search-index", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _spans(self, word, prefix):
+        """Return the posting ranges of ``word`` (and of the words it starts, if ``prefix``)."""
+        vocab = self._vocab_array
+        lo = int(np.searchsorted(vocab, word))
+        exact = lo < len(vocab) and vocab[lo] == word
+        if not prefix:
+            return [(int(self.offsets[lo]), int(self.offsets[lo + 1]))] if exact else []
+        hi = int(np.searchsorted(vocab, word + "\U0010ffff"))
+        ids = np.arange(lo + exact, hi)
+        sizes = self.offsets[ids + 1] - self.offsets[ids]
+        by_size = np.argsort(-sizes, kind='stable')[:PREFIX_EXPANSIONS]
+        spans = [(int(self.offsets[lo]), int(self.offsets[lo + 1]))] if exact else []
+        budget = PREFIX_POSTINGS_BUDGET - sum(end - start for start, end in spans)
+        for i in by_size:
+            if sizes[i] <= budget or not spans:
+                spans.append((int(self.offsets[ids[i]]), int(self.offsets[ids[i] + 1])))
+                budget -= sizes[i]
+        return spans
+
+    @property
+    def _vocab_array(self):
+        array = getattr(self, '_vocab_cache', None)
+        if array is None or len(array) != len(self.vocab):
+            array = self._vocab_cache = np.array(self.vocab, dtype=object)
+        return array
+
+    def _idf(self, size):
+        return np.float32(np.log1p((self.n_docs - size + 0.5) / (size + 0.5)))
+
+    def _postings(self, spans):
+        """Row ids and IDF-scaled weights of all postings in ``spans``."""
+        docs = np.concatenate([self.docs[start:end] for start, end in spans])
+        weights = np.concatenate([self.weight[start:end] * self._idf(end - start) for start, end in spans])
+        return docs, weights
+
+    def scores(self, query):
+        """Return ``(row_ids, scores)`` of the rows containing every query word.
+
+        Every word must match; the last one also matches as a prefix, so
+        results appear while the user is still typing it.  Words are
+        applied rarest first and the candidate rows are kept sparse, so
+        selective queries never touch arrays the size of the dataset.
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0)
+        words = normalize_text(query).split()
+        n_docs = self.n_docs if self.ready else 0
+        if not words or n_docs == 0:
+            return empty
+        groups = []
+        for position, word in enumerate(words):
+            spans = self._spans(word, prefix=position == len(words) - 1)
+            if not spans:
+                return empty
+            groups.append((sum(end - start for start, end in spans), spans))
+        groups.sort(key=lambda group: group[0])
+        groups = [group for group in groups if group[0] <= COMMON_WORD_FRACTION * n_docs] or groups[:1]
+
+        candidates = total = None
+        for size, spans in groups:
+            if candidates is not None and len(candidates) * SPARSE_LOOKUP_RATIO < size:
+                # Few candidates left: binary-search them in each (row-sorted) posting list
+                found = np.zeros(len(candidates), dtype=bool)
+                for start, end in spans:
+                    docs = self.docs[start:end]
+                    pos = np.minimum(np.searchsorted(docs, candidates), end - start - 1)
+                    hit = docs[pos] == candidates
+                    total[hit] += self.weight[start:end][pos[hit]] * self._idf(end - start)
+                    found |= hit
+            else:
+                docs, weights = self._postings(spans)
+                if candidates is None and size * 16 < n_docs:
+                    candidates, inverse = np.unique(docs, return_inverse=True)
+                    total = np.bincount(inverse, weights=weights)
+                    continue
+                dense = np.bincount(docs, weights=weights, minlength=n_docs)
+                present = np.zeros(n_docs, dtype=bool)
+                present[docs] = True
+                if candidates is None:
+                    candidates = np.flatnonzero(present)
+                    total = dense[candidates]
+                    continue
+                found = present[candidates]
+                total += dense[candidates]
+            candidates, total = candidates[found], total[found]
+            if len(candidates) == 0:
+                break
+        return candidates.astype(np.int64), total
+
+    def search(self, query, keep=None, limit=None):
+        """Return up to ``limit`` row ids matching ``query``, best match first.
+
+        ``keep(row_ids)`` returns a boolean mask of the rows to keep; it is
+        applied to growing slices of the best matches until enough pass.
+        """
+        limit = limit or SEARCH_LIMIT
+        row_ids, scores = self.scores(query)
+        results = []
+        done = 0
+        step = limit * 4
+        while len(results) < limit and done < len(row_ids):
+            # Best ``done + step`` matches, of which the first ``done`` were already checked
+            top = min(done + step, len(row_ids))
+            best = np.argpartition(-scores, top - 1)[:top] if top < len(row_ids) else np.arange(len(row_ids))
+            best = best[np.lexsort((row_ids[best], -scores[best]))][done:]
+            candidates = row_ids[best]
+            if keep is not None:
+                candidates = candidates[keep(candidates)]
+            results.extend(candidates[:limit - len(results)].tolist())
+            done = top
+            step *= 4
+        return results
+
+
+def review_filter(state, pending_only=False, max_rating=None, reviewer_type=None):
+    """Return a ``keep(row_ids)`` mask function over the review state (None when nothing is filtered).
+
+    ``max_rating`` keeps questions that any reviewer rated at most that
+    low, and ``reviewer_type`` questions reviewed by anyone of that type,
+    whichever review the question shows.  Only the candidate rows are
+    looked up, so the cost does not depend on the dataset size.
+    """
+    if not (pending_only or max_rating or reviewer_type):
+        return None
+
+    def keep(row_ids):
+        mask = np.ones(len(row_ids), dtype=bool)
+        if pending_only:
+            mask &= ~state.reviewed[row_ids]
+        if max_rating:
+            # (question x reviewer) ratings, NaN where a reviewer has not rated
+            with np.errstate(invalid='ignore'):
+                mask &= (state.ratings.dense(row_ids) <= max_rating).any(axis=1)
+        if reviewer_type:
+            counts = state.type_counts.get(reviewer_type)
+            mask &= counts[row_ids] > 0 if counts is not None else False
+        return mask
+
+    return keep
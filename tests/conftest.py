@@ -0,0 +1,23 @@
+# tests/conftest.py
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def qa_frame():
+    """A small input dataset with distinct questions and answers."""
+    return pd.DataFrame({
+        'Question': [f"Question number {i} about income tax?" for i in range(6)],
+        'Answer': [f"Model answer {i}" for i in range(6)],
+        'Gold Answer': [f"Gold answer {i}" for i in range(6)],
+    })
+
+
+@pytest.fixture
+def output_path(tmp_path):
+    return str(tmp_path / "reviews.csv")
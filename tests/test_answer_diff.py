@@ -0,0 +1,51 @@
+# tests/test_answer_diff.py
+import threading
+
+import answer_diff
+from answer_diff import PLAIN_DIFF, AnswerDiffCache, diff_html
+
+
+def test_changed_words_are_marked():
+    model, gold, level = diff_html("the tax is due in June", "the tax is due in July")
+    assert level == "words"
+    assert model.endswith('<span class="diff-del"> June</span>')
+    assert gold.endswith('<span class="diff-ins"> July</span>')
+
+
+def test_pending_diff_is_cached_once_done(monkeypatch):
+    release = threading.Event()
+    slow = answer_diff.diff_html
+
+    def blocked(answer, gold):
+        release.wait(5)
+        return slow(answer, gold)
+
+    monkeypatch.setattr(answer_diff, 'diff_html', blocked)
+    cache = AnswerDiffCache()
+    assert cache.get("a b", "a c", timeout=0.01) is None
+    # Polling does not start the diff again
+    assert cache.get("a b", "a c", timeout=0) is None and len(cache._pending) == 1
+    release.set()
+    assert cache.get("a b", "a c", timeout=5) is not None
+    assert cache.get("a b", "a c", timeout=0) is not None
+    assert cache.stats()['items'] == 1
+
+
+def test_oversized_diff_is_cached_as_plain_answers():
+    cache = AnswerDiffCache(max_chars=20)
+    answer, gold = "the tax is due in June", "the tax is due in July"
+    cache.prefetch([(answer, gold)])
+    cache._workers.shutdown(wait=True)
+    # A poll finds it computed instead of missing (and recomputing) forever
+    assert cache.get(answer, gold, timeout=0) is PLAIN_DIFF
+    assert cache.stats() == {'items': 1, 'chars': 0, 'hits': 1, 'misses': 0}
+    assert not cache._pending
+
+
+def test_prefetch_and_clear():
+    cache = AnswerDiffCache()
+    cache.prefetch([("one two", "one three"), ("four", "five")])
+    cache._workers.shutdown(wait=True)
+    assert cache.stats()['items'] == 2
+    cache.clear()
+    assert cache.stats() == {'items': 0, 'chars': 0, 'hits': 0, 'misses': 0}
@@ -0,0 +1,50 @@
+# tests/test_answer_scoring.py
+import random
+
+import pandas as pd
+
+import answer_scoring
+from answer_scoring import lcs_length, score_dataset, score_pair
+
+
+def reference_lcs(a, b):
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            table[i + 1][j + 1] = table[i][j] + 1 if x == y else max(table[i][j + 1], table[i + 1][j])
+    return table[-1][-1]
+
+
+def test_bit_parallel_lcs_matches_the_dynamic_programme():
+    rng = random.Random(3)
+    for _ in range(200):
+        a = [rng.choice("abcde") for _ in range(rng.randrange(0, 40))]
+        b = [rng.choice("abcde") for _ in range(rng.randrange(0, 40))]
+        assert lcs_length(a, b) == reference_lcs(a, b)
+
+
+def test_score_pair():
+    assert score_pair("The tax is 5%.", "the tax is 5") == (1.0, 1.0, 1.0, 1.0)
+    exact, f1, rouge, chars = score_pair("tax is due in june", "tax due in july")
+    assert exact == 0.0
+    assert round(f1, 4) == round(2 * (3 / 5) * (3 / 4) / (3 / 5 + 3 / 4), 4)
+    assert rouge == f1
+    assert 0 < chars < 1
+    assert score_pair("", "anything")[:3] == (0.0, 0.0, 0.0)
+
+
+def test_scores_are_cached_per_answer_pair(qa_frame, tmp_path, monkeypatch):
+    path = str(tmp_path / "in.csv.scores.pkl")
+    first = score_dataset(qa_frame, path, workers=1)
+    assert list(first.index) == list(range(len(qa_frame)))
+
+    # Only the edited pair is scored again
+    scored = []
+    chunk = answer_scoring._score_chunk
+    monkeypatch.setattr(answer_scoring, '_score_chunk', lambda pairs: scored.extend(pairs) or chunk(pairs))
+    edited = qa_frame.copy()
+    edited.loc[2, 'Answer'] = "Gold answer 2"
+    second = score_dataset(edited, path, workers=1)
+    assert scored == [("Gold answer 2", "Gold answer 2")]
+    assert second.loc[2, 'exact_match'] == 1.0
+    pd.testing.assert_frame_equal(second.drop(index=2), first.drop(index=2))
@@ -0,0 +1,228 @@
+# tests/test_dataset_loader.py
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_loader
+from dataset_loader import LazyCSVDataset, build_row_offsets, load_row_offsets
+
+HEADER = b"Question,Answer,Gold Answer\n"
+
+
+def records(buf):
+    """The records of ``buf`` as split by ``build_row_offsets``."""
+    offsets = build_row_offsets(buf)
+    return [buf[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+# -------------------------
+# Byte-offset row index
+# -------------------------
+def test_newlines_inside_quotes_do_not_end_a_record():
+    buf = HEADER + b'"What is\nincome?","It is ""money""\nearned",gold\nq2,a2,g2\n'
+    assert records(buf) == [HEADER, b'"What is\nincome?","It is ""money""\nearned",gold\n', b"q2,a2,g2\n"]
+
+
+def test_quote_parity_carries_across_index_chunks(monkeypatch):
+    monkeypatch.setattr(dataset_loader, 'INDEX_CHUNK_SIZE', 7)
+    buf = HEADER + b'"a long\nquoted\nfield",x,y\nq2,a2,g2\n'
+    assert records(buf) == [HEADER, b'"a long\nquoted\nfield",x,y\n', b"q2,a2,g2\n"]
+
+
+def test_crlf_blank_lines_and_missing_final_newline(tmp_path):
+    buf = b"Question,Answer,Gold Answer\r\nq1,a1,g1\r\n\r\n\nq2,a2,g2"
+    # Blank lines are not records; the last record needs no line ending
+    assert records(buf) == [b"Question,Answer,Gold Answer\r\n", b"q1,a1,g1\r\n\r\n\n", b"q2,a2,g2"]
+    path = tmp_path / "input.csv"
+    path.write_bytes(buf)
+    lazy = LazyCSVDataset(str(path))
+    assert [lazy.iloc[i].tolist() for i in range(len(lazy))] == [["q1", "a1", "g1"], ["q2", "a2", "g2"]]
+
+
+def test_row_index_is_persisted_until_the_file_changes(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_bytes(HEADER + b"q1,a1,g1\n")
+    assert load_row_offsets(str(path)).tolist() == [0, len(HEADER), len(HEADER) + 9]
+    assert os.path.exists(f"{path}.rowindex.npz")
+
+    path.write_bytes(HEADER + b"q1,a1,g1\nq2,a2,g2\n")
+    assert len(load_row_offsets(str(path))) == 4
+
+
+# -------------------------
+# Lazy, row-addressable CSV dataset
+# -------------------------
+@pytest.fixture
+def lazy_csv(tmp_path, qa_frame):
+    frame = qa_frame.copy()
+    frame.loc[1, 'Answer'] = 'A "quoted" answer,\nover two lines'
+    frame.loc[3, 'Gold Answer'] = ""
+    path = str(tmp_path / "input.csv")
+    frame.to_csv(path, index=False)
+    return path
+
+
+def test_lazy_rows_match_read_csv(lazy_csv):
+    expected = pd.read_csv(lazy_csv, dtype=str, keep_default_na=False)
+    lazy = LazyCSVDataset(lazy_csv)
+    assert len(lazy) == len(expected)
+    assert lazy.columns == list(expected.columns)
+    for position in range(len(expected)):
+        assert lazy.iloc[position].tolist() == expected.iloc[position].tolist()
+    assert lazy.iloc[-1].tolist() == expected.iloc[-1].tolist()
+    with pytest.raises(IndexError):
+        lazy.iloc[len(expected)]
+
+
+def test_lazy_take_matches_read_csv(lazy_csv):
+    expected = pd.read_csv(lazy_csv, dtype=str, keep_default_na=False)
+    positions = np.array([4, 1, 3])
+    taken = LazyCSVDataset(lazy_csv).take(positions)
+    pd.testing.assert_frame_equal(taken, expected.iloc[positions].reset_index(drop=True))
+
+
+# -------------------------
+# Columnar (Parquet) cache of the input
+# -------------------------
+@pytest.fixture
+def counted_parse(monkeypatch):
+    """Count the CSV parses behind ``load_csv_cached``."""
+    parses = []
+    parse = dataset_loader._parse_csv
+    monkeypatch.setattr(dataset_loader, '_parse_csv', lambda path: parses.append(path) or parse(path))
+    return parses
+
+
+def cache_meta(path):
+    return dataset_loader._read_cache_meta(path)
+
+
+def test_cache_hit_skips_the_parse(tmp_path, qa_frame, counted_parse):
+    path = str(tmp_path / "input.csv")
+    qa_frame.to_csv(path, index=False)
+    first = dataset_loader.load_csv_cached(path)
+    second = dataset_loader.load_csv_cached(path)
+    assert len(counted_parse) == 1
+    pd.testing.assert_frame_equal(first, second)
+    assert second['Question'].tolist() == qa_frame['Question'].tolist()
+
+
+def test_touched_file_reuses_the_cache_by_content_hash(tmp_path, qa_frame, counted_parse):
+    path = str(tmp_path / "input.csv")
+    qa_frame.to_csv(path, index=False)
+    dataset_loader.load_csv_cached(path)
+    parquet = cache_meta(path)['parquet']
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    dataset_loader.load_csv_cached(path)
+    assert len(counted_parse) == 1
+    # The new mtime is recorded, so the next load skips the hash too
+    assert cache_meta(path)['mtime_ns'] == stat.st_mtime_ns + 10**9
+    assert cache_meta(path)['parquet'] == parquet
+
+
+def test_changed_content_rebuilds_the_cache(tmp_path, qa_frame, counted_parse):
+    path = str(tmp_path / "input.csv")
+    qa_frame.to_csv(path, index=False)
+    dataset_loader.load_csv_cached(path)
+    old_parquet = cache_meta(path)['parquet']
+    stat = os.stat(path)
+    # Same size, different mtime: the content hash decides
+    edited = qa_frame.copy()
+    edited.loc[0, 'Answer'] = "Model answer X"
+    edited.to_csv(path, index=False)
+    assert os.path.getsize(path) == stat.st_size
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    loaded = dataset_loader.load_csv_cached(path)
+    assert len(counted_parse) == 2
+    assert loaded.loc[0, 'Answer'] == "Model answer X"
+    assert not os.path.exists(old_parquet)
+
+
+def test_corrupt_cache_files_are_rebuilt(tmp_path, qa_frame, counted_parse):
+    path = str(tmp_path / "input.csv")
+    qa_frame.to_csv(path, index=False)
+    dataset_loader.load_csv_cached(path)
+    with open(cache_meta(path)['parquet'], 'wb') as fh:
+        fh.write(b"PAR1 truncated")
+    loaded = dataset_loader.load_csv_cached(path)
+    assert len(counted_parse) == 2
+    assert loaded['Question'].tolist() == qa_frame['Question'].tolist()
+    # The rebuilt cache is good again
+    dataset_loader.load_csv_cached(path)
+    assert len(counted_parse) == 2
+
+    with open(dataset_loader._cache_meta_path(path), 'w', encoding='utf-8') as fh:
+        fh.write('{"size": ')
+    assert dataset_loader.load_csv_cached(path)['Answer'].tolist() == qa_frame['Answer'].tolist()
+    assert len(counted_parse) == 3
+
+
+# -------------------------
+# Excel workbooks
+# -------------------------
+@pytest.fixture
+def workbook(tmp_path):
+    from openpyxl import Workbook
+
+    book = Workbook()
+    book.active.title = "Jan"
+    book["Jan"].append(["Question", "Answer", "Gold Answer", None])
+    book["Jan"].append(["Q1?", "A1", "G1", None])
+    book["Jan"].append([None, None, None, None])
+    book["Jan"].append(["Q2?", 42, None, "beyond the header"])
+    feb = book.create_sheet("Feb")
+    feb.append(["Question", "Answer", "Gold Answer"])
+    feb.append(["Q3?", "A3", "G3"])
+    book.create_sheet("Empty")
+    path = str(tmp_path / "input.xlsx")
+    book.save(path)
+    return path
+
+
+def test_parse_sheets():
+    assert dataset_loader.parse_sheets(None) is None
+    assert dataset_loader.parse_sheets(" ") is None
+    assert dataset_loader.parse_sheets("*") == dataset_loader.ALL_SHEETS
+    assert dataset_loader.parse_sheets("Feb, Jan ,,") == ("Feb", "Jan")
+
+
+def test_read_xlsx_reads_the_first_sheet_read_only(workbook, monkeypatch):
+    import openpyxl
+
+    modes = []
+    load_workbook = openpyxl.load_workbook
+
+    def spy(path, **kwargs):
+        modes.append(kwargs)
+        return load_workbook(path, **kwargs)
+
+    monkeypatch.setattr(openpyxl, 'load_workbook', spy)
+    frame = dataset_loader.read_xlsx(workbook)
+    assert modes == [{'read_only': True, 'data_only': True}]
+    # Blank rows are skipped, empty cells are "", values past the header are dropped
+    assert frame.columns.tolist() == ["Question", "Answer", "Gold Answer"]
+    assert frame.values.tolist() == [["Q1?", "A1", "G1"], ["Q2?", "42", ""]]
+
+
+def test_read_xlsx_concatenates_sheets_in_order(workbook):
+    frame = dataset_loader.read_xlsx(workbook, ("Feb", "Jan"))
+    assert frame['Question'].tolist() == ["Q3?", "Q1?", "Q2?"]
+    assert frame['Sheet'].tolist() == ["Feb", "Jan", "Jan"]
+    # Every sheet, the empty one contributing nothing
+    everything = dataset_loader.read_xlsx(workbook, dataset_loader.ALL_SHEETS)
+    assert everything['Sheet'].tolist() == ["Jan", "Jan", "Feb"]
+    with pytest.raises(ValueError, match="Sheet not found: Mar"):
+        dataset_loader.read_xlsx(workbook, ("Jan", "Mar"))
+
+
+def test_each_sheet_choice_has_its_own_cache(workbook):
+    first = dataset_loader.load_dataset_cached(workbook)
+    both = dataset_loader.load_dataset_cached(workbook, ("Jan", "Feb"))
+    assert len(first) == 2 and len(both) == 3
+    assert dataset_loader.load_dataset_cached(workbook)['Question'].tolist() == ["Q1?", "Q2?"]
+    assert cache_meta(workbook)['parquet'] != cache_meta(workbook + dataset_loader.sheets_variant(("Jan", "Feb")))['parquet']
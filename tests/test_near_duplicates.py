@@ -0,0 +1,43 @@
+# tests/test_near_duplicates.py
+import numpy as np
+
+from near_duplicates import NUM_PERM, SIMILARITY_THRESHOLD, NearDuplicateIndex, cluster_signatures
+
+
+def chained_index(tmp_path):
+    """Rows 0~1 and 1~2 agree on 24 of 32 values, so all three cluster; 0 and 2 on only 16."""
+    signatures = np.arange(3 * NUM_PERM, dtype=np.uint16).reshape(3, NUM_PERM)
+    signatures[1, :24] = signatures[0, :24]
+    signatures[2, 8:] = signatures[1, 8:]
+    has_text = np.ones(3, dtype=bool)
+    index = NearDuplicateIndex(str(tmp_path / "in.csv"))
+    index._set(signatures, has_text, cluster_signatures(signatures, has_text))
+    return index
+
+
+def test_chained_rows_are_not_near_duplicates(tmp_path):
+    index = chained_index(tmp_path)
+    assert index.cluster_size(0) == 3
+    assert index.similarity(0, [1, 2]).tolist() == [0.75, 0.5]
+    assert index.similar(0).tolist() == [1]
+    assert index.similar(2).tolist() == [1]
+    assert sorted(index.similar(1).tolist()) == [0, 2]
+
+
+def test_similar_rows_come_most_similar_first(tmp_path):
+    index = chained_index(tmp_path)
+    index.signatures[2] = index.signatures[1]
+    assert index.similar(1).tolist() == [2, 0]
+    assert all(index.similarity(1, index.similar(1)) >= SIMILARITY_THRESHOLD)
+
+
+def test_build_clusters_edited_copies(tmp_path, qa_frame):
+    from row_identity import RowKeys
+
+    frame = qa_frame.copy()
+    frame.loc[5, 'Question'] = frame.loc[0, 'Question'] + " please"
+    frame.loc[5, 'Answer'] = frame.loc[0, 'Answer']
+    index = NearDuplicateIndex(str(tmp_path / "in.csv"))
+    index.build(frame, RowKeys.from_frame(frame))
+    assert index.similar(0).tolist() == [5]
+    assert index.similar(3).tolist() == []
@@ -0,0 +1,41 @@
+# tests/test_perf_trace.py
+import sys
+
+import pytest
+
+from perf_trace import PerfTracer
+
+
+class StopScript(Exception):
+    """Stands in for the exceptions st.stop() and st.rerun() raise."""
+
+
+def test_run_ends_when_the_script_stops(tmp_path):
+    tracer = PerfTracer(True, str(tmp_path / "perf.log"), session_id=lambda: "s1")
+    tracer.request_profile()
+    with pytest.raises(StopScript):
+        with tracer.rerun():
+            with tracer.span("load_data"):
+                pass
+            raise StopScript()
+
+    assert tracer._local.rerun is None
+    # The profiler was stopped and its report kept
+    assert sys.getprofile() is None
+    assert tracer.profile() is not None
+    assert set(tracer.summary()['Stage']) == {"load_data", "rerun"}
+    with open(tmp_path / "perf.log", encoding='utf-8') as fh:
+        assert '"run": "rerun"' in fh.read()
+
+
+def test_fragment_runs_end_when_they_raise():
+    tracer = PerfTracer(True, session_id=lambda: "s1")
+
+    @tracer.traced("render_nav", rerun=True)
+    def fragment():
+        raise StopScript()
+
+    with pytest.raises(StopScript):
+        fragment()
+    assert tracer._local.rerun is None
+    assert set(tracer.summary()['Stage']) == {"render_nav", "render_nav (fragment)"}
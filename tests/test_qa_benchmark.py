@@ -0,0 +1,59 @@
+# tests/test_qa_benchmark.py
+import pandas as pd
+
+import qa_benchmark
+from qa_benchmark import compare, flatten, generate_dataset
+
+
+def results(**metrics):
+    return {'results': {"1000": metrics}}
+
+
+# -------------------------
+# Synthetic datasets
+# -------------------------
+def test_generated_dataset_is_sized_and_reproducible(tmp_path, monkeypatch):
+    # Written across several batches
+    monkeypatch.setattr(qa_benchmark, 'GENERATE_BATCH_SIZE', 40)
+    path = generate_dataset(str(tmp_path / "a.csv"), 100, answer_words=10, seed=3)
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    assert frame.columns.tolist() == ['Question', 'Answer', 'Gold Answer']
+    assert len(frame) == 100 and frame['Question'].is_unique
+    assert frame['Question'].str.startswith("Q1:").tolist()[:2] == [True, False]
+    lengths = frame['Answer'].str.split().str.len()
+    assert lengths.between(5, 15).all()
+
+    again = generate_dataset(str(tmp_path / "b.csv"), 100, answer_words=10, seed=3)
+    with open(path, 'rb') as a, open(again, 'rb') as b:
+        assert a.read() == b.read()
+    other = pd.read_csv(generate_dataset(str(tmp_path / "c.csv"), 100, answer_words=10, seed=4))
+    assert other['Answer'].tolist() != frame['Answer'].tolist()
+
+
+# -------------------------
+# Results and baseline comparison
+# -------------------------
+def test_flatten_names_every_measurement():
+    flat = flatten(results(cold_start_ms=1200, rerun={'p50_ms': 30, 'p95_ms': 45}, peak_rss_mb=300))
+    assert flat == {"1000/cold_start_ms": 1200.0, "1000/rerun/p50_ms": 30.0,
+                    "1000/rerun/p95_ms": 45.0, "1000/peak_rss_mb": 300.0}
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = results(cold_start_ms=1000, save={'p50_ms': 4, 'p95_ms': 10}, peak_rss_mb=300, export_ms=50)
+    current = results(cold_start_ms=1400, save={'p50_ms': 8, 'p95_ms': 40}, peak_rss_mb=315, export_ms=55,
+                      new_metric_ms=1)
+    report = compare(current, baseline, tolerance=0.25).set_index('Metric')
+    # Only metrics present in both documents are compared
+    assert "1000/new_metric_ms" not in report.index
+    assert round(report.loc["1000/cold_start_ms", 'Change'], 6) == 0.4
+    assert report['Regressed'].to_dict() == {
+        "1000/cold_start_ms": True,
+        # Twice as slow, but within the noise floor
+        "1000/save/p50_ms": False,
+        # Tail latencies are reported, never gated
+        "1000/save/p95_ms": False,
+        "1000/peak_rss_mb": False,
+        "1000/export_ms": False,
+    }
+    assert not compare(current, baseline, tolerance=0.5)['Regressed'].any()
@@ -0,0 +1,97 @@
+# tests/test_qa_review_app.py
+import json
+import os
+import time
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "qa_review_app.py")
+JOURNAL = "qa_dataset_with_remarks.journal.jsonl"
+
+
+@pytest.fixture
+def app(tmp_path, qa_frame, monkeypatch):
+    """The app on ``qa_frame``, run from ``tmp_path``, with Ann signed in."""
+    monkeypatch.chdir(tmp_path)
+    qa_frame.to_csv("input.csv", index=False)
+    monkeypatch.setenv("QA_INPUT_FILE", "input.csv")
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    at.text_input(key="reviewer_name_input").set_value("Ann")
+    at.selectbox(key="reviewer_type_input").set_value("Tax Payer")
+    at.run()
+    yield at
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def grid_edits(monkeypatch):
+    """``{(row, column): value}`` applied to what the grid's data editor returns."""
+    edits = {}
+    data_editor = st.data_editor
+
+    def edited(data, **kwargs):
+        frame = data_editor(data, **kwargs).copy()
+        for (row, col), value in edits.items():
+            frame.loc[row, col] = value
+        return frame
+
+    monkeypatch.setattr(st, 'data_editor', edited)
+    return edits
+
+
+def journal_entries(count, timeout=10):
+    """Wait for the autosave writer to append ``count`` journal lines; return them."""
+    deadline = time.monotonic() + timeout
+    while True:
+        entries = []
+        if os.path.exists(JOURNAL):
+            with open(JOURNAL, encoding='utf-8') as fh:
+                entries = [json.loads(line) for line in fh]
+        if len(entries) >= count or time.monotonic() > deadline:
+            return entries
+        time.sleep(0.05)
+
+
+def save_page(at):
+    at.button[[button.label for button in at.button].index("💾 Save page")].click().run()
+    assert not at.exception, at.exception
+
+
+# -------------------------
+# Grid layout
+# -------------------------
+def test_grid_saves_and_clears_a_page(app, grid_edits):
+    from review_store import JournalReviewStore, ReviewState
+    import pandas as pd
+
+    app.radio(key="review_layout").set_value("Grid").run()
+    assert not app.exception, app.exception
+
+    grid_edits.update({(0, 'Rating'): "⭐⭐⭐ Fair", (1, 'Remarks'): "too short", (2, 'Rating'): "⭐ Very Poor",
+                       (2, 'Remarks'): "wrong rate"})
+    save_page(app)
+    assert app.main.success[0].value == "Saved 3 review(s) from this page!"
+    # The page's metrics were drawn before the save; the next run counts it
+    assert app.run().main.metric[0].value == "3/6"
+    saved = journal_entries(3)
+    assert [(e['row'], e['Rating'], e['Remarks']) for e in saved] == [
+        (0, "⭐⭐⭐ Fair", ""), (1, "", "too short"), (2, "⭐ Very Poor", "wrong rate")]
+
+    # Emptied cells clear the saved values; untouched rows are not saved again
+    grid_edits.clear()
+    grid_edits.update({(0, 'Rating'): None, (1, 'Remarks'): "", (2, 'Remarks'): ""})
+    save_page(app)
+    assert app.main.success[0].value == "Saved 3 review(s) from this page!"
+    assert app.run().main.metric[0].value == "1/6"
+    cleared = journal_entries(6)[3:]
+    assert [(e['row'], e.get('Cleared')) for e in cleared] == [(0, ["Rating"]), (1, ["Remarks"]), (2, ["Remarks"])]
+
+    reloaded = ReviewState(JournalReviewStore("qa_dataset_with_remarks.csv"), pd.read_csv("input.csv"))
+    assert [(reloaded.record(row_id, "Ann")['Rating'], reloaded.record(row_id, "Ann")['Remarks'])
+            for row_id in range(3)] == [("", ""), ("", ""), ("⭐ Very Poor", "")]
+    assert reloaded.reviewed.tolist() == [False, False, True, False, False, False]
+    reloaded.flush()
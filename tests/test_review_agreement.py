@@ -0,0 +1,120 @@
+# tests/test_review_agreement.py
+import itertools
+
+import numpy as np
+
+from review_agreement import (
+    RatingMatrix, agreement_report, fleiss_kappa, krippendorff_alpha, pairwise_cohen_kappa,
+)
+
+# Fleiss (1971) as reproduced on Wikipedia: 10 items, 14 raters, 5 levels; kappa 0.210
+FLEISS_COUNTS = [
+    [0, 0, 0, 0, 14], [0, 2, 6, 4, 2], [0, 0, 3, 5, 6], [0, 3, 9, 2, 0], [2, 2, 8, 1, 1],
+    [7, 7, 0, 0, 0], [3, 2, 6, 3, 0], [2, 5, 3, 2, 2], [6, 5, 2, 1, 0], [0, 2, 2, 3, 7],
+]
+
+
+def random_ratings(seed, n_rows=60, n_raters=4, density=0.6):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(1, 6, (n_rows, n_raters)).astype(float)
+    values[rng.random((n_rows, n_raters)) > density] = np.nan
+    return values
+
+
+def cohen_kappa(x, y):
+    shared = ~np.isnan(x) & ~np.isnan(y)
+    x, y = x[shared], y[shared]
+    p_o = np.mean(x == y)
+    p_e = sum(np.mean(x == level) * np.mean(y == level) for level in range(1, 6))
+    return (p_o - p_e) / (1 - p_e)
+
+
+def test_matrix_grows_and_clears():
+    matrix = RatingMatrix(3)
+    for i in range(6):
+        matrix.set(i % 3, f"r{i}", str(1 + i % 5))
+    matrix.set(0, "r0", "")
+    matrix.set(1, "", "4")
+    matrix.set(5, "r1", "4")
+    assert matrix.raters == [f"r{i}" for i in range(6)]
+    assert matrix.row(0) == [("r3", 4)]
+    assert matrix.row(1) == [("r1", 2), ("r4", 5)]
+    records = {(row_id, name): {'Rating_Value': str(value)} for row_id in range(3) for name, value in matrix.row(row_id)}
+    rebuilt = RatingMatrix.from_records(3, records)
+    assert [rebuilt.row(row_id) for row_id in range(3)] == [matrix.row(row_id) for row_id in range(3)]
+
+
+def test_matrix_keeps_only_rated_cells():
+    # Far too many rows for a dense float matrix: nothing is allocated per row
+    matrix = RatingMatrix(10**12)
+    matrix.set(7, "ann", "4")
+    matrix.set(10**11, "bob", "2")
+    matrix.set(7, "bob", "1")
+    assert matrix.multi_rated().tolist() == [7]
+    assert np.array_equal(matrix.dense([10**11, 7, 3]), [[np.nan, 2], [4, 1], [np.nan, np.nan]], equal_nan=True)
+
+    # A copy of some rows is independent of later saves
+    snapshot = matrix.copy(matrix.multi_rated())
+    matrix.set(7, "bob", "")
+    assert matrix.multi_rated().tolist() == []
+    assert snapshot.row(7) == [("ann", 4), ("bob", 1)] and snapshot.row(10**11) == []
+
+
+def test_dense_matrix_matches_the_cells():
+    values = random_ratings(3, n_rows=20)
+    matrix = RatingMatrix(20)
+    for row_id, col in zip(*np.nonzero(~np.isnan(values))):
+        matrix.set(int(row_id), "abcd"[col], values[row_id, col])
+    # Columns follow the order the reviewers first appeared in
+    values = values[:, ["abcd".index(name) for name in matrix.raters]]
+    assert np.array_equal(matrix.dense(), values, equal_nan=True)
+    multi = np.flatnonzero((~np.isnan(values)).sum(axis=1) >= 2)
+    assert matrix.multi_rated().tolist() == multi.tolist()
+    assert np.array_equal(matrix.dense(multi[::-1]), values[multi[::-1]], equal_nan=True)
+
+
+def test_pairwise_kappa_matches_a_per_pair_computation():
+    values = random_ratings(1)
+    pairwise = pairwise_cohen_kappa(values, ["a", "b", "c", "d"], min_overlap=1)
+    assert len(pairwise) == 6
+    for row in pairwise.itertuples(index=False):
+        x, y = values[:, "abcd".index(row[0])], values[:, "abcd".index(row[1])]
+        assert np.isclose(row.Kappa, cohen_kappa(x, y))
+
+
+def test_fleiss_kappa_on_the_reference_table():
+    values = np.full((10, 14), np.nan)
+    for item, counts in enumerate(FLEISS_COUNTS):
+        values[item] = np.repeat(np.arange(1, 6), counts)
+    assert round(fleiss_kappa(values), 3) == 0.210
+
+
+def test_nominal_alpha_matches_pairable_values():
+    values = random_ratings(2)
+    # Krippendorff's alpha from every ordered pair of values within a question
+    observed, pooled = [], []
+    for row in values:
+        rated = row[~np.isnan(row)]
+        if len(rated) < 2:
+            continue
+        pooled.extend(rated)
+        weight = 1 / (len(rated) - 1)
+        observed.extend((a != b) * weight for a, b in itertools.permutations(rated, 2))
+    pooled = np.array(pooled)
+    n = len(pooled)
+    d_o = sum(observed) / n
+    d_e = sum(a != b for a, b in itertools.permutations(pooled, 2)) / (n * (n - 1))
+    assert np.isclose(krippendorff_alpha(values, 'nominal'), 1 - d_o / d_e)
+
+
+def test_report_on_perfect_agreement_and_disagreements():
+    matrix = RatingMatrix(4)
+    for row_id, ratings in enumerate([(5, 5), (2, 2), (1, 4), (3, None)]):
+        for name, value in zip("ab", ratings):
+            if value is not None:
+                matrix.set(row_id, name, value)
+    report = agreement_report(matrix, threshold=2, min_overlap=1)
+    assert (report['items'], report['ratings'], report['reviewers']) == (3, 6, 2)
+    assert report['disagreeing_items']['Row'].tolist() == [2]
+    assert report['disagreeing_pairs'][['Row', 'Difference']].values.tolist() == [[2, 3]]
+    assert report['fleiss_kappa'] < 1 and report['krippendorff_alpha'] < 1
@@ -0,0 +1,99 @@
+# tests/test_review_cli.py
+import threading
+
+import pandas as pd
+import pytest
+
+from review_cli import import_files, main, merge_files, to_records
+from review_store import JournalReviewStore, ReviewState, make_record, resync_records
+from row_identity import RowKeys
+
+DATE = "2024-01-01 10:00:00 AM"
+LATER = "2024-01-02 10:00:00 AM"
+
+
+def reviewer_file(path, qa_frame, rows, rating, reviewer, date=DATE, remark=""):
+    frame = qa_frame.iloc[rows].copy()
+    for col, value in make_record(rating, remark, reviewer, "Tax Payer", date).items():
+        frame[col] = value
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def test_merge_keeps_the_latest_review_per_reviewer(qa_frame, tmp_path):
+    row_keys = RowKeys.from_frame(qa_frame)
+    first = reviewer_file(tmp_path / "a.csv", qa_frame, [0, 1], "⭐⭐ Poor", "ann")
+    second = reviewer_file(tmp_path / "b.csv", qa_frame, [1], "⭐⭐⭐⭐ Good", "ann", LATER, "better")
+    reviews, report = merge_files([second, first], row_keys)
+    assert report['exact'].tolist() == [1, 2]
+    records = to_records(reviews)
+    assert (records[(1, "ann")]['Rating'], records[(1, "ann")]['Remarks']) == ("⭐⭐⭐⭐ Good", "better")
+
+    # "all" keeps both of ann's reviews of row 1 in the long output only
+    kept, _ = merge_files([second, first], row_keys, "all")
+    assert len(kept) == 3
+    assert to_records(kept)[(1, "ann")]['Rating'] == "⭐⭐⭐⭐ Good"
+
+
+def test_import_conflicts_option_is_gone(qa_frame, tmp_path):
+    path = reviewer_file(tmp_path / "a.csv", qa_frame, [0], "⭐⭐ Poor", "ann")
+    with pytest.raises(SystemExit):
+        main(["import", path, "--conflicts", "all"])
+
+
+def test_import_keeps_newer_stored_reviews(qa_frame, output_path, tmp_path):
+    row_keys = RowKeys.from_frame(qa_frame)
+    store = JournalReviewStore(output_path)
+    store.save_many([(0, {**make_record("⭐⭐⭐⭐ Good", "", "ann", "Tax Payer", LATER), 'Row_Key': row_keys[0]})])
+    path = reviewer_file(tmp_path / "a.csv", qa_frame, [0, 1], "⭐⭐ Poor", "ann")
+    imported, _ = import_files([path], JournalReviewStore(output_path), qa_frame, row_keys)
+    assert imported == 1
+    records = resync_records(store.load(), row_keys)[0]
+    assert records[(0, "ann")]['Rating'] == "⭐⭐⭐⭐ Good"
+    assert records[(1, "ann")]['Rating'] == "⭐⭐ Poor"
+
+
+def test_import_while_the_app_appends(qa_frame, output_path, tmp_path):
+    row_keys = RowKeys.from_frame(qa_frame)
+    state = ReviewState(JournalReviewStore(output_path), qa_frame, row_keys)
+    path = reviewer_file(tmp_path / "a.csv", qa_frame, [0, 1, 2], "⭐⭐ Poor", "cli")
+    stop = threading.Event()
+    saved = []
+
+    def app_saves():
+        # Another "process": its own store object on the same files
+        while not stop.is_set() and len(saved) < 300:
+            row_id = len(saved) % len(qa_frame)
+            state.save(row_id, make_record("⭐⭐⭐ Fair", f"note {len(saved)}", f"app{len(saved)}", "Tax Payer", DATE))
+            state.flush()
+            saved.append(row_id)
+
+    thread = threading.Thread(target=app_saves)
+    thread.start()
+    try:
+        for _ in range(5):
+            import_files([path], JournalReviewStore(output_path), qa_frame, row_keys)
+    finally:
+        stop.set()
+        thread.join(30)
+
+    records = resync_records(JournalReviewStore(output_path).load(), row_keys)[0]
+    assert all((row_id, f"app{i}") in records for i, row_id in enumerate(saved))
+    assert all((row_id, "cli") in records for row_id in (0, 1, 2))
+
+
+def test_journal_lock_is_shared_by_store_objects(output_path):
+    app, cli = JournalReviewStore(output_path), JournalReviewStore(output_path)
+    appended = threading.Event()
+
+    def append():
+        app.save_many([(0, make_record("⭐⭐⭐ Fair", "", "ann", "Tax Payer", DATE))])
+        appended.set()
+
+    with cli._exclusive():
+        thread = threading.Thread(target=append)
+        thread.start()
+        assert not appended.wait(0.3)
+    assert appended.wait(5)
+    thread.join(5)
+    assert pd.read_json(app.journal_path, lines=True)['Reviewer'].tolist() == ["ann"]
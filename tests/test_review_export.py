@@ -0,0 +1,116 @@
+# tests/test_review_export.py
+import io
+
+import pandas as pd
+
+from memory_budget import MemoryBudget
+from review_export import export_reviews, select_rows, write_export
+from review_store import JournalReviewStore, ReviewState, decode_reviews, format_dates, make_record, review_frame
+
+DATE = "2024-01-01 10:00:00 AM"
+LATER = "2024-01-02 11:30:00 PM"
+
+
+def test_format_dates_formats_each_time_once():
+    seconds = [0, 1704103200, 0, 1704103200, 1704238200]
+    assert format_dates(seconds).tolist() == ["", DATE, "", DATE, LATER]
+    assert format_dates([0, 0]).tolist() == ["", ""]
+
+
+def test_compact_frame_round_trips(qa_frame, output_path):
+    reviews = {
+        1: {**make_record("⭐⭐ Poor", "short, \"quoted\"", "ann", "Tax Payer", DATE), 'Row_Key': "k1"},
+        4: {**make_record("", "remark only", "Zoë", "Tax Officer", LATER), 'Row_Key': "k4"},
+    }
+    frame = review_frame(6, reviews)
+    assert frame['Rating_Value'].dtype == "int8" and frame['Review_Date'].dtype == "int64"
+    assert frame['Reviewer'].dtype == "category"
+    decoded = decode_reviews(frame)
+    for row_id, record in reviews.items():
+        # Decoded as the strings written to files
+        assert decoded.loc[row_id].to_dict() == {col: str(value) for col, value in record.items()}
+    assert (decoded.drop(index=[1, 4]) == "").all().all()
+
+    # Saves through the state keep the same layout
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(2, make_record("⭐⭐⭐⭐ Good", "", "new reviewer", "Tax Payer", DATE))
+    assert state.frame['Reviewer'].dtype == "category"
+    assert decode_reviews(state.snapshot_frame()).loc[2, 'Reviewer'] == "new reviewer"
+    state.flush()
+
+
+def test_export_chunks_join_rows_and_reviews(qa_frame, output_path, monkeypatch):
+    monkeypatch.setattr("review_export.EXPORT_CHUNK_SIZE", 2)
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(1, make_record("⭐⭐ Poor", "short", "ann", "Tax Payer", DATE))
+    state.save(4, make_record("⭐⭐⭐⭐ Good", "", "bob", "Tax Officer", LATER))
+    for fmt, read in (("CSV", pd.read_csv), ("Parquet", pd.read_parquet)):
+        fh = io.BytesIO()
+        write_export(fh, fmt, qa_frame, state.snapshot_frame(), [0, 1, 4])
+        fh.seek(0)
+        exported = read(fh).fillna("")
+        assert exported['Question'].tolist() == qa_frame['Question'].iloc[[0, 1, 4]].tolist()
+        assert exported['Reviewer'].tolist() == ["", "ann", "bob"]
+        assert exported['Review_Date'].tolist() == ["", DATE, LATER]
+    state.flush()
+
+
+def read_export(fh, fmt):
+    read = {
+        "CSV": lambda: pd.read_csv(fh, dtype=str, keep_default_na=False),
+        "Parquet": lambda: pd.read_parquet(fh),
+        "JSONL": lambda: pd.read_json(fh, lines=True, dtype=False),
+        "XLSX": lambda: pd.read_excel(fh, dtype=str),
+    }[fmt]
+    return read().fillna("").astype(str)
+
+
+def test_filtered_exports_in_every_format(qa_frame, output_path, monkeypatch):
+    monkeypatch.setattr("review_export.EXPORT_CHUNK_SIZE", 2)
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(0, make_record("⭐⭐⭐⭐⭐ Excellent", "", "ann", "Tax Payer", DATE))
+    state.save(2, make_record("⭐⭐ Poor", "too short", "bob", "Tax Officer", DATE))
+    state.save(3, make_record("", "remark only", "ann", "Tax Payer", LATER))
+    state.save(5, make_record("⭐⭐⭐ Fair", "", "bob", "Tax Officer", LATER))
+
+    frame = state.snapshot_frame()
+    assert select_rows(frame).tolist() == list(range(6))
+    assert select_rows(frame, reviewed_only=True).tolist() == [0, 2, 3, 5]
+    assert select_rows(frame, reviewer_type="Tax Officer").tolist() == [2, 5]
+    # Unrated rows never fall in a rating range
+    assert select_rows(frame, rating_range=(2, 3)).tolist() == [2, 5]
+
+    for fmt in ("CSV", "Parquet", "JSONL", "XLSX"):
+        everything = read_export(export_reviews(state, fmt), fmt)
+        assert everything.columns.tolist()[:3] == ['Question', 'Answer', 'Gold Answer']
+        assert everything['Question'].tolist() == qa_frame['Question'].tolist()
+
+        reviewed = read_export(export_reviews(state, fmt, reviewed_only=True), fmt)
+        assert reviewed[['Reviewer', 'Rating_Value', 'Remarks']].values.tolist() == [
+            ["ann", "5", ""], ["bob", "2", "too short"], ["ann", "", "remark only"], ["bob", "3", ""]]
+        assert reviewed['Review_Date'].tolist() == [DATE, DATE, LATER, LATER]
+
+        officers = read_export(export_reviews(state, fmt, reviewer_type="Tax Officer", rating_range=(3, 5)), fmt)
+        assert officers['Question'].tolist() == [qa_frame.loc[5, 'Question']]
+
+        # An empty selection still has the header (JSONL has none: no lines at all)
+        empty = export_reviews(state, fmt, rating_range=(4, 4))
+        if fmt == "JSONL":
+            assert empty.read() == b""
+        else:
+            empty = read_export(empty, fmt)
+            assert len(empty) == 0 and 'Rating' in empty.columns
+    state.flush()
+
+
+def test_budget_sheds_caches_only_when_over(monkeypatch):
+    cleared = []
+
+    class Cache:
+        def clear(self):
+            cleared.append(1)
+
+    monkeypatch.setattr("memory_budget.process_rss", lambda: 2 * 1024 * 1024)
+    assert not MemoryBudget(0).shed(Cache())
+    assert not MemoryBudget(4).shed(Cache())
+    assert MemoryBudget(1).shed(Cache()) and cleared == [1]
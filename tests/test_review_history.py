@@ -0,0 +1,108 @@
+# tests/test_review_history.py
+import threading
+
+from review_history import ReviewHistory, history_path, review_times, reviews_as_of
+from review_store import JournalReviewStore, ReviewState, make_record
+
+JAN_1 = "2024-01-01 10:00:00 AM"   # 04:00 UTC
+JAN_2 = "2024-01-02 10:00:00 AM"
+JAN_1_UTC = 1704081600
+
+
+def test_review_times_read_the_app_time_zone():
+    times = review_times([JAN_1, "", "not a date"], now=7)
+    assert times.tolist() == [JAN_1_UTC, 7, 7]
+
+
+def test_seed_uses_the_reviews_own_dates(qa_frame, output_path):
+    store = JournalReviewStore(output_path)
+    state = ReviewState(store, qa_frame)
+    state.save(0, make_record("⭐⭐ Poor", "", "ann", "Tax Payer", JAN_2))
+    state.save(1, make_record("⭐⭐⭐ Fair", "", "bob", "Tax Payer", JAN_1))
+    state.flush()
+
+    # The history starts after the reviews were made
+    history = ReviewHistory(history_path(output_path))
+    ReviewState(JournalReviewStore(output_path), qa_frame, state.row_keys, history).flush()
+    day = 24 * 3600
+    assert set(reviews_as_of(history, state.row_keys, JAN_1_UTC - 1)) == set()
+    assert set(reviews_as_of(history, state.row_keys, JAN_1_UTC)) == {(1, "bob")}
+    assert set(reviews_as_of(history, state.row_keys, JAN_1_UTC + day)) == {(0, "ann"), (1, "bob")}
+
+
+def test_saves_reach_the_history_on_the_writer_thread(qa_frame, output_path, monkeypatch):
+    history = ReviewHistory(history_path(output_path))
+    state = ReviewState(JournalReviewStore(output_path), qa_frame, history=history)
+    threads = []
+    record = history.record
+    monkeypatch.setattr(history, 'record', lambda *args: threads.append(threading.current_thread()) or record(*args))
+
+    state.save(0, make_record("⭐⭐ Poor", "", "ann", "Tax Payer", JAN_1))
+    state.save_many([(row_id, make_record("⭐⭐⭐ Fair", "", "ann", "Tax Payer", JAN_1)) for row_id in (1, 2)])
+    assert state.flush()
+    assert threads and threading.current_thread() not in threads
+    assert history.stats()['deltas'] == 3
+    assert state.history_error is None
+
+
+def test_failed_history_writes_are_retried(qa_frame, output_path, monkeypatch):
+    history = ReviewHistory(history_path(output_path))
+    state = ReviewState(JournalReviewStore(output_path), qa_frame, history=history)
+    state.writer.interval = 0.05
+    record, calls = history.record, []
+
+    def flaky(*args):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return record(*args)
+
+    monkeypatch.setattr(history, 'record', flaky)
+    state.save(0, make_record("⭐⭐ Poor", "", "ann", "Tax Payer", JAN_1))
+    assert state.flush()
+    assert len(calls) == 2 and history.stats()['deltas'] == 1
+    assert state.history_error is None
+
+
+def test_state_at_replays_onto_snapshots(tmp_path):
+    import random
+
+    from review_store import RATING_OPTIONS, merge_record
+
+    rng = random.Random(11)
+    history = ReviewHistory(str(tmp_path / "h.sqlite3"))
+    current, expected = {}, {}
+    for step in range(120):
+        row_id, reviewer = rng.randrange(5), rng.choice(["ann", "bob"])
+        change = make_record(rng.choice([""] + list(RATING_OPTIONS)), rng.choice(["", "n1", "n2"]),
+                             reviewer, "Tax Payer", JAN_1)
+        change['Row_Key'] = f"key{row_id}"
+        old = current.get((row_id, reviewer))
+        current[(row_id, reviewer)] = merge_record(old, change)
+        history.record([(row_id, old, current[(row_id, reviewer)])], ts=1000 + step)
+        expected[1000 + step] = {key: dict(record) for key, record in current.items()}
+        if step in (40, 90):
+            history.snapshot()
+
+    def fields(stored):
+        return {
+            (row_id, reviewer): (record['Rating'], record['Rating_Value'], record['Remarks'])
+            for (_, reviewer), (row_id, record) in stored.items()
+        }
+
+    assert history.stats()['snapshots'] == 2
+    assert history.state_at(999) == {}
+    for ts in (1000, 1030, 1040, 1041, 1075, 1090, 1119, 2000):
+        want = expected[min(ts, 1119)]
+        assert fields(history.state_at(ts)) == {
+            key: (record['Rating'], record['Rating_Value'], record['Remarks']) for key, record in want.items()
+        }
+
+
+def test_unchanged_saves_add_no_delta(tmp_path):
+    history = ReviewHistory(str(tmp_path / "h.sqlite3"))
+    record = {**make_record("⭐⭐ Poor", "", "ann", "Tax Payer", JAN_1), 'Row_Key': "k"}
+    assert history.record([(0, None, record)]) == 1
+    assert history.record([(0, record, dict(record))]) == 0
+    assert history.record([(0, record, {**record, 'Remarks': "vague"})]) == 1
+    assert history.question_history("k")['Changed'].tolist() == ["Rating, Reviewer_Type, Review_Date", "Remarks"]
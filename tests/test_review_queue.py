@@ -0,0 +1,81 @@
+# tests/test_review_queue.py
+import numpy as np
+
+from review_queue import ReviewQueue, build_review_queue, compute_priorities, rating_spread
+from review_store import JournalReviewStore, ReviewState, make_record
+
+DATE = "2024-01-01 10:00:00 AM"
+NAN = np.nan
+
+
+def test_disagreement_is_the_spread_between_reviewers():
+    ratings = np.array([
+        [1.0, 5.0],   # full disagreement
+        [4.0, 4.0],   # agreement
+        [2.0, NAN],   # one reviewer: nothing to disagree with
+        [NAN, NAN],
+    ])
+    assert rating_spread(ratings).tolist() == [1.0, 0.0, 0.0, 0.0]
+    assert rating_spread(np.empty((3, 0))).tolist() == [0.0, 0.0, 0.0]
+
+
+def test_priorities_ignore_the_auto_score_for_a_single_rating():
+    reviewed = np.array([True, True])
+    # Same similarity; only the two-reviewer row disagrees
+    priorities = compute_priorities(reviewed, np.array([[1.0, NAN], [1.0, 5.0]]), np.array([0.9, 0.9]))
+    assert priorities[0] < priorities[1]
+
+
+def test_pop_serves_by_priority_and_skips_the_current_row():
+    queue = ReviewQueue([0.1, 0.9, 0.5])
+    assert queue.pop(exclude=1) == 2
+    assert queue.pop() == 1
+    assert len(queue) == 1
+
+
+def test_requeue_hands_a_popped_row_back():
+    queue = ReviewQueue([0.1, 0.9])
+    assert queue.pop() == 1
+    queue.requeue(1)
+    queue.requeue(1)  # already queued: no duplicate
+    assert queue.pop() == 1
+    assert queue.pop() == 0
+    assert queue.pop() is None
+
+
+def test_expired_lease_returns_the_row():
+    queue = ReviewQueue([0.1, 0.9], lease_seconds=0)
+    assert queue.pop() == 1
+    assert queue.pop() == 1
+
+
+def test_saved_row_is_not_returned_by_its_lease():
+    queue = ReviewQueue([0.1, 0.9], lease_seconds=0)
+    assert queue.pop() == 1
+    queue.update(1, 0.0)
+    queue.lease_seconds = 3600
+    assert queue.pop() == 0
+    assert queue.pop() == 1
+    assert queue.pop() is None
+
+
+def test_queue_follows_reviewer_disagreement(qa_frame, output_path):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    for row_id in range(len(qa_frame)):
+        state.save(row_id, make_record("⭐⭐⭐ Fair", "", "ann", "Tax Payer", DATE))
+    queue = build_review_queue(state)
+    before = queue.priority(3)
+    state.save(3, make_record("⭐ Very Poor", "", "bob", "Tax Officer", DATE))
+    assert queue.priority(3) > before
+    assert queue.pop() == 3
+
+
+def test_peek_shows_what_pop_would_serve():
+    queue = ReviewQueue([0.1, 0.9, 0.5, 0.7], lease_seconds=3600)
+    assert queue.peek(2, exclude=1) == [3, 2]
+    assert queue.pop(exclude=1) == 3
+    # A popped (leased) row is no longer upcoming; a re-prioritised one moves
+    queue.update(0, 0.95)
+    assert queue.peek(3) == [0, 1, 2]
+    assert queue.peek(3) == [queue.pop(), queue.pop(), queue.pop()]
+    assert queue.peek(3) == []
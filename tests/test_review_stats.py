@@ -0,0 +1,44 @@
+# tests/test_review_stats.py
+import random
+
+import numpy as np
+
+from review_stats import ReviewStatistics
+from review_store import RATING_OPTIONS, make_record, merge_record, review_key
+
+LABELS = {value: label for label, value in RATING_OPTIONS.items()}
+CATEGORIES = np.array(["income", "vat", "income", "customs", "vat", "income"], dtype=object)
+
+
+def test_incremental_updates_match_a_rebuild():
+    rng = random.Random(7)
+    n_rows = len(CATEGORIES)
+    stats, records = ReviewStatistics(n_rows), {}
+    for step in range(300):
+        row_id = rng.randrange(n_rows)
+        rating = rng.choice([""] + list(RATING_OPTIONS))
+        remark = rng.choice(["", "", "unclear"])
+        reviewer, reviewer_type = rng.choice([("ann", "Tax Payer"), ("bob", "Tax Officer"), ("cy", "Tax Payer")])
+        record = make_record(rating, remark, reviewer, reviewer_type, f"2024-01-{1 + step % 28:02d} 10:00:00 AM")
+        key = review_key(row_id, record)
+        old = records.get(key)
+        records[key] = merge_record(old, record)
+        stats.replace(old, records[key], row_id, CATEGORIES[row_id])
+
+    rebuilt = ReviewStatistics.from_records(n_rows, records, CATEGORIES)
+    assert stats.summary(n_rows, LABELS) == rebuilt.summary(n_rows, LABELS)
+    assert stats.row_ratings.tolist() == rebuilt.row_ratings.tolist()
+
+
+def test_summary_counts_each_reviewers_rating():
+    records = {
+        (0, "ann"): make_record("⭐⭐⭐⭐⭐ Excellent", "", "ann", "Tax Payer", "2024-01-01 10:00:00 AM"),
+        (0, "bob"): make_record("⭐ Very Poor", "", "bob", "Tax Officer", "2024-01-02 10:00:00 AM"),
+        (1, "ann"): make_record("", "needs a source", "ann", "Tax Payer", "2024-01-02 11:00:00 AM"),
+    }
+    summary = ReviewStatistics.from_records(4, records).summary(4, LABELS)
+    assert (summary['rated'], summary['rated_questions'], summary['reviewed']) == (2, 1, 3)
+    assert (summary['mean'], summary['variance'], summary['completion']) == (3.0, 4.0, 25)
+    assert summary['rating_dist'] == [("⭐⭐⭐⭐⭐ Excellent", 1, 50), ("⭐ Very Poor", 1, 50)]
+    assert summary['by_day'] == [("2024-01-01", 1), ("2024-01-02", 2)]
+    assert summary['rating_by_type']["Tax Officer"]['Average'] == 1.0
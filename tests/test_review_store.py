@@ -0,0 +1,394 @@
+# tests/test_review_store.py
+import os
+import threading
+import time
+
+import numpy as np
+
+from review_store import AutosaveWriter, JournalReviewStore, ReviewState, SqliteReviewStore, make_record
+
+DATE = "2024-01-01 10:00:00 AM"
+
+
+def review(rating="", remark="", reviewer="ann", reviewer_type="Tax Payer", date=DATE):
+    return make_record(rating, remark, reviewer, reviewer_type, date)
+
+
+# -------------------------
+# Shared review state
+# -------------------------
+def test_compaction_runs_outside_the_state_lock(qa_frame, output_path, monkeypatch):
+    store = JournalReviewStore(output_path)
+    state = ReviewState(store, qa_frame)
+    started, release = threading.Event(), threading.Event()
+    compact = store.compact
+
+    def slow_compact(df, row_keys):
+        started.set()
+        release.wait(5)
+        compact(df, row_keys)
+
+    monkeypatch.setattr(store, 'compact', slow_compact)
+    state._compact_scheduled = True
+    thread = threading.Thread(target=state._compact)
+    thread.start()
+    try:
+        assert started.wait(5)
+        begin = time.monotonic()
+        state.save(0, review("⭐⭐⭐ Fair"))
+        assert not state.refresh()
+        assert time.monotonic() - begin < 1
+    finally:
+        release.set()
+        thread.join(5)
+    assert state.flush()
+    assert not state._compact_scheduled
+    assert not state.refresh()
+    assert state.record(0, "ann")['Rating'] == "⭐⭐⭐ Fair"
+
+
+def test_sessions_share_one_state_and_reload_only_on_outside_changes(qa_frame, output_path):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    version = state.version
+
+    def session(reviewer):
+        for row_id in range(len(qa_frame)):
+            state.save(row_id, review("⭐⭐⭐ Fair", reviewer=reviewer))
+
+    threads = [threading.Thread(target=session, args=(name,)) for name in ("ann", "bob")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    # Every session's save is visible at once, without a reload
+    assert len(state.records) == 2 * len(qa_frame)
+    assert state.version == version + 2 * len(qa_frame)
+    assert state.flush()
+    # Our own writes are not mistaken for an outside change
+    assert not state.refresh()
+
+    other = JournalReviewStore(output_path)
+    other.save(0, review("⭐ Very Poor", reviewer="cy"))
+    assert state.refresh()
+    assert state.record(0, "cy")['Rating'] == "⭐ Very Poor"
+    assert not state.refresh()
+
+
+def test_reviewed_bitmap_tracks_saves_and_matches_a_reload(qa_frame, output_path):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    assert state.reviewed_count == 0 and state.next_pending() == 0
+
+    state.save(0, review("⭐⭐ Poor"))
+    state.save(2, review(remark="needs a source"))
+    # An empty save is not a review
+    state.save(1, review())
+    state.save(0, review("⭐⭐⭐ Fair", reviewer="bob"))
+    assert state.reviewed.tolist() == [True, False, True, False, False, False]
+    assert state.reviewed_count == 2
+    assert [state.is_reviewed(row_id) for row_id in (0, 1, 2, 99)] == [True, False, True, False]
+    assert (state.next_pending(), state.next_pending(2), state.next_pending(4)) == (1, 3, 4)
+
+    state.save(1, review("⭐⭐⭐⭐ Good"))
+    state.save_many([(row_id, review("⭐⭐⭐⭐ Good")) for row_id in (3, 4, 5)])
+    assert state.reviewed_count == len(qa_frame)
+    assert state.next_pending() is None and state.next_pending(3) is None
+
+    assert state.flush()
+    reloaded = ReviewState(JournalReviewStore(output_path), qa_frame)
+    assert reloaded.reviewed.tolist() == state.reviewed.tolist()
+    assert reloaded.reviewed_count == state.reviewed_count
+
+
+# -------------------------
+# Several reviewers on one question
+# -------------------------
+def test_question_shows_one_whole_review(qa_frame, output_path):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(0, review("⭐⭐⭐⭐ Good", reviewer="alice", reviewer_type="Tax Payer"))
+    state.save(0, review("⭐ Very Poor", reviewer="bob", reviewer_type="Tax Officer"))
+    state.save(0, review(remark="alice thinks it is fine", reviewer="alice", reviewer_type="Tax Payer"))
+
+    shown = state.reviews[0]
+    assert (shown['Reviewer'], shown['Rating'], shown['Remarks']) == \
+        ("alice", "⭐⭐⭐⭐ Good", "alice thinks it is fine")
+    assert state.record(0, "bob")['Rating'] == "⭐ Very Poor"
+
+    # The compacted output and a reload agree with the live view
+    state.flush()
+    state.store.compact(state.df, state.row_keys)
+    reloaded = ReviewState(JournalReviewStore(output_path), qa_frame).reviews[0]
+    assert (reloaded['Reviewer'], reloaded['Rating'], reloaded['Remarks']) == \
+        ("alice", "⭐⭐⭐⭐ Good", "alice thinks it is fine")
+
+
+def test_stats_and_filters_count_every_reviewer(qa_frame, output_path):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(0, review("⭐⭐⭐⭐ Good", reviewer="alice", reviewer_type="Tax Payer"))
+    state.save(0, review("⭐ Very Poor", reviewer="bob", reviewer_type="Tax Officer"))
+    state.save(1, review("⭐⭐⭐ Fair", reviewer="bob", reviewer_type="Tax Officer"))
+
+    state.flush()
+
+    # Kept up to date by the saves, and rebuilt the same on reload
+    for current in (state, ReviewState(JournalReviewStore(output_path), qa_frame)):
+        stats = current.statistics()
+        assert dict(stats['by_reviewer']) == {"alice": 1, "bob": 2}
+        assert dict(stats['reviewer_types']) == {"Tax Payer": 1, "Tax Officer": 2}
+        assert stats['rated'] == 3 and stats['rated_questions'] == 2
+        assert stats['completion'] == int(2 / len(qa_frame) * 100)
+
+
+def test_reviewer_type_export_and_search(qa_frame, output_path):
+    from review_export import export_reviews
+    from search_index import review_filter
+    import pandas as pd
+
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(0, review("⭐⭐⭐⭐ Good", reviewer="alice", reviewer_type="Tax Payer"))
+    state.save(0, review("⭐ Very Poor", reviewer="bob", reviewer_type="Tax Officer"))
+    state.save(0, review(remark="fine", reviewer="alice", reviewer_type="Tax Payer"))
+    assert state.reviews[0]['Reviewer'] == "alice"
+
+    for rtype, expected in (("Tax Payer", ["alice", 4]), ("Tax Officer", ["bob", 1]), ("Non Tax Payer", None)):
+        exported = pd.read_csv(export_reviews(state, "CSV", reviewed_only=True, reviewer_type=rtype))
+        assert exported[['Reviewer', 'Rating_Value']].values.tolist() == ([expected] if expected else [])
+
+    rows = np.arange(len(qa_frame))
+    assert review_filter(state, reviewer_type="Tax Payer")(rows).tolist() == [True] + [False] * 5
+    assert review_filter(state, max_rating=2)(rows).tolist() == [True] + [False] * 5
+    state.flush()
+
+
+def test_cleared_fields_are_emptied_and_the_question_shows_another_review(qa_frame, output_path):
+    for store in (JournalReviewStore(output_path), SqliteReviewStore(output_path)):
+        state = ReviewState(store, qa_frame)
+        state.save(0, review("⭐⭐ Poor", reviewer="bob"))
+        state.save(0, review("⭐⭐⭐⭐ Good", "fine", reviewer="ann"))
+        state.save(1, review("⭐⭐⭐ Fair", "ok", reviewer="ann"))
+        assert state.reviews[0]['Reviewer'] == "ann"
+        assert state.next_pending() == 2
+
+        # Only an explicit clear empties a field; a plain empty one is left unchanged
+        state.save(1, make_record("", "", "ann", "Tax Payer", DATE, cleared=["Remarks"]))
+        assert (state.record(1, "ann")['Rating'], state.record(1, "ann")['Remarks']) == ("⭐⭐⭐ Fair", "")
+        state.save(0, make_record("", "", "ann", "Tax Payer", DATE, cleared=["Rating", "Remarks"]))
+        state.save(1, make_record("", "", "ann", "Tax Payer", DATE, cleared=["Rating"]))
+        assert state.record(0, "ann")['Rating_Value'] == ""
+        # Bob's review takes the place of Ann's; nobody else reviewed question 1
+        assert state.reviews[0]['Reviewer'] == "bob"
+        assert state.reviewed_count == 1 and state.next_pending() == 1
+        assert state.statistics()['rated'] == 1
+        assert state.flush()
+
+        reloaded = ReviewState(type(store)(output_path), qa_frame)
+        assert reloaded.reviews[0]['Reviewer'] == "bob"
+        assert (reloaded.record(1, "ann")['Rating'], reloaded.record(1, "ann")['Remarks']) == ("", "")
+        assert reloaded.reviewed.tolist() == state.reviewed.tolist()
+        for path in (output_path, getattr(store, 'journal_path', None), getattr(store, 'db_path', None)):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+# -------------------------
+# Journal store
+# -------------------------
+def test_journal_merges_saves_and_skips_a_torn_line(output_path):
+    store = JournalReviewStore(output_path)
+    store.save(0, review("⭐⭐ Poor"))
+    store.save_many([(0, review(remark="too short")), (1, review("⭐⭐⭐ Fair", reviewer="bob"))])
+    with open(store.journal_path, 'a', encoding='utf-8') as fh:
+        fh.write('{"row": 2, "Rating": "⭐')
+
+    loaded = JournalReviewStore(output_path).load()
+    assert list(loaded) == [(0, "ann"), (1, "bob")]
+    row_id, record = loaded[(0, "ann")]
+    assert (row_id, record['Rating'], record['Remarks']) == (0, "⭐⭐ Poor", "too short")
+
+
+def test_journal_compaction_writes_the_csvs(qa_frame, output_path):
+    import pandas as pd
+
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    state.save(2, review("⭐⭐⭐⭐ Good", "clear"))
+    state.save(2, review("⭐ Very Poor", reviewer="bob"))
+    assert state.flush()
+    state.store.compact(qa_frame, state.row_keys)
+
+    assert not os.path.exists(state.store.journal_path)
+    per_question = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+    # The question shows its latest review; every reviewer's is kept
+    assert per_question.loc[2, ['Reviewer', 'Rating', 'Remarks']].tolist() == ["bob", "⭐ Very Poor", ""]
+    assert (per_question.drop(index=2)['Rating'] == "").all()
+    reloaded = ReviewState(JournalReviewStore(output_path), qa_frame)
+    assert reloaded.record(2, "ann")['Remarks'] == "clear"
+    assert reloaded.reviewed_count == 1
+
+
+def test_compaction_streams_a_lazy_input_in_chunks(qa_frame, output_path, tmp_path, monkeypatch):
+    import pandas as pd
+
+    import review_store
+    from dataset_loader import LazyCSVDataset
+
+    input_path = str(tmp_path / "input.csv")
+    qa_frame.to_csv(input_path, index=False)
+    lazy = LazyCSVDataset(input_path)
+    monkeypatch.setattr(review_store, 'WRITE_CHUNK_SIZE', 4)
+    # Compaction never reads the whole input at once
+    monkeypatch.setattr(pd, 'read_csv', _chunked_only(pd.read_csv))
+
+    state = ReviewState(JournalReviewStore(output_path), lazy)
+    state.save(1, review("⭐⭐ Poor", "vague"))
+    state.save(5, review("⭐⭐⭐⭐⭐ Excellent"))
+    assert state.flush()
+    state.store.compact(lazy, state.row_keys)
+    monkeypatch.undo()
+
+    written = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+    expected = qa_frame.copy()
+    state.store.compact(expected, state.row_keys)
+    assert written.equals(pd.read_csv(output_path, dtype=str, keep_default_na=False))
+    assert written['Question'].tolist() == qa_frame['Question'].tolist()
+    assert written.loc[[1, 5], 'Rating_Value'].tolist() == ["2", "5"]
+    assert written.loc[1, 'Remarks'] == "vague"
+
+
+def test_adopted_keys_are_journaled_without_a_rewrite(qa_frame, output_path):
+    # Output written before reviews were kept per reviewer or had row keys
+    legacy = qa_frame.copy()
+    for col, value in (('Rating', ""), ('Rating_Value', ""), ('Remarks', ""), ('Reviewer', ""),
+                       ('Reviewer_Type', ""), ('Review_Date', "")):
+        legacy[col] = value
+    legacy.loc[3, ['Rating', 'Rating_Value', 'Remarks', 'Reviewer', 'Reviewer_Type', 'Review_Date']] = \
+        ["⭐⭐ Poor", "2", "off topic", "ann", "Tax Payer", DATE]
+    legacy.to_csv(output_path, index=False)
+    written = os.stat(output_path).st_mtime_ns
+
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    assert state.sync['adopted'] == [(3, "ann", state.row_keys[3])]
+    assert state.store.journal_records == 1
+    assert os.stat(output_path).st_mtime_ns == written
+    assert not os.path.exists(state.store.reviewers_path)
+
+    # Adopted once: the next start finds the keyed review and appends nothing
+    again = ReviewState(JournalReviewStore(output_path), qa_frame)
+    assert not again.sync['adopted'] and again.store.journal_records == 1
+    assert list(again.records) == [(3, "ann")]
+
+    # Keyed, the review now follows its question when the input is reordered
+    reordered = ReviewState(JournalReviewStore(output_path), qa_frame.iloc[::-1].reset_index(drop=True))
+    assert reordered.record(2, "ann")['Remarks'] == "off topic"
+    assert reordered.sync['moved'] == 1
+
+
+def _chunked_only(read_csv):
+    def guarded(*args, **kwargs):
+        assert kwargs.get('chunksize'), "the input was read whole"
+        return read_csv(*args, **kwargs)
+    return guarded
+
+
+# -------------------------
+# SQLite store
+# -------------------------
+def test_sqlite_upserts_per_reviewer_from_many_threads(output_path):
+    store = SqliteReviewStore(output_path)
+
+    def reviewer(name):
+        for row_id in range(20):
+            store.save(row_id, review("⭐⭐⭐ Fair", reviewer=name))
+        store.save(0, review(remark=f"{name} again", reviewer=name))
+
+    threads = [threading.Thread(target=reviewer, args=(name,)) for name in ("ann", "bob", "cy")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    loaded = SqliteReviewStore(output_path).load()
+    assert len(loaded) == 60
+    # A remark-only save keeps the rating; the remark was saved last
+    assert all(loaded[(0, name)][1]['Rating'] == "⭐⭐⭐ Fair" for name in ("ann", "bob", "cy"))
+    assert {loaded[(0, name)][1]['Remarks'] for name in ("ann", "bob", "cy")} == {"ann again", "bob again", "cy again"}
+
+
+def test_sqlite_seeds_from_the_csv_and_exports_on_compact(qa_frame, output_path):
+    import pandas as pd
+
+    journal = ReviewState(JournalReviewStore(output_path), qa_frame)
+    journal.save(3, review("⭐⭐ Poor", "vague"))
+    assert journal.flush()
+    journal.store.compact(qa_frame, journal.row_keys)
+
+    state = ReviewState(SqliteReviewStore(output_path), qa_frame)
+    assert state.record(3, "ann")['Remarks'] == "vague"
+    state.save(4, review("⭐⭐⭐⭐⭐ Excellent", reviewer="bob"))
+    assert state.flush()
+    state.store.compact(qa_frame, state.row_keys)
+    exported = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+    assert exported.loc[[3, 4], 'Reviewer'].tolist() == ["ann", "bob"]
+
+
+# -------------------------
+# Background autosave
+# -------------------------
+class RecordingStore:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def save_many(self, items):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.batches.append(list(items))
+
+
+def test_autosave_coalesces_edits_into_one_write():
+    store = RecordingStore()
+    writer = AutosaveWriter(store, interval=60)
+    writer.submit(0, review("⭐⭐ Poor"))
+    writer.submit(1, review("⭐⭐⭐ Fair", reviewer="bob"))
+    writer.submit(0, review(remark="on second thought"))
+    assert writer.pending_count == 2 and store.batches == []
+    assert writer.flush(5)
+    assert len(store.batches) == 1
+    (first_row, first), (second_row, second) = store.batches[0]
+    # Latest edit last; the remark-only edit kept the rating
+    assert (first_row, second_row) == (1, 0)
+    assert (second['Rating'], second['Remarks']) == ("⭐⭐ Poor", "on second thought")
+
+
+def test_autosave_keeps_every_clear_of_coalesced_edits():
+    store = RecordingStore()
+    writer = AutosaveWriter(store, interval=60)
+    writer.submit(0, make_record("", "", "ann", "Tax Payer", DATE, cleared=["Remarks"]))
+    writer.submit(0, make_record("", "", "ann", "Tax Payer", DATE, cleared=["Rating"]))
+    assert writer.flush(5)
+    (_, record), = store.batches[0]
+    assert record['Cleared'] == ["Rating", "Remarks"]
+
+
+def test_autosave_writes_a_full_batch_before_the_interval():
+    store = RecordingStore()
+    writer = AutosaveWriter(store, interval=60, batch_size=3)
+    for row_id in range(3):
+        writer.submit(row_id, review("⭐⭐⭐ Fair"))
+    deadline = time.monotonic() + 5
+    while not store.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [row_id for row_id, _ in store.batches[0]] == [0, 1, 2]
+
+
+def test_autosave_retries_failed_batches_and_keeps_newer_edits():
+    store = RecordingStore(failures=1)
+    writer = AutosaveWriter(store, interval=0.05)
+    writer.submit(0, review("⭐⭐ Poor", "first"))
+    deadline = time.monotonic() + 5
+    while writer.last_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.submit(0, review(remark="second"))
+    assert writer.flush(5)
+    assert writer.last_error is None
+    saved = [record for batch in store.batches for _, record in batch]
+    assert (saved[-1]['Rating'], saved[-1]['Remarks']) == ("⭐⭐ Poor", "second")
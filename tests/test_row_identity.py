@@ -0,0 +1,51 @@
+# tests/test_row_identity.py
+from review_store import make_record, put_stored, resync_records
+from row_identity import RowKeys
+
+DATE = "2024-01-01 10:00:00 AM"
+
+
+def stored_reviews(row_keys, rows, keyed=True):
+    stored = {}
+    for row_id, reviewer in rows:
+        record = make_record("⭐⭐⭐ Fair", f"note {row_id}", reviewer, "Tax Payer", DATE)
+        if keyed:
+            record['Row_Key'] = row_keys[row_id]
+        put_stored(stored, row_id, record)
+    return stored
+
+
+def test_reviews_follow_their_question(qa_frame):
+    before = RowKeys.from_frame(qa_frame)
+    stored = stored_reviews(before, [(0, "ann"), (3, "ann"), (3, "bob")])
+    # Reversed, with a new question on top
+    reordered = qa_frame.iloc[::-1].reset_index(drop=True)
+    reordered.loc[-1] = ["A brand new question?", "New answer", "New gold"]
+    reordered = reordered.sort_index().reset_index(drop=True)
+
+    records, sync = resync_records(stored, RowKeys.from_frame(reordered))
+    assert sorted(records) == [(3, "ann"), (3, "bob"), (6, "ann")]
+    assert records[(6, "ann")]['Remarks'] == "note 0"
+    # Row r is now at 6 - r: row 3 stays put
+    assert sync['moved'] == 1 and not sync['dropped'] and not sync['edited']
+
+
+def test_edited_and_removed_questions(qa_frame):
+    stored = stored_reviews(RowKeys.from_frame(qa_frame), [(1, "ann"), (2, "ann"), (4, "ann")])
+    edited = qa_frame.drop(index=4).reset_index(drop=True)
+    edited.loc[1, 'Answer'] = "A corrected model answer"
+    edited.loc[2, 'Question'] = "Question number 2 about income tax, reworded?"
+
+    records, sync = resync_records(stored, RowKeys.from_frame(edited))
+    # Same question or same answers: kept on the edited row and flagged
+    assert sorted(records) == [(1, "ann"), (2, "ann")]
+    assert sync['edited'] == {(1, "ann"), (2, "ann")}
+    assert [(row_id, record['Remarks']) for row_id, record in sync['dropped']] == [(4, "note 4")]
+
+
+def test_unkeyed_reviews_adopt_the_key_at_their_position(qa_frame):
+    row_keys = RowKeys.from_frame(qa_frame)
+    stored = stored_reviews(row_keys, [(5, "ann")], keyed=False)
+    records, sync = resync_records(stored, row_keys)
+    assert records[(5, "ann")]['Row_Key'] == row_keys[5]
+    assert sync['adopted'] == [(5, "ann", row_keys[5])]
@@ -0,0 +1,77 @@
+# tests/test_search_index.py
+import os
+
+import numpy as np
+import pandas as pd
+
+import search_index
+from search_index import SearchIndex
+
+
+def indexed(tmp_path, frame):
+    path = str(tmp_path / "in.csv")
+    frame.to_csv(path, index=False)
+    index = SearchIndex(path)
+    index.build(frame)
+    return index
+
+
+def tax_frame():
+    return pd.DataFrame({
+        'Question': [
+            "How is income tax computed?",
+            "When is the VAT return due?",
+            "Is income from abroad taxable?",
+            "What is the tax rate for companies?",
+            "How do I pay customs duty?",
+        ],
+        'Answer': ["By slabs", "Monthly", "Yes, income tax applies", "Thirty percent", "At the port"],
+        'Gold Answer': ["Progressive slabs", "By the 15th", "Yes", "27.5 percent", "Online or at the port"],
+    })
+
+
+def test_every_word_must_match_and_the_last_is_a_prefix(tmp_path):
+    index = indexed(tmp_path, tax_frame())
+    assert sorted(index.search("income tax")) == [0, 2]
+    assert index.search("income tax")[0] == 2  # "income" and "tax" twice each
+    assert sorted(index.search("tax comp")) == [0, 3]
+    assert index.search("port duty") == [4]
+    assert index.search("income vat") == []
+    assert index.search("") == []
+
+
+def test_sparse_lookup_ranks_like_the_dense_path(tmp_path, monkeypatch):
+    rng = np.random.default_rng(5)
+    words = np.array([f"w{i}" for i in range(40)])
+    frame = pd.DataFrame({
+        col: [" ".join(rng.choice(words, 8)) for _ in range(400)] for col in search_index.SEARCH_COLUMNS
+    })
+    index = indexed(tmp_path, frame)
+    for query in ("w1 w2", "w3 w4 w5", "w10 w2"):
+        monkeypatch.setattr(search_index, 'SPARSE_LOOKUP_RATIO', 0)
+        sparse = index.scores(query)
+        monkeypatch.setattr(search_index, 'SPARSE_LOOKUP_RATIO', 10 ** 9)
+        dense = index.scores(query)
+        order = np.argsort(dense[0]), np.argsort(sparse[0])
+        assert dense[0][order[0]].tolist() == sparse[0][order[1]].tolist()
+        assert np.allclose(dense[1][order[0]], sparse[1][order[1]])
+
+
+def test_filter_and_limit(tmp_path):
+    index = indexed(tmp_path, tax_frame())
+    assert index.search("is", limit=2) == index.search("is")[:2]
+    assert index.search("is", keep=lambda rows: rows % 2 == 1) == [row for row in index.search("is") if row % 2]
+
+
+def test_index_is_reused_until_the_input_changes(tmp_path):
+    index = indexed(tmp_path, tax_frame())
+    assert SearchIndex(index.input_path).ready
+
+    changed = tax_frame()
+    changed.loc[4, 'Question'] = "How do I pay excise duty?"
+    changed.to_csv(index.input_path, index=False)
+    os.utime(index.input_path, ns=(1, 1))
+    stale = SearchIndex(index.input_path)
+    assert not stale.ready
+    stale.build(changed)
+    assert stale.search("excise") == [4]
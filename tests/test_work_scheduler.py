@@ -0,0 +1,96 @@
+# tests/test_work_scheduler.py
+import sqlite3
+import threading
+
+from review_store import JournalReviewStore, ReviewState, make_record
+from row_identity import RowKeys
+from work_scheduler import WorkScheduler, build_work_scheduler
+
+DATE = "2024-01-01 10:00:00 AM"
+QUOTAS = {"Tax Payer": 2, "Tax Officer": 1}
+
+
+def test_claim_skips_rows_the_reviewer_completed(tmp_path, qa_frame):
+    scheduler = WorkScheduler(str(tmp_path / "w.sqlite3"), RowKeys.from_frame(qa_frame), QUOTAS)
+    scheduler.complete_many([(0, "ann", "Tax Payer"), (1, "ann", "Tax Payer")])
+    held = scheduler.claim("ann", "Tax Payer", batch_size=3)
+    assert held == [2, 3, 4]
+    # Rows 0 and 1 still have one Tax Payer slot open, so they come first for others
+    assert scheduler.claim("bob", "Tax Payer", batch_size=2) == [0, 1]
+
+
+def test_released_and_completed_slots(tmp_path, qa_frame):
+    scheduler = WorkScheduler(str(tmp_path / "w.sqlite3"), RowKeys.from_frame(qa_frame.head(3)), QUOTAS)
+    assert scheduler.claim("ann", "Tax Officer", batch_size=2) == [0, 1]
+    scheduler.complete(0, "ann", "Tax Officer")
+    scheduler.release("ann")
+    assert scheduler.open_slots("Tax Officer") == 2
+    assert scheduler.claim("bob", "Tax Officer", batch_size=5) == [1, 2]
+
+
+def test_save_many_completes_in_one_transaction(qa_frame, output_path, monkeypatch):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    scheduler = build_work_scheduler(state, output_path, QUOTAS)
+    batches = []
+    complete_many = scheduler.complete_many
+    monkeypatch.setattr(scheduler, 'complete_many', lambda items: batches.append(items) or complete_many(items))
+    state.save_many([(row_id, make_record("⭐⭐⭐ Fair", "", "ann", "Tax Officer", DATE)) for row_id in range(4)])
+    assert state.flush()
+    assert len(batches) == 1 and len(batches[0]) == 4
+    assert scheduler.open_slots("Tax Officer") == 2
+
+
+def test_completions_are_recorded_after_the_write(qa_frame, output_path, monkeypatch):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    scheduler = build_work_scheduler(state, output_path, QUOTAS)
+    saver = threading.current_thread()
+    calls = []
+    complete_many = scheduler.complete_many
+
+    def locked_once(items):
+        calls.append(threading.current_thread())
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        complete_many(items)
+
+    monkeypatch.setattr(scheduler, 'complete_many', locked_once)
+    state.save(0, make_record("⭐⭐⭐ Fair", "", "ann", "Tax Officer", DATE))
+    # The save itself never touches the scheduler's database
+    assert calls == []
+    assert state.flush()
+    assert isinstance(state.listener_error, sqlite3.OperationalError)
+    assert JournalReviewStore(output_path).load()[(state.row_keys[0], "ann")][1]['Rating'] == "⭐⭐⭐ Fair"
+
+    # The failed completion is retried with the next written batch
+    state.save(1, make_record("⭐⭐ Poor", "", "ann", "Tax Officer", DATE))
+    assert state.flush()
+    assert saver not in calls
+    assert state.listener_error is None
+    assert scheduler.open_slots("Tax Officer") == 4
+    assert scheduler.claim("bob", "Tax Officer", batch_size=2) == [2, 3]
+
+
+def test_tables_follow_a_reordered_input(qa_frame, output_path):
+    state = ReviewState(JournalReviewStore(output_path), qa_frame)
+    scheduler = build_work_scheduler(state, output_path, QUOTAS)
+    state.save(0, make_record("⭐⭐⭐ Fair", "", "ann", "Tax Officer", DATE))
+    state.flush()
+    assert scheduler.claim("bob", "Tax Officer", batch_size=2) == [1, 2]
+
+    # Same questions, reversed: row r is now at 5 - r
+    reordered = qa_frame.iloc[::-1].reset_index(drop=True)
+    state = ReviewState(JournalReviewStore(output_path), reordered)
+    scheduler = build_work_scheduler(state, output_path, QUOTAS)
+    assert scheduler.claim("bob", "Tax Officer", batch_size=2) == [3, 4]
+    # ann's review follows its question to row 5, which is not offered again
+    assert scheduler.claim("cy", "Tax Officer", batch_size=5) == [0, 1, 2]
+    assert scheduler.open_slots("Tax Officer") == 0
+    state.flush()
+
+
+def test_unchanged_input_keeps_the_tables(qa_frame, tmp_path):
+    path, row_keys = str(tmp_path / "w.sqlite3"), RowKeys.from_frame(qa_frame)
+    assert WorkScheduler(path, row_keys, QUOTAS).claim("ann", "Tax Officer", batch_size=2) == [0, 1]
+    # A second process opening the same input sees the same leases
+    assert WorkScheduler(path, row_keys, QUOTAS).claim("ann", "Tax Officer", batch_size=2) == [0, 1]
+    assert WorkScheduler(path, row_keys, QUOTAS).claim("bob", "Tax Officer", batch_size=2) == [2, 3]
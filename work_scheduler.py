@@ -0,0 +1,295 @@
+# work_scheduler.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Reviews wanted per question, by reviewer type
+REVIEWER_QUOTAS = {
+    "Tax Payer": 2,
+    "Non Tax Payer": 1,
+    "Tax Officer": 1,
+}
+# Questions claimed per batch and how long a claim is held without activity
+LEASE_BATCH_SIZE = 10
+LEASE_SECONDS = 10 * 60
+# Bump when the tables change; existing databases are then rebuilt
+SCHEDULER_SCHEMA = 2
+
+_SCHEMA = (
+    """CREATE TABLE slots (
+        row_id INTEGER NOT NULL,
+        reviewer_type TEXT NOT NULL,
+        remaining INTEGER NOT NULL,
+        PRIMARY KEY (row_id, reviewer_type)
+    )""",
+    "CREATE INDEX slots_open_rows ON slots (reviewer_type, remaining, row_id) WHERE remaining > 0",
+    """CREATE TABLE leases (
+        row_id INTEGER NOT NULL,
+        row_key TEXT NOT NULL,
+        reviewer TEXT NOT NULL,
+        reviewer_type TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (row_id, reviewer)
+    )""",
+    "CREATE INDEX leases_expiry ON leases (expires_at)",
+    "CREATE INDEX leases_reviewer ON leases (reviewer, expires_at)",
+    """CREATE TABLE completions (
+        row_id INTEGER NOT NULL,
+        reviewer TEXT NOT NULL,
+        reviewer_type TEXT NOT NULL,
+        PRIMARY KEY (row_id, reviewer)
+    )""",
+)
+
+
+class WorkScheduler:
+    """Lease-based distribution of questions across concurrent reviewers.
+
+    Lives in a SQLite database (WAL mode) next to the review output, so it
+    works across sessions and worker processes.  ``slots`` holds the
+    remaining quota per (question, reviewer type); claiming a question
+    takes a slot under a time-limited lease, completing it keeps the slot
+    consumed, and expired leases give their slot back.  Claims walk a
+    partial ``(reviewer_type, remaining, row_id)`` index of the open slots
+    only, so questions whose quota is used up cost nothing; besides the
+    batch, the walk only passes the questions the reviewer already holds
+    or reviewed that still await other reviewers of their type.
+    Questions with the fewest open slots come first, which finishes
+    partly covered questions before starting new ones.  The tables
+    address questions by position and are rebuilt whenever the input
+    rows change (see ``_sync``).
+    """
+
+    def __init__(self, db_path, row_keys, quotas=None, existing_reviews=None):
+        """``row_keys`` are the input's ``RowKeys``; ``existing_reviews`` maps
+        ``(row_id, reviewer)`` to the reviews saved so far, on the current rows."""
+        self.db_path = db_path
+        self.quotas = dict(quotas or REVIEWER_QUOTAS)
+        self.row_keys = row_keys
+        self._local = threading.local()
+        self._sync(row_keys, existing_reviews or {})
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _signature(self, row_keys):
+        digest = hashlib.sha1(f"{SCHEDULER_SCHEMA}:{sorted(self.quotas.items())}".encode('utf-8'))
+        digest.update(np.ascontiguousarray(row_keys.question_hashes).tobytes())
+        digest.update(np.ascontiguousarray(row_keys.answer_hashes).tobytes())
+        return digest.hexdigest()
+
+    def _sync(self, row_keys, existing_reviews):
+        """Rebuild the tables unless they were made for this very input (row for row) and these quotas.
+
+        The tables address questions by position, so after the input was
+        reordered, edited, extended or trimmed they are rebuilt: slots from
+        the quotas, completions from the saved reviews (already re-attached
+        to the current rows), and live leases moved to their question's new
+        position by its content key.
+        """
+        signature = self._signature(row_keys)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            stored = conn.execute("SELECT value FROM meta WHERE name = 'input'").fetchone()
+            if stored is not None and stored[0] == signature:
+                conn.execute("COMMIT")
+                return
+            leases = []
+            if stored is not None:
+                # Written with this schema: the leases carry their question's key
+                leases = conn.execute(
+                    "SELECT row_key, reviewer, reviewer_type, expires_at FROM leases WHERE expires_at >= ?",
+                    (time.time(),)
+                ).fetchall()
+            for table in ('slots', 'leases', 'completions'):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._seed(conn, row_keys, existing_reviews, leases)
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('input', ?)", (signature,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _seed(self, conn, row_keys, existing_reviews, leases):
+        n_rows = len(row_keys)
+        for rtype, quota in self.quotas.items():
+            conn.executemany(
+                "INSERT INTO slots (row_id, reviewer_type, remaining) VALUES (?, ?, ?)",
+                ((row_id, rtype, quota) for row_id in range(n_rows))
+            )
+        # Saved reviews count against the quota
+        for (row_id, reviewer), record in existing_reviews.items():
+            rtype = record.get('Reviewer_Type')
+            if reviewer and rtype in self.quotas and 0 <= row_id < n_rows:
+                self._complete(conn, row_id, reviewer, rtype)
+        if leases:
+            positions = row_keys.positions([row_key for row_key, *_ in leases]).tolist()
+            for row_id, (row_key, reviewer, rtype, expires_at) in zip(positions, leases):
+                if row_id < 0 or rtype not in self.quotas or conn.execute(
+                    "SELECT 1 FROM completions WHERE row_id = ? AND reviewer = ?", (row_id, reviewer)
+                ).fetchone():
+                    continue
+                taken = conn.execute(
+                    "UPDATE slots SET remaining = remaining - 1 "
+                    "WHERE row_id = ? AND reviewer_type = ? AND remaining > 0", (row_id, rtype)
+                ).rowcount
+                if taken:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO leases (row_id, row_key, reviewer, reviewer_type, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?)", (row_id, row_key, reviewer, rtype, expires_at)
+                    )
+
+    def _expire(self, conn, now):
+        expired = conn.execute(
+            "SELECT row_id, reviewer, reviewer_type FROM leases WHERE expires_at < ?", (now,)
+        ).fetchall()
+        if expired:
+            conn.executemany(
+                "UPDATE slots SET remaining = remaining + 1 WHERE row_id = ? AND reviewer_type = ?",
+                [(row_id, rtype) for row_id, _, rtype in expired]
+            )
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+
+    def claim(self, reviewer, reviewer_type, batch_size=None):
+        """Lease up to ``batch_size`` questions for ``reviewer``; return all rows it currently holds."""
+        batch_size = batch_size or LEASE_BATCH_SIZE
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire(conn, now)
+            held = [r[0] for r in conn.execute(
+                "SELECT row_id FROM leases WHERE reviewer = ? ORDER BY row_id", (reviewer,)
+            )]
+            wanted = batch_size - len(held)
+            if wanted > 0:
+                rows = [r[0] for r in conn.execute("""
+                    SELECT s.row_id FROM slots s
+                    WHERE s.reviewer_type = ? AND s.remaining > 0
+                      AND NOT EXISTS (SELECT 1 FROM leases l WHERE l.row_id = s.row_id AND l.reviewer = ?)
+                      AND NOT EXISTS (SELECT 1 FROM completions c WHERE c.row_id = s.row_id AND c.reviewer = ?)
+                    ORDER BY s.remaining, s.row_id
+                    LIMIT ?
+                """, (reviewer_type, reviewer, reviewer, wanted))]
+                conn.executemany(
+                    "UPDATE slots SET remaining = remaining - 1 WHERE row_id = ? AND reviewer_type = ?",
+                    [(row_id, reviewer_type) for row_id in rows]
+                )
+                conn.executemany(
+                    "INSERT INTO leases (row_id, row_key, reviewer, reviewer_type, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    [(row_id, self.row_keys[row_id], reviewer, reviewer_type, now + LEASE_SECONDS) for row_id in rows]
+                )
+                held = sorted(held + rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return held
+
+    def renew(self, reviewer):
+        """Extend every lease held by ``reviewer``."""
+        self._connect().execute(
+            "UPDATE leases SET expires_at = ? WHERE reviewer = ?", (time.time() + LEASE_SECONDS, reviewer)
+        )
+
+    def release(self, reviewer):
+        """Give back every question ``reviewer`` holds but has not reviewed."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            held = conn.execute(
+                "SELECT row_id, reviewer_type FROM leases WHERE reviewer = ?", (reviewer,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE slots SET remaining = remaining + 1 WHERE row_id = ? AND reviewer_type = ?", held
+            )
+            conn.execute("DELETE FROM leases WHERE reviewer = ?", (reviewer,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _complete(self, conn, row_id, reviewer, reviewer_type):
+        if conn.execute(
+            "SELECT 1 FROM completions WHERE row_id = ? AND reviewer = ?", (row_id, reviewer)
+        ).fetchone():
+            return
+        leased = conn.execute(
+            "DELETE FROM leases WHERE row_id = ? AND reviewer = ?", (row_id, reviewer)
+        ).rowcount
+        if not leased:
+            # Reviewed without a lease (e.g. by jumping to it): consume a slot now
+            conn.execute(
+                "UPDATE slots SET remaining = MAX(remaining - 1, 0) WHERE row_id = ? AND reviewer_type = ?",
+                (row_id, reviewer_type)
+            )
+        conn.execute(
+            "INSERT INTO completions (row_id, reviewer, reviewer_type) VALUES (?, ?, ?)",
+            (row_id, reviewer, reviewer_type)
+        )
+
+    def complete(self, row_id, reviewer, reviewer_type):
+        """Record that ``reviewer`` reviewed ``row_id``; its lease (if any) becomes a completion."""
+        self.complete_many([(row_id, reviewer, reviewer_type)])
+
+    def complete_many(self, items):
+        """``complete()`` every ``(row_id, reviewer, reviewer_type)`` in one transaction."""
+        if not items:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row_id, reviewer, reviewer_type in items:
+                self._complete(conn, row_id, reviewer, reviewer_type)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def open_slots(self, reviewer_type):
+        return self._connect().execute(
+            "SELECT COALESCE(SUM(remaining), 0) FROM slots WHERE reviewer_type = ?", (reviewer_type,)
+        ).fetchone()[0]
+
+
+def scheduler_path(output_path):
+    return f"{os.path.splitext(output_path)[0]}.leases.sqlite3"
+
+
+def build_work_scheduler(state, output_path, quotas=None):
+    """Open the scheduler for a ``ReviewState`` and record every written save as a completion.
+
+    Completions are recorded on the autosave writer's thread once the
+    reviews have reached the store, so saves never wait on this database;
+    a batch that fails (e.g. the database is locked) is retried with the
+    next one.
+    """
+    scheduler = WorkScheduler(scheduler_path(output_path), state.row_keys, quotas, state.records)
+    # Completions not yet recorded; only touched on the writer's thread
+    waiting = []
+
+    def on_written(written):
+        waiting.extend(
+            (row_id, record['Reviewer'], record['Reviewer_Type']) for row_id, record in written
+            if record.get('Reviewer') and record.get('Reviewer_Type') in scheduler.quotas
+        )
+        # One transaction per written batch (a saved grid page completes at once)
+        scheduler.complete_many(list(waiting))
+        waiting.clear()
+
+    state.add_write_listener(on_written)
+    return scheduler